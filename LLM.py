@@ -13,6 +13,8 @@ import requests
 from bs4 import BeautifulSoup  
 import logging  
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type  # 添加重试机制  
+from llm_client import parse_verdict  # 第一个 YES/NO 标签即结论  
+from page_fetcher import fetch_pages, extract_page_content  # 并发、限字节抓取页面正文，按规范化URL缓存  
 
 # 设置日志  
 logging.basicConfig(level=logging.INFO)  
@@ -79,32 +81,6 @@ def verify_dataset_candidate(url: str, description: str) -> bool:
     # 返回原始分类结果  
     return True  
 
-def extract_page_content(url: str) -> Optional[str]:  
-    """  
-    尝试获取链接内容  
-    """  
-    try:  
-        headers = {  
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'  
-        }  
-        response = requests.get(url, headers=headers, timeout=10)  
-        response.raise_for_status()  
-        
-        soup = BeautifulSoup(response.text, 'html.parser')  
-        
-        for script in soup(["script", "style"]):  
-            script.extract()  
-        
-        text = soup.get_text(separator=' ', strip=True)  
-        
-        text = re.sub(r'\s+', ' ', text).strip()  
-        
-        return text[:4000] if text else None  
-    
-    except Exception as e:  
-        logger.warning(f"Failed to retrieve content from {url}: {str(e)}")  
-        return None  
-
 # 添加重试装饰器  
 @retry(  
     retry=retry_if_exception_type((requests.exceptions.Timeout, requests.exceptions.ConnectionError)),  
@@ -154,7 +130,7 @@ def is_benchmark_or_dataset_link(url: str, context_text: str, verify_content: bo
         logger.info(f"Analyzing link: {url}")  
         response = call_llm_with_retry(prompt_link, url=url, context_text=context_text)  
         
-        initial_result = 'YES' in response.upper()  
+        initial_result = parse_verdict(response) is True  
         
         logger.info(f"Initial classification for {url}: {initial_result}")  
         
@@ -163,34 +139,7 @@ def is_benchmark_or_dataset_link(url: str, context_text: str, verify_content: bo
             page_content = extract_page_content(url)  
             
             if page_content:  
-                # 创建内容验证的提示模板  
-                content_verification_template = PromptTemplate(  
-                    input_variables=["url", "page_content"],  
-                    template="""  
-                    请分析以下链接 {url} 的内容，判断它是否为 Benchmark 或 Dataset 资源页面。  
-                    
-                    页面内容摘要: {page_content}  
-                    
-                    判断标准:  
-                    1. 页面应该包含数据集下载信息、代码仓库、或基准测试相关资源  
-                    2. 不是纯粹的博客文章、新闻、或一般的项目主页  
-                    
-                    请回答 'YES' 或 'NO'，并简要说明理由。  
-                    """  
-                )  
-                
-                content_verification_chain = LLMChain(llm=llm, prompt=content_verification_template)  
-                # 同样使用带重试和速率限制的API调用  
-                content_response = call_llm_with_retry(  
-                    content_verification_chain,   
-                    url=url,   
-                    page_content=page_content  
-                )  
-                
-                final_result = 'YES' in content_response.upper()  
-                logger.info(f"Content verification for {url}: {final_result}")  
-                
-                return final_result  
+                return verify_page_content(url, page_content)  
         
         return initial_result  
     
@@ -199,9 +148,58 @@ def is_benchmark_or_dataset_link(url: str, context_text: str, verify_content: bo
         # 如果API调用失败，返回False而不是继续尝试  
         return False  
 
-def process_paper_links(paper_text: str, window_size: int = 200) -> List[str]:  
+def verify_page_content(url: str, page_content: str) -> bool:  
+    """  
+    根据页面内容二次判断链接是否为 Benchmark/Dataset 资源页面  
+    """  
+    # 创建内容验证的提示模板  
+    content_verification_template = PromptTemplate(  
+        input_variables=["url", "page_content"],  
+        template="""  
+        请分析以下链接 {url} 的内容，判断它是否为 Benchmark 或 Dataset 资源页面。  
+        
+        页面内容摘要: {page_content}  
+        
+        判断标准:  
+        1. 页面应该包含数据集下载信息、代码仓库、或基准测试相关资源  
+        2. 不是纯粹的博客文章、新闻、或一般的项目主页  
+        
+        请回答 'YES' 或 'NO'，并简要说明理由。  
+        """  
+    )  
+    
+    content_verification_chain = LLMChain(llm=llm, prompt=content_verification_template)  
+    # 同样使用带重试和速率限制的API调用  
+    content_response = call_llm_with_retry(  
+        content_verification_chain,   
+        url=url,   
+        page_content=page_content  
+    )  
+    
+    final_result = parse_verdict(content_response) is True  
+    logger.info(f"Content verification for {url}: {final_result}")  
+    
+    return final_result  
+
+def verify_links_content(urls: List[str]) -> dict:  
+    """  
+    内容验证阶段：并发抓取所有候选页面（已抓取过的直接用缓存），再逐个根据内容判断  
+    取不到内容的链接保留初步判断结果  
+    """  
+    pages = fetch_pages(urls)  
+    results = {}  
+    for url in urls:  
+        try:  
+            results[url] = verify_page_content(url, pages[url]) if pages[url] else True  
+        except Exception as e:  
+            logger.error(f"Error in content verification for {url}: {str(e)}")  
+            results[url] = True  
+    return results  
+
+def process_paper_links(paper_text: str, window_size: int = 200, verify_content: bool = False) -> List[str]:  
     """  
     处理论文文本，提取并验证所有潜在的 Benchmark/Dataset 链接  
+    verify_content 为 True 时，初步判断为是的链接统一并发抓取页面后再按内容验证  
     """  
     # 使用正则表达式提取所有 URL  
     url_pattern = r'https?://[^\s)>"}\']*'  
@@ -228,6 +226,10 @@ def process_paper_links(paper_text: str, window_size: int = 200) -> List[str]:
             else:  
                 logger.info(f"Link initially classified as dataset but rejected in verification: {url}")  
     
+    if verify_content and benchmark_dataset_links:  
+        verified = verify_links_content(list(dict.fromkeys(benchmark_dataset_links)))  
+        benchmark_dataset_links = [url for url in benchmark_dataset_links if verified[url]]  
+    
     return benchmark_dataset_links  
 
 # 使用示例  
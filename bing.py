@@ -1,21 +1,46 @@
 """
-Search anything via https://bing.com, but you will probably want to search 
+Search anything via https://bing.com, but you will probably want to search
 for the homepage of a dataset or a benchmark.
+
+For many queries, reuse one browser with new_browser() or skip the browser
+altogether with bing_search_http(); see also search_resolver.py.
 """
 import requests
 import os
 import base64
+from urllib.parse import urlparse, quote_plus
+from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.print_page_options import PrintOptions
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
 
 import time
 query = 'mnist dataset'
-def bing_search(query: str) -> list:
+BING_URL = 'https://www.bing.com/'
+
+def new_browser():
+    option = webdriver.FirefoxOptions()
+    option.add_argument('-headless')
+    return webdriver.Firefox(option)
+
+def _is_result(url: str, base_url: str) -> bool:
+    if not url or not url.startswith('http'):
+        return False
+    host = urlparse(url).netloc
+    return not host.endswith('bing.com') and host != urlparse(base_url).netloc
+
+def bing_search(query: str, browser=None, base_url: str = BING_URL,
+                timeout: float = 10.0) -> list:
     """
     If you can find the dataset name with pdf_url.find_dataset_in_file(),
-    then I can search on bing.com for its homepage. 
+    then I can search on bing.com for its homepage.
+
+    :param browser: a browser from new_browser() to reuse; if None, a new
+      one is started and closed for this query.
+    :param base_url: the search page, change it to test with a local page.
 
     Example usage
     >>> from bing import bing_search
@@ -24,35 +49,64 @@ def bing_search(query: str) -> list:
     >>> bing_search('ade20k dataset -csdn')
     ["https://github.com/CSAILVision/ADE20K", ...]
     """
-    option = webdriver.FirefoxOptions()
-    option.add_argument('-headless')
-    firefox = webdriver.Firefox(option)
-    input_url = 'https://www.bing.com/'
-    firefox.get(input_url)
+    firefox = browser if browser is not None else new_browser()
+    try:
+        firefox.get(base_url)
 
-    box = firefox.find_element(By.ID, "sb_form_q")
-    box.send_keys(query)
-    box.send_keys(Keys.ENTER)
-    time.sleep(3.0)
+        box = firefox.find_element(By.ID, "sb_form_q")
+        box.send_keys(query)
+        box.send_keys(Keys.ENTER)
+        # wait until the result list shows up instead of sleeping.
+        try:
+            WebDriverWait(firefox, timeout).until(
+                EC.presence_of_element_located((By.ID, "b_results")))
+        except Exception:
+            pass
 
-    urls = set()
-    ret = []
-    elements = firefox.find_elements(By.TAG_NAME, "a")
+        urls = set()
+        ret = []
+        elements = firefox.find_elements(By.TAG_NAME, "a")
 
-    for elem in elements:
-        url: str = (elem.get_attribute('href'))
-        if url and not url.startswith('https://cn.bing.com') \
-            and not url.startswith('javascript'):
-            if url not in urls:
-                ret.append(url)
-            urls.add(url)
+        for elem in elements:
+            url: str = (elem.get_attribute('href'))
+            if _is_result(url, base_url):
+                if url not in urls:
+                    ret.append(url)
+                urls.add(url)
 
-    del urls
-    time.sleep(1)
-    firefox.quit()
+        del urls
+    finally:
+        if browser is None:
+            firefox.quit()
 
     return ret
 
+def bing_search_http(query: str, session: requests.Session = None,
+                     base_url: str = BING_URL, timeout: float = 10.0) -> list:
+    """
+    Same as bing_search(), but fetch the plain html result page without a browser.
+
+    Example usage
+    >>> bing_search_http('ade20k dataset -csdn')
+    ["https://github.com/CSAILVision/ADE20K", ...]
+    """
+    session = session if session is not None else requests.Session()
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    }
+    res = session.get(base_url.rstrip('/') + '/search?q=' + quote_plus(query),
+                      headers=headers, timeout=timeout)
+    res.raise_for_status()
+    soup = BeautifulSoup(res.text, 'html.parser')
+    results = soup.find(id='b_results') or soup
+
+    ret = []
+    for elem in results.find_all('a'):
+        url = elem.get('href')
+        if _is_result(url, base_url) and url not in ret:
+            ret.append(url)
+    return ret
+
 if __name__ == "__main__":
     q = input()
 
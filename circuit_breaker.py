@@ -0,0 +1,127 @@
+"""
+A circuit breaker for the LLM endpoint.
+
+While the endpoint (or the proxy in front of it) is down, every LLM call
+still spends its timeouts and retries before it fails, which costs tens
+of seconds per link. The breaker counts consecutive failed calls; after
+`failure_threshold` of them it opens and calls are refused at once, so
+the pipeline decides with its rules only. After `reset_timeout` seconds
+one probe call is let through (half-open): if it succeeds the breaker
+closes again, otherwise it stays open for another `reset_timeout`.
+
+Links decided while degraded are recorded with their paper, so that they
+can be written out and classified again once the endpoint is back.
+
+Example usage:
+>>> breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+>>> breaker.call(lambda: client.complete(prompt))   # raises CircuitOpenError while open
+'YES'
+>>> breaker.record_degraded('https://github.com/a/data', paper='odjMSBSWRt', reason='circuit open')
+>>> breaker.summary()
+'closed; opened 0 times, 0 calls refused, 0 probes, 1 links degraded'
+>>> write_degraded('degraded.json', breaker.degraded)
+>>> load_degraded('degraded.json')['papers']
+['odjMSBSWRt']
+"""
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_TIMEOUT = 60.0
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling while the breaker is open."""
+
+
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT):
+        """
+        :param failure_threshold: consecutive failures that open the breaker.
+        :param reset_timeout: seconds to stay open before a probe call.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.degraded = []
+        self.stats = {'opened': 0, 'refused': 0, 'probes': 0}
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """:return: whether a call may be made now; True for the single probe of a half-open breaker."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # one probe at a time, the others keep being refused.
+                self.state = HALF_OPEN
+                self.stats['probes'] += 1
+                logger.info("LLM circuit half-open, probing the endpoint")
+                return True
+            self.stats['refused'] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.warning("LLM circuit closed, the endpoint answers again")
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                if self.state == CLOSED:
+                    self.stats['opened'] += 1
+                    logger.warning(f"LLM circuit open after {self.failures} failed calls, "
+                                   f"using rules only for {self.reset_timeout:.0f}s")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def call(self, func):
+        """:return: func(); raises CircuitOpenError without calling it while open."""
+        if not self.allow():
+            raise CircuitOpenError("LLM circuit is open")
+        try:
+            result = func()
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def record_degraded(self, url: str, paper: str = None, reason: str = None) -> None:
+        """Note a link that was decided without the LLM."""
+        with self._lock:
+            self.degraded.append({'paper': paper, 'url': url, 'reason': reason, 'time': time.time()})
+
+    def summary(self) -> str:
+        with self._lock:
+            return (f"{self.state}; opened {self.stats['opened']} times, {self.stats['refused']} calls refused, "
+                    f"{self.stats['probes']} probes, {len(self.degraded)} links degraded")
+
+
+def write_degraded(path: str, links: list) -> None:
+    """Write the degraded `links` and their papers, to be processed again with --requeue."""
+    papers = list(dict.fromkeys(d['paper'] for d in links if d['paper'] is not None))
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'papers': papers, 'links': links}, f, ensure_ascii=False, indent=2)
+
+
+def load_degraded(path: str) -> dict:
+    """:return: {'papers', 'links'} of a file written by write_degraded()."""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
@@ -9,11 +9,20 @@ import requests
 import PyPDF2  
 import io  
 import logging  
+from concurrent.futures import ThreadPoolExecutor  
 from bs4 import BeautifulSoup  
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type  
 
 # 导入原始函数  
 from pdf_url import can_access  
+from page_fetcher import extract_page_content  
+from url_canon import group_urls  
+from rule_engine import get_rule_engine
+from llm_client import DEFAULT_MODEL, estimate_tokens, parse_verdict, has_verdict
+from llm_metrics import get_llm_metrics
+from llm_context import merge_contexts, DEFAULT_TOKEN_BUDGET
+from llm_cache import LLMCacheMiss
+from circuit_breaker import CircuitBreaker, CircuitOpenError
 from openreview import fetch_paper  
 
 # LangChain相关导入  
@@ -33,12 +42,90 @@ logger = logging.getLogger(__name__)
 USE_LLM = False  
 llm = None  
 prompt_link = None  
+prompt_batch = None  
 RATE_LIMIT_DELAY = 3  
 LAST_API_CALL_TIME = 0  
+# 批量模式：一篇论文的候选链接合并成一次请求，每次最多 LLM_BATCH_SIZE 条  
+LLM_BATCH = False  
+LLM_BATCH_SIZE = 20  
+# 异步客户端（llm_client.AsyncLLMClient），按RPM/TPM预算并发请求  
+LLM_CLIENT = None  
+# LLM回复的磁盘缓存（llm_cache.LLMCache），None 表示不缓存  
+LLM_CACHE = None  
+# 每个URL合并后交给LLM的上下文token上限  
+LLM_CONTEXT_TOKENS = DEFAULT_TOKEN_BUDGET  
+# 合并上下文时压缩：去掉作者列表和引用标记，只保留链接所在句及附近与数据相关的句子  
+COMPRESS_CONTEXT = True  
+# 本地预分类器（preclassifier.PreClassifier），有把握的链接不再调用LLM  
+PRECLASSIFIER = None  
+# 熔断器（circuit_breaker.CircuitBreaker）：LLM接口连续失败后直接只用规则判断，定期试探恢复；None 表示不熔断  
+LLM_BREAKER = CircuitBreaker()  
 
-def setup_llm(api_key=None):  
-    """设置LLM相关组件"""  
-    global llm, prompt_link, USE_LLM  
+# 单条链接判断的提示模板  
+LINK_PROMPT_TEMPLATE = """  
+    请分析以下文本中的链接 {url}，判断它是否指向一个可直接下载或访问的 Benchmark 或 Dataset。  
+
+    链接上下文: {context_text}  
+
+    判断标准:  
+    1. 链接应该直接指向数据集下载页面或包含数据集的仓库  
+    2. 不是框架官网（如PyTorch、TensorFlow）、项目主页、博客或一般介绍页面  
+    3. 链接目标应该是可用于机器学习/数据挖掘任务的基准测试或数据集  
+    4. 链接应该指向实际存在的资源，不是占位符或示例URL  
+
+    请仔细分析后回答 'YES' 或 'NO'，并简要说明理由。  
+    """  
+
+# 只输出标签的单条判断模板，不再为丢弃的解释付费和等待  
+LINK_LABEL_TEMPLATE = LINK_PROMPT_TEMPLATE.replace(  
+    "请仔细分析后回答 'YES' 或 'NO'，并简要说明理由。",  
+    "只回答一个词 YES 或 NO，不要解释。\n\n    回答:")  
+LINK_JSON_TEMPLATE = LINK_PROMPT_TEMPLATE.replace(  
+    "请仔细分析后回答 'YES' 或 'NO'，并简要说明理由。",  
+    '只输出一个 JSON 对象，不要输出其他内容: {{"verdict": "YES"}} 或 {{"verdict": "NO"}}')  
+# 单条判断的回答方式：explain 回答并解释，label 只输出 YES/NO，json 只输出 {"verdict": ...}  
+VERDICT_MODES = ('explain', 'label', 'json')  
+LLM_VERDICT = 'label'  
+# 各回答方式的 max_tokens，None 为客户端默认值  
+VERDICT_MAX_TOKENS = {'explain': None, 'label': 2, 'json': 8}  
+# 流式读取回答，标签一出现就停止  
+LLM_STREAM = False  
+
+# 批量判断的提示模板，items 为 JSON 数组，每条包含 id、url、context  
+BATCH_PROMPT_TEMPLATE = """  
+    请逐条判断下列链接是否指向一个可直接下载或访问的 Benchmark 或 Dataset。  
+    每条包含编号 id、链接 url 和链接在论文中的上下文 context:  
+
+    {items}  
+
+    判断标准:  
+    1. 链接应该直接指向数据集下载页面或包含数据集的仓库  
+    2. 不是框架官网（如PyTorch、TensorFlow）、项目主页、博客或一般介绍页面  
+    3. 链接目标应该是可用于机器学习/数据挖掘任务的基准测试或数据集  
+    4. 链接应该指向实际存在的资源，不是占位符或示例URL  
+
+    只输出一个 JSON 数组，每条链接一个元素，不要输出其他内容，格式如下:  
+    [{{"id": 0, "verdict": "YES"}}, {{"id": 1, "verdict": "NO"}}]  
+    """  
+
+def setup_llm(api_key=None, client=None):  
+    """设置LLM相关组件  
+    
+    Args:  
+        api_key: OpenAI API密钥  
+        client: llm_client.AsyncLLMClient，给定时通过它并发请求，不再经过LangChain和固定间隔限速  
+    """  
+    global llm, prompt_link, prompt_batch, USE_LLM, LLM_CLIENT  
+    
+    if client is not None:  
+        LLM_CLIENT = client  
+        USE_LLM = True  
+        return True  
+    
+    # 回放模式只读缓存，不需要API密钥  
+    if LLM_CACHE is not None and not LLM_CACHE.online:  
+        USE_LLM = True  
+        return True  
     
     if not LANGCHAIN_AVAILABLE:  
         logger.warning("LangChain库未安装，将仅使用规则方法")  
@@ -58,19 +145,12 @@ def setup_llm(api_key=None):
         # 创建提示模板  
         prompt_link = PromptTemplate(  
             input_variables=["url", "context_text"],   
-            template="""  
-            请分析以下文本中的链接 {url}，判断它是否指向一个可直接下载或访问的 Benchmark 或 Dataset。  
-
-            链接上下文: {context_text}  
-
-            判断标准:  
-            1. 链接应该直接指向数据集下载页面或包含数据集的仓库  
-            2. 不是框架官网（如PyTorch、TensorFlow）、项目主页、博客或一般介绍页面  
-            3. 链接目标应该是可用于机器学习/数据挖掘任务的基准测试或数据集  
-            4. 链接应该指向实际存在的资源，不是占位符或示例URL  
-
-            请仔细分析后回答 'YES' 或 'NO'，并简要说明理由。  
-            """  
+            template=link_prompt_template()  
+        )  
+        
+        prompt_batch = PromptTemplate(  
+            input_variables=["items"],  
+            template=BATCH_PROMPT_TEMPLATE  
         )  
         
         USE_LLM = True  
@@ -151,42 +231,10 @@ def verify_dataset_candidate(url: str, context_text: str) -> bool:
     return True
     
 
-def extract_page_content(url: str) -> Optional[str]:  
-    """尝试获取链接内容"""  
-    try:  
-        headers = {  
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'  
-        }  
-        response = requests.get(url, headers=headers, timeout=10)  
-        response.raise_for_status()  
-        
-        soup = BeautifulSoup(response.text, 'html.parser')  
-        
-        for script in soup(["script", "style"]):  
-            script.extract()  
-        
-        text = soup.get_text(separator=' ', strip=True)  
-        
-        text = re.sub(r'\s+', ' ', text).strip()  
-        
-        return text[:4000] if text else None  
-    
-    except Exception as e:  
-        logger.warning(f"Failed to retrieve content from {url}: {str(e)}")  
-        return None  
-
-@retry(  
-    retry=retry_if_exception_type((requests.exceptions.Timeout, requests.exceptions.ConnectionError)),  
-    wait=wait_exponential(multiplier=1, min=2, max=20),  
-    stop=stop_after_attempt(3)  
-)  
-def call_llm_with_retry(url: str, context_text: str) -> str:  
-    """使用重试机制调用LLM"""  
+def wait_for_rate_limit():  
+    """两次API调用之间至少间隔 RATE_LIMIT_DELAY 秒"""  
     global LAST_API_CALL_TIME  
     
-    if not USE_LLM or not llm or not prompt_link:  
-        return "NO"  
-    
     # 实现速率限制  
     current_time = time.time()  
     time_since_last_call = current_time - LAST_API_CALL_TIME  
@@ -195,15 +243,63 @@ def call_llm_with_retry(url: str, context_text: str) -> str:
         sleep_time = RATE_LIMIT_DELAY - time_since_last_call  
         logger.info(f"Rate limiting: Waiting {sleep_time:.2f} seconds before next API call")  
         time.sleep(sleep_time)  
+        get_llm_metrics().record_wait(sleep_time)  
     
     # 更新上次调用时间  
     LAST_API_CALL_TIME = time.time()  
+
+def _count_retry(retry_state):  
+    """tenacity 重试前的回调，计入LLM指标"""  
+    get_llm_metrics().record_retry()  
+
+def link_prompt_template() -> str:  
+    """当前回答方式下单条判断的提示模板"""  
+    return {'explain': LINK_PROMPT_TEMPLATE, 'label': LINK_LABEL_TEMPLATE, 'json': LINK_JSON_TEMPLATE}[LLM_VERDICT]  
+
+def _invoke_llm(chain, inputs: Dict[str, Any], prompt: str, until=None) -> str:  
+    """调用 LangChain 链并记录耗时和（按文本估算的）token 数；给定 until 时流式读取，until(已收到的文本) 为真即停止"""  
+    start = time.time()  
+    try:  
+        if until is None:  
+            result = chain.invoke(inputs)  
+        else:  
+            result = ""  
+            for chunk in chain.stream(inputs):  
+                result += str(chunk)  
+                if until(result):  
+                    break  
+    except Exception:  
+        get_llm_metrics().record_call(llm_model_name(), time.time() - start, ok=False)  
+        raise  
+    get_llm_metrics().record_call(llm_model_name(), time.time() - start,  
+                                  prompt_tokens=estimate_tokens(prompt),  
+                                  completion_tokens=estimate_tokens(str(result)), estimated=True)  
+    return result  
+
+@retry(  
+    retry=retry_if_exception_type((requests.exceptions.Timeout, requests.exceptions.ConnectionError)),  
+    wait=wait_exponential(multiplier=1, min=2, max=20),  
+    stop=stop_after_attempt(3),  
+    before_sleep=_count_retry  
+)  
+def call_llm_with_retry(url: str, context_text: str) -> str:  
+    """使用重试机制调用LLM"""  
+    prompt = link_prompt_template().format(url=url, context_text=context_text)  
+    max_tokens = VERDICT_MAX_TOKENS[LLM_VERDICT]  
+    until = has_verdict if LLM_STREAM else None  
+    if LLM_CLIENT is not None:  
+        # 异步客户端自带按RPM/TPM的限速和429退避  
+        return LLM_CLIENT.complete(prompt, max_tokens=max_tokens, until=until)  
+    
+    if not USE_LLM or not llm or not prompt_link:  
+        return "NO"  
+    
+    wait_for_rate_limit()  
     
     try:  
         # 使用新的invoke方法  
-        chain = prompt_link | llm  # prompt 不能改成 chain，不然写的二次调用没用
-        chain = prompt_link | llm  # prompt 不能改成 chain，不然写的二次调用没用
-        result = chain.invoke({"url": url, "context_text": context_text})  
+        chain = prompt_link | (llm.bind(max_tokens=max_tokens) if max_tokens else llm)  # prompt 不能改成 chain，不然写的二次调用没用
+        result = _invoke_llm(chain, {"url": url, "context_text": context_text}, prompt, until)  
         model_info = llm.model_name if hasattr(llm, 'model_name') else "Unknown model"  
         logger.info(f"API call successful using model: {model_info}")  
         return result  
@@ -211,6 +307,31 @@ def call_llm_with_retry(url: str, context_text: str) -> str:
         logger.error(f"API call failed: {str(e)}")  
         raise e  
 
+def llm_model_name() -> str:  
+    """当前使用的模型名，作为LLM缓存键的一部分"""  
+    if LLM_CLIENT is not None:  
+        return LLM_CLIENT.model  
+    return getattr(llm, 'model_name', None) or DEFAULT_MODEL  
+
+def _call_through_breaker(func, *args):  
+    """经过熔断器调用 func，熔断期间不调用、直接抛出 CircuitOpenError"""  
+    if LLM_BREAKER is None:  
+        return func(*args)  
+    return LLM_BREAKER.call(lambda: func(*args))  
+
+def _record_degraded(url: str, reason: str):  
+    """记录未经LLM、只按规则判断的链接，接口恢复后可重新判断"""  
+    if LLM_BREAKER is not None:  
+        LLM_BREAKER.record_degraded(url, paper=get_llm_metrics().paper, reason=reason)  
+
+def get_llm_response(url: str, context_text: str) -> str:  
+    """调用LLM判断单条链接；启用LLM缓存时先查缓存，回放模式下未录制的请求抛出 LLMCacheMiss"""  
+    if LLM_CACHE is None:  
+        return _call_through_breaker(call_llm_with_retry, url, context_text)  
+    # 熔断期间缓存仍然可用  
+    return LLM_CACHE.fetch(llm_model_name(), link_prompt_template(), url, context_text,  
+                           lambda: _call_through_breaker(call_llm_with_retry, url, context_text))  
+
 def is_benchmark_or_dataset_link_llm(url: str, context_text: str) -> bool:  
     """使用LLM判断链接是否为Benchmark/Dataset链接"""  
     if not USE_LLM:  
@@ -223,9 +344,13 @@ def is_benchmark_or_dataset_link_llm(url: str, context_text: str) -> bool:
     # 使用LLM分析链接及其上下文  
     try:  
         logger.info(f"Analyzing link with LLM: {url}")  
-        response = call_llm_with_retry(url, context_text)  
+        response = get_llm_response(url, context_text)  
         
-        initial_result = 'YES' in response.upper()  
+        # 第一个 YES/NO 标签即结论，解释里再出现的 yes 不影响结果  
+        verdict = parse_verdict(response)  
+        if verdict is None:  
+            logger.warning(f"No YES/NO in LLM response for {url}: {response[:80]!r}")  
+        initial_result = verdict is True  
         
         logger.info(f"LLM classification for {url}: {initial_result}")  
         
@@ -246,86 +371,120 @@ def is_benchmark_or_dataset_link_llm(url: str, context_text: str) -> bool:
         
         return initial_result  
     
+    except CircuitOpenError:  
+        logger.info(f"LLM circuit open, rules only for {url}")  
+        _record_degraded(url, "circuit open")  
+        return False  
+    except LLMCacheMiss as e:  
+        logger.error(f"Error in LLM processing for {url}: {str(e)}")  
+        return False  
     except Exception as e:  
         logger.error(f"Error in LLM processing for {url}: {str(e)}")  
+        _record_degraded(url, "error")  
         return False  
 
-def is_benchmark_or_dataset_link_rule(url: str, context: str = "") -> bool:  
-    """使用规则判断URL是否是数据集或基准测试相关的链接"""  
-    # 解析URL  
-    parsed = urlparse(url)  
-    domain = parsed.netloc.lower()  
-    path = parsed.path.lower()  
+@retry(  
+    retry=retry_if_exception_type((requests.exceptions.Timeout, requests.exceptions.ConnectionError)),  
+    wait=wait_exponential(multiplier=1, min=2, max=20),  
+    stop=stop_after_attempt(3),  
+    before_sleep=_count_retry  
+)  
+def call_llm_batch_with_retry(items: List[Dict[str, Any]]) -> str:  
+    """一次请求判断多条链接，items 为 [{"id", "url", "context"}, ...]"""  
+    items_text = json.dumps(items, ensure_ascii=False, indent=1)  
+    # 默认的 max_tokens 装不下较长的 JSON 数组  
+    max_tokens = 64 + 16 * len(items)  
+    if LLM_CLIENT is not None:  
+        return LLM_CLIENT.complete(BATCH_PROMPT_TEMPLATE.format(items=items_text), max_tokens=max_tokens)  
+    
+    if not USE_LLM or not llm or not prompt_batch:  
+        return "[]"  
+    
+    wait_for_rate_limit()  
+    
+    chain = prompt_batch | llm.bind(max_tokens=max_tokens)  
+    result = _invoke_llm(chain, {"items": items_text}, BATCH_PROMPT_TEMPLATE.format(items=items_text))  
+    logger.info(f"Batch API call successful for {len(items)} links")  
+    return result  
 
-    # 排除明显不是数据集的域名和路径  
-    exclusion_patterns = [  
-        # 论文网站  
-        'arxiv.org', 'aclanthology.org', 'doi.org', 'scopus.com',  
-        # 博客和新闻  
-        'blog', 'post', 'article', 'news', 'about', 'wiki',  
-        # 公司主页  
-        'company', 'corp', 'inc', 'ltd'
-    ]  
-    
-    # 检查排除模式  
-    for pattern in exclusion_patterns:  
-        if pattern in domain or pattern in path:  
-            return False  
-    
-    # 数据集相关域名和路径关键词  
-    dataset_domains = {  
-        'github.com': ['dataset', 'benchmark', 'data', 'corpus', 'evaluation'],  
-        'huggingface.co': ['datasets'],  
-        'kaggle.com': ['datasets'],  
-        'paperswithcode.com': ['datasets', 'benchmarks'],  
-        'tensorflow.org': ['datasets', 'data'],  
-        'pytorch.org': ['data', 'datasets'],  
-        'zenodo.org': [],  # 整个域名都是数据集相关  
-        'figshare.com': [],  
-        'data.mendeley.com': [],  
-        'datadryad.org': [],  
-        'dataverse.harvard.edu': [],  
-        'catalog.ldc.upenn.edu': [],  
-        'archive.ics.uci.edu': [],
-        # 添加匿名代码仓库  
-        '4open.science': ['dataset', 'benchmark', 'data'],  
-        'anonymous.4open.science': ['dataset', 'benchmark', 'data']  
-    }  
-    
-    # 检查域名  
-    if domain in dataset_domains:  
-        if not dataset_domains[domain]:  # 空列表表示整个域名都是数据集相关  
-            return True  
-        for keyword in dataset_domains[domain]:  
-            if keyword in path:  
-                return True  
-    
-    # 检查路径中的关键词  
-    dataset_keywords = [  
-        'dataset', 'benchmark', 'corpus', 'data-download',   
-        'download-data', 'data/download', 'download/data',  
-        'evaluate', 'evaluation', 'metrics', 'performance',  
-        'leaderboard', 'competition', 'challenge'  
-    ]  
-    for keyword in dataset_keywords:  
-        if keyword in path:  
-            return True  
-    
-    # 检查上下文中的关键词  
-    context_lower = context.lower()  
-    context_keywords = [  
-        'dataset', 'data set', 'benchmark', 'corpus', 'repository',   
-        'evaluation', 'metric', 'leaderboard', 'test set',  
-        'training data', 'test data', 'evaluation data',  
-        'repository for', 'official implementation', 'code for'  
-    ]  
-    for keyword in context_keywords:  
-        if keyword in context_lower:  
-            # 上下文中包含关键词，并且URL看起来不是博客或主页  
-            if not any(x in path for x in ['blog', 'post', 'article', 'news', 'about']):  
-                return True  
-    
-    return False  
+def parse_batch_verdicts(response: str) -> Dict[int, bool]:  
+    """从LLM回复中解析 {id: 是否为数据集链接}，无法解析的条目不出现在结果中"""  
+    verdicts = {}  
+    start, end = response.find('['), response.rfind(']')  
+    if 0 <= start < end:  
+        try:  
+            for item in json.loads(response[start:end + 1]):  
+                if isinstance(item, dict) and 'id' in item and 'verdict' in item:  
+                    verdicts[int(item['id'])] = str(item['verdict']).strip().upper().startswith('YES')  
+            return verdicts  
+        except (ValueError, TypeError):  
+            verdicts = {}  
+    # JSON 不完整（例如回复被截断）时逐条匹配  
+    for m in re.finditer(r'"id"\s*:\s*(\d+)\s*,\s*"verdict"\s*:\s*"(\w+)"', response):  
+        verdicts[int(m.group(1))] = m.group(2).upper().startswith('YES')  
+    return verdicts  
+
+def classify_links_llm(pairs: List[tuple]) -> List[bool]:  
+    """用LLM判断多条 (url, context)；批量模式下分块请求，模型遗漏或解析失败的条目逐条重新判断"""  
+    if not USE_LLM:  
+        return [False] * len(pairs)  
+    if not LLM_BATCH:  
+        return _map_llm(is_benchmark_or_dataset_link_llm, pairs)  
+    
+    results = [None] * len(pairs)  
+    model = llm_model_name()  
+    if LLM_CACHE is not None:  
+        # 已缓存的条目不再发送  
+        for i, (url, context) in enumerate(pairs):  
+            response = LLM_CACHE.lookup(model, BATCH_PROMPT_TEMPLATE, url, context)  
+            if response is not None:  
+                results[i] = response == 'YES'  
+    
+    todo = [i for i in range(len(pairs)) if results[i] is None]  
+    chunks = [todo[start:start + LLM_BATCH_SIZE] for start in range(0, len(todo), LLM_BATCH_SIZE)]  
+    chunk_verdicts = _map_llm(_classify_chunk_llm, [([pairs[i] for i in chunk],) for chunk in chunks])  
+    for chunk, verdicts in zip(chunks, chunk_verdicts):  
+        for j, i in enumerate(chunk):  
+            if j in verdicts:  
+                results[i] = verdicts[j]  
+                if LLM_CACHE is not None:  
+                    LLM_CACHE.store(model, BATCH_PROMPT_TEMPLATE, *pairs[i], 'YES' if verdicts[j] else 'NO')  
+    
+    # 模型遗漏或解析失败的条目逐条重新判断  
+    missing = [i for i in range(len(pairs)) if results[i] is None]  
+    if missing:  
+        logger.info(f"LLM omitted {len(missing)}/{len(pairs)} links, classifying them one by one")  
+        fallback = _map_llm(is_benchmark_or_dataset_link_llm, [pairs[i] for i in missing])  
+        for i, is_link in zip(missing, fallback):  
+            results[i] = is_link  
+    return results  
+
+def _classify_chunk_llm(chunk: List[tuple]) -> Dict[int, bool]:  
+    """一次请求判断一块链接，:return: {块内序号: 是否为数据集链接}，请求失败时为空"""  
+    if LLM_CACHE is not None and not LLM_CACHE.online:  
+        # 回放模式不发送请求，未录制的条目交给逐条判断（同样只查缓存）  
+        return {}  
+    items = [{"id": i, "url": url, "context": context} for i, (url, context) in enumerate(chunk)]  
+    try:  
+        logger.info(f"Analyzing {len(chunk)} links with one LLM request")  
+        return parse_batch_verdicts(_call_through_breaker(call_llm_batch_with_retry, items))  
+    except CircuitOpenError:  
+        # 逐条判断同样会被熔断，并记录为只按规则判断  
+        return {}  
+    except Exception as e:  
+        logger.error(f"Batch LLM call failed, falling back to per-link calls: {str(e)}")  
+        return {}  
+
+def _map_llm(func, args_list: List[tuple]) -> list:  
+    """对每组参数调用 func；有异步客户端时多条请求同时在途，由客户端按RPM/TPM预算限速"""  
+    if LLM_CLIENT is None or len(args_list) < 2:  
+        return [func(*args) for args in args_list]  
+    with ThreadPoolExecutor(max_workers=LLM_CLIENT.max_concurrency) as pool:  
+        return list(pool.map(lambda args: func(*args), args_list))  
+
+def is_benchmark_or_dataset_link_rule(url: str, context: str = "") -> bool:
+    """使用规则判断URL是否是数据集或基准测试相关的链接，规则见 rules.json"""
+    return get_rule_engine().classify(url, context)[0]
 
 def is_benchmark_or_dataset_link(url: str, context: str = "") -> bool:  
     """结合规则和LLM判断URL是否是数据集或基准测试相关的链接"""  
@@ -346,6 +505,27 @@ def is_benchmark_or_dataset_link(url: str, context: str = "") -> bool:
     
     return False  
 
+def find_relevant_contexts(url: str, contexts: List[str]) -> List[str]:  
+    """判断一个URL：规则命中的上下文全部保留；都未命中时合并去重所有上下文，只调用一次LLM"""  
+    relevant_contexts = [c for c in contexts if is_benchmark_or_dataset_link_rule(url, c)]  
+    if relevant_contexts:  
+        logger.info(f"Rule-based method classified {url} as dataset/benchmark")  
+        return relevant_contexts  
+    
+    if not USE_LLM:  
+        return []  
+    merged = merge_contexts(url, contexts, LLM_CONTEXT_TOKENS, compress=COMPRESS_CONTEXT)  
+    # 预分类器有把握时直接判断，只有不确定的才调用LLM  
+    decision = PRECLASSIFIER.decide(url, merged) if PRECLASSIFIER is not None else None  
+    if decision is not None:  
+        reason = "Pre-classifier"  
+    else:  
+        decision, reason = is_benchmark_or_dataset_link_llm(url, merged), "LLM method"  
+    if decision:  
+        logger.info(f"{reason} classified {url} as dataset/benchmark")  
+        return list(contexts)  
+    return []  
+
 def extract_text_from_pdf(pdf_url: str) -> str:  
     """从URL下载PDF并提取文本内容"""  
     try:  
@@ -412,14 +592,12 @@ def extract_benchmark_links_from_paper(pdf_url: str) -> Dict[str, List[str]]:
     # 从文本中提取所有URL及上下文  
     all_urls = extract_urls_from_text(text)  
     
-    # 筛选数据集和基准测试相关链接  
+    # 筛选数据集和基准测试相关链接，同一链接的不同写法只判断一次  
     benchmark_links = {}  
-    for url, contexts in all_urls.items():  
+    for key, group in group_urls(all_urls).items():  
+        url = group["url"]  
         # 对URL的所有上下文进行检查  
-        relevant_contexts = []  
-        for context in contexts:  
-            if is_benchmark_or_dataset_link(url, context):  
-                relevant_contexts.append(context)  
+        relevant_contexts = find_relevant_contexts(url, group["contexts"])  
         
         # 如果该URL被识别为数据集/基准测试链接，保存所有相关上下文  
         if relevant_contexts:  
@@ -472,6 +650,7 @@ def process_conference(url: str, output_file: str, limit: int = None) -> None:
         
         try:  
             print(f"  分析论文中的数据集链接")  
+            get_llm_metrics().begin_paper(pdf_url.split('id=')[-1] if 'id=' in pdf_url else f"paper_{i+1}")  
             
             # 提取论文中的基准测试链接  
             benchmark_links = extract_benchmark_links_from_paper(pdf_url)  
@@ -519,6 +698,8 @@ def process_conference(url: str, output_file: str, limit: int = None) -> None:
     result = list(unique_urls.values())  
     save_json(output_file, result)  
     print(f"处理完成。找到 {len(result)} 个唯一数据集/基准测试链接")  
+    if USE_LLM:  
+        print(get_llm_metrics().table())  
 
 def main():  
     """主函数，处理命令行参数"""  
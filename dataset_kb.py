@@ -0,0 +1,307 @@
+"""
+An offline knowledge base that maps dataset names (and their aliases) to
+canonical download / repository urls, so that dataset names found by
+pdf_url.find_dataset_in_file() can be resolved without starting a browser
+for bing.bing_search().
+
+The knowledge base is built from our own outputs (test/*.json, results of
+past runs) and from importable dumps, and is saved as a single json file.
+
+Example usage:
+>>> kb = DatasetKB()
+>>> kb.add_records(json.load(open('test/iclr_2025_oral.json')))
+>>> kb.add('ADE20K', 'https://github.com/CSAILVision/ADE20K')
+>>> kb.save('dataset_kb.json')
+>>> DatasetKB.load('dataset_kb.json').lookup('ADE-20K')
+['https://github.com/CSAILVision/ADE20K']
+
+Command line:
+    python dataset_kb.py build test/*.json -o dataset_kb.json
+    python dataset_kb.py import dump.csv -o dataset_kb.json
+    python dataset_kb.py lookup "ADE-20K" --kb dataset_kb.json
+"""
+import argparse
+import csv
+import difflib
+import json
+import os
+import re
+import sys
+from urllib.parse import urlparse
+
+DEFAULT_KB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dataset_kb.json')
+
+# words that do not distinguish one dataset from another.
+_SUFFIX_WORDS = ('dataset', 'datasets', 'benchmark', 'benchmarks', 'corpus', 'data')
+
+# hosts whose urls are preferred when a name maps to several urls.
+_HOST_PRIORITY = {
+    'huggingface.co': 0,
+    'github.com': 1,
+    'kaggle.com': 2,
+    'zenodo.org': 3,
+    'figshare.com': 3,
+}
+
+# "The DarkBench benchmark is available at ..."
+_CONTEXT_NAME_PATTERN = re.compile(
+    r'\b([A-Z][\w\-]*(?:\s+[A-Z0-9][\w\-]*){0,2})\s+(?:dataset|benchmark|corpus)\b')
+
+_STOP_NAMES = {'the', 'our', 'this', 'such', 'a', 'an', 'we', 'in', 'of', 'url'}
+
+# links to papers: names found in their contexts are titles, not datasets.
+_CITATION_HOSTS = ('arxiv.org', 'doi.org', 'aclanthology.org', 'aclweb.org',
+                   'semanticscholar.org', 'openreview.net', 'dl.acm.org')
+
+
+def normalize_name(name: str) -> str:
+    """
+    Map a dataset name to its lookup key.
+
+    >>> normalize_name('ADE-20K dataset')
+    'ade20k'
+    >>> normalize_name('ade 20k')
+    'ade20k'
+    """
+    words = re.split(r'[\s_]+', name.strip().lower())
+    while len(words) > 1 and words[-1] in _SUFFIX_WORDS:
+        words.pop()
+    return re.sub(r'[^a-z0-9]', '', ''.join(words))
+
+
+def _trigrams(key: str) -> set:
+    padded = '  ' + key + ' '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def names_from_url(url: str) -> list:
+    """
+    Guess dataset names from the path of a well-known hosting site.
+
+    >>> names_from_url('https://huggingface.co/datasets/anonymous152311/darkbench')
+    ['darkbench', 'anonymous152311/darkbench']
+    """
+    if '://' not in url:
+        url = 'https://' + url
+    parsed = urlparse(url)
+    host = parsed.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    parts = [p for p in parsed.path.split('/') if p]
+
+    if host == 'github.com' and len(parts) >= 2:
+        return [parts[1], parts[0] + '/' + parts[1]]
+    if host == 'huggingface.co' and len(parts) >= 3 and parts[0] == 'datasets':
+        return [parts[2], parts[1] + '/' + parts[2]]
+    if host == 'kaggle.com' and len(parts) >= 3 and parts[0] == 'datasets':
+        return [parts[2]]
+    if host == 'paperswithcode.com' and len(parts) >= 2 and parts[0] == 'dataset':
+        return [parts[1]]
+    return []
+
+
+def names_from_context(context: str) -> list:
+    """Find "<Name> dataset/benchmark/corpus" mentions in a context."""
+    ret = []
+    for name in _CONTEXT_NAME_PATTERN.findall(context):
+        words = name.split()
+        while words and words[0].lower() in _STOP_NAMES:
+            words = words[1:]
+        if words:
+            ret.append(' '.join(words))
+    return ret
+
+
+class DatasetKB:
+    """
+    An in-memory, indexed mapping from normalized dataset names to urls.
+
+    Exact lookups are a single dict access; fuzzy lookups only compare
+    against keys sharing a character trigram with the query.
+    """
+
+    def __init__(self):
+        # key -> {"name": display name, "urls": {url: count}}
+        self.entries = {}
+        # trigram -> set of keys
+        self._index = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, name: str, url: str, count: int = 1) -> None:
+        key = normalize_name(name)
+        if len(key) < 2 or not url:
+            return
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = {'name': name.strip(), 'urls': {}}
+            self.entries[key] = entry
+            for gram in _trigrams(key):
+                self._index.setdefault(gram, set()).add(key)
+        entry['urls'][url] = entry['urls'].get(url, 0) + count
+
+    def add_records(self, records: list) -> int:
+        """
+        Add the output records of a run, i.e. a list of
+        {"url": ..., "contexts": [...]} dicts as written by save_json().
+        :return: number of (name, url) pairs added.
+        """
+        added = 0
+        for record in records:
+            url = record.get('url') if isinstance(record, dict) else None
+            if not url:
+                continue
+            names = names_from_url(url)
+            host = urlparse(url if '://' in url else 'https://' + url).netloc.lower()
+            if not any(host.endswith(h) for h in _CITATION_HOSTS):
+                for context in record.get('contexts') or []:
+                    names += names_from_context(context)
+            for name in dict.fromkeys(names):
+                self.add(name, url)
+                added += 1
+        return added
+
+    def import_dump(self, path: str) -> int:
+        """
+        Import a dump of known datasets. Supported formats:
+        - json: {"name": "url" | ["url", ...]} or
+                [{"name": ..., "url": ..., "aliases": [...]}, ...]
+                or the output records of a run.
+        - csv/tsv: one `name,url[,alias...]` per line.
+        :return: number of (name, url) pairs added.
+        """
+        added = 0
+        if path.endswith('.json'):
+            with open(path, 'r', encoding='utf-8') as fobj:
+                data = json.load(fobj)
+            if isinstance(data, dict):
+                for name, urls in data.items():
+                    for url in ([urls] if isinstance(urls, str) else urls):
+                        self.add(name, url)
+                        added += 1
+            elif data and isinstance(data[0], dict) and 'name' in data[0]:
+                for item in data:
+                    for name in [item['name']] + list(item.get('aliases', [])):
+                        self.add(name, item['url'])
+                        added += 1
+            else:
+                added += self.add_records(data)
+            return added
+
+        delimiter = '\t' if path.endswith('.tsv') else ','
+        with open(path, 'r', encoding='utf-8', newline='') as fobj:
+            for row in csv.reader(fobj, delimiter=delimiter):
+                if len(row) < 2 or row[0].startswith('#'):
+                    continue
+                url = row[1].strip()
+                for name in [row[0]] + row[2:]:
+                    self.add(name, url)
+                    added += 1
+        return added
+
+    def _ranked_urls(self, key: str) -> list:
+        urls = self.entries[key]['urls']
+
+        def rank(url):
+            host = urlparse(url if '://' in url else 'https://' + url).netloc.lower()
+            if host.startswith('www.'):
+                host = host[4:]
+            return (-urls[url], _HOST_PRIORITY.get(host, 9), len(url))
+
+        return sorted(urls, key=rank)
+
+    def lookup(self, name: str, fuzzy: bool = True, cutoff: float = 0.85) -> list:
+        """
+        :return: urls for the dataset, best first; empty if unknown.
+        """
+        key = normalize_name(name)
+        if key in self.entries:
+            return self._ranked_urls(key)
+        if not fuzzy or len(key) < 3:
+            return []
+        match = self.fuzzy_match(key, cutoff)
+        return self._ranked_urls(match) if match else []
+
+    def fuzzy_match(self, key: str, cutoff: float = 0.85):
+        """:return: the closest known key, or None."""
+        candidates = set()
+        for gram in _trigrams(key):
+            candidates |= self._index.get(gram, set())
+        best, best_ratio = None, cutoff
+        matcher = difflib.SequenceMatcher(b=key)
+        for cand in candidates:
+            matcher.set_seq1(cand)
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = cand, ratio
+        return best
+
+    def save(self, path: str = DEFAULT_KB_FILE) -> None:
+        with open(path, 'w', encoding='utf-8') as fobj:
+            json.dump(self.entries, fobj, ensure_ascii=False, indent=1)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_KB_FILE) -> 'DatasetKB':
+        kb = cls()
+        if not os.path.exists(path):
+            return kb
+        with open(path, 'r', encoding='utf-8') as fobj:
+            entries = json.load(fobj)
+        for key, entry in entries.items():
+            kb.entries[key] = entry
+            for gram in _trigrams(key):
+                kb._index.setdefault(gram, set()).add(key)
+        return kb
+
+
+def build_kb(paths: list) -> DatasetKB:
+    """Build a knowledge base from output files and dumps."""
+    kb = DatasetKB()
+    for path in paths:
+        try:
+            n = kb.import_dump(path)
+        except Exception as e:
+            print(f"skip {path}: {e}", file=sys.stderr)
+            continue
+        print(f"{path}: {n} entries", file=sys.stderr)
+    return kb
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline dataset name -> url knowledge base')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_build = sub.add_parser('build', help='build a new knowledge base from outputs/dumps')
+    p_build.add_argument('inputs', nargs='+')
+    p_build.add_argument('-o', '--output', default=DEFAULT_KB_FILE)
+
+    p_import = sub.add_parser('import', help='import dumps into an existing knowledge base')
+    p_import.add_argument('inputs', nargs='+')
+    p_import.add_argument('-o', '--output', default=DEFAULT_KB_FILE)
+
+    p_lookup = sub.add_parser('lookup', help='look up dataset names')
+    p_lookup.add_argument('names', nargs='+')
+    p_lookup.add_argument('--kb', default=DEFAULT_KB_FILE)
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        kb = build_kb(args.inputs)
+        kb.save(args.output)
+        print(f"{len(kb)} names saved to {args.output}", file=sys.stderr)
+    elif args.command == 'import':
+        kb = DatasetKB.load(args.output)
+        for path in args.inputs:
+            print(f"{path}: {kb.import_dump(path)} entries", file=sys.stderr)
+        kb.save(args.output)
+        print(f"{len(kb)} names saved to {args.output}", file=sys.stderr)
+    else:
+        kb = DatasetKB.load(args.kb)
+        for name in args.names:
+            print(name, '->', kb.lookup(name))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+A small persistent key-value cache with an optional time-to-live, backed by
+sqlite3 so that it needs no extra dependency and can be shared by several
+threads or processes of a run.
+
+Values must be json-serializable. Expired entries are never returned, and
+are removed from the file each time a cache with a ttl is opened.
+
+Example usage:
+>>> cache = DiskCache('.cache/search.sqlite', ttl=7 * 24 * 3600)
+>>> cache.set('mnist dataset', ['http://yann.lecun.com/exdb/mnist/'])
+>>> cache.get('mnist dataset')
+['http://yann.lecun.com/exdb/mnist/']
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+
+def cache_path(name: str) -> str:
+    """:return: path of the cache file `name` in the default cache directory."""
+    return os.path.join(DEFAULT_CACHE_DIR, name)
+
+
+class DiskCache:
+
+    def __init__(self, path: str, ttl: float = None, table: str = 'cache'):
+        """
+        :param path: sqlite file, created if missing.
+        :param ttl: seconds an entry stays valid, None for no expiry.
+        :param table: table name, so several caches can share one file.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.table = table
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            f"(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)")
+        conn.commit()
+        # prune on open, so that the file does not keep growing across runs.
+        self.purged = self.purge_expired()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite connections must not be shared across threads.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _valid(self, created: float) -> bool:
+        return self.ttl is None or time.time() - created < self.ttl
+
+    def get(self, key: str, default=None):
+        row = self._conn().execute(
+            f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None or not self._valid(row[1]):
+            return default
+        return json.loads(row[0])
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, self) is not self
+
+    def get_many(self, keys: list) -> dict:
+        """:return: {key: value} for the keys that are cached and not expired."""
+        ret = {}
+        keys = list(keys)
+        conn = self._conn()
+        # stay below sqlite's limit on the number of host parameters.
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            marks = ','.join('?' * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, value, created FROM {self.table} WHERE key IN ({marks})", chunk)
+            for key, value, created in rows:
+                if self._valid(created):
+                    ret[key] = json.loads(value)
+        return ret
+
+    def set(self, key: str, value) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, items: dict) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, created) VALUES (?, ?, ?)",
+            [(k, json.dumps(v, ensure_ascii=False), now) for k, v in items.items()])
+        conn.commit()
+
+    def delete(self, key: str) -> None:
+        conn = self._conn()
+        conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        conn.commit()
+
+    def purge_expired(self) -> int:
+        """:return: number of removed entries."""
+        if self.ttl is None:
+            return 0
+        conn = self._conn()
+        cur = conn.execute(
+            f"DELETE FROM {self.table} WHERE created < ?", (time.time() - self.ttl,))
+        conn.commit()
+        return cur.rowcount
+
+    def items(self):
+        """:return: an iterator over the (key, value) pairs that are not expired."""
+        rows = self._conn().execute(f"SELECT key, value, created FROM {self.table}")
+        for key, value, created in rows:
+            if self._valid(created):
+                yield key, json.loads(value)
+
+    def __len__(self) -> int:
+        return self._conn().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self) -> None:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
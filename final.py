@@ -18,10 +18,28 @@ from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_excep
 
 # 导入原始函数  
 from pdf_url import pdf_find_url
+from paper_sections import tag_urls, section_policy
+from pdf_layout import layout_score
+from url_store import URLStore, DEFAULT_STORE_FILE
+from url_canon import canonical_key, group_urls
+from link_validator import validate_urls, is_dead
+from redirect_resolver import resolve_redirects
+from rule_engine import get_rule_engine
+from llm_client import AsyncLLMClient, DEFAULT_HEDGE_BUDGET, DEFAULT_MODEL, DEFAULT_RPM, DEFAULT_TPM, parse_verdict, estimate_tokens
+from llm_budget import LLMBudget, parse_budget, priority, DEFAULT_RESERVE
+from llm_batch_job import BatchJob, BatchClient
+from llm_router import TieredLLMClient, DEFAULT_MIN_CONFIDENCE
+from llm_cache import LLMCache, MODES
+from llm_context import merge_contexts, DEFAULT_TOKEN_BUDGET
+from llm_metrics import get_llm_metrics
+from preclassifier import PreClassifier
+from circuit_breaker import CircuitBreaker, load_degraded, write_degraded, DEFAULT_FAILURE_THRESHOLD, DEFAULT_RESET_TIMEOUT
+from verdict_cache import get_verdict_cache, url_key, context_key, DEFAULT_MAXSIZE
 # can_access, is_url, find_node_with_url, process_pdf, process_text, find_context
 from openreview import fetch_paper  
-from combine import is_benchmark_or_dataset_link, _on_error, _log, setup_llm, extract_text_from_pdf, extract_urls_from_text, save_json
-# verify_dataset_candidate, is_benchmark_or_dataset_link_llm, is_benchmark_or_dataset_link_rule, call_llm_with_retry 
+import combine
+from combine import classify_links_llm, _on_error, _log, setup_llm, extract_text_from_pdf, extract_urls_from_text, save_json
+# verify_dataset_candidate, is_benchmark_or_dataset_link_rule, call_llm_with_retry 
 
 # LangChain相关导入  
 try:  
@@ -42,310 +60,296 @@ llm = None
 prompt_link = None  
 RATE_LIMIT_DELAY = 3  
 LAST_API_CALL_TIME = 0  
+RESOLVE_REDIRECTS = False  
+LLM_METRICS_FILE = None  
+# 只按规则判断（LLM熔断或出错）的链接写入此文件；REQUEUE_PAPERS 不为空时只处理这些论文  
+DEGRADED_FILE = None  
+REQUEUE_PAPERS = None  
+# 重新处理时本次没有处理到的论文（如受 --limit 限制）的降级记录，写回降级文件  
+REQUEUE_CARRY = []  
+# 批量作业模式（llm_batch_job.BatchJob）：待LLM判断的链接写入批量请求，不逐条调用  
+BATCH_JOB = None  
+BATCH_CLIENT = None  
+# 论文ID -> 结果记录中的来源字段（paper_url/paper_id 或 pdf_path），回收批量结果时使用  
+BATCH_SOURCES = {}  
+# 整个运行的LLM用量上限（llm_budget.LLMBudget），None 表示不限；超出预算的链接只按规则判断  
+LLM_BUDGET = None  
+BUDGET_FILE = None  
+# 按链接所在章节直接排除的链接数（原因 -> 数量），如只出现在参考文献中的论文引用  
+SECTION_STATS = {}  
+# 用 pdftohtml -xml 记录链接的页码、位置和字号（pdf_layout.py），标记首页、脚注和图表标题中的链接  
+LAYOUT_MODE = False  
+# 跨运行的URL库（url_store.URLStore）：先查已有结论，再做规则和LLM判断，结论、可访问性和引用论文写回  
+URL_STORE = None  
 
 
-def extract_benchmark_links_from_paper(pdf_url: str) -> Dict[str, List[str]]:  
-    """从论文中提取数据集和基准测试相关链接，整合pdf_find_url功能"""  
-    try:  
-        # 下载PDF并保存到临时文件  
-        response = requests.get(pdf_url)  
-        response.raise_for_status()  
-        
-        # 创建临时文件  
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_pdf:  
-            temp_pdf.write(response.content)  
-            temp_pdf_path = temp_pdf.name  
-        
-        logger.info(f"PDF已下载到临时文件: {temp_pdf_path}")  
-        
-        # 使用pdf_find_url提取所有URL及上下文  
-        all_urls_from_pdf_find = pdf_find_url(temp_pdf_path)  
-        
-        # 修改上下文格式，确保与extract_urls_from_text一致  
-        all_urls = {}  
-        for url, contexts in all_urls_from_pdf_find.items():  
-            all_urls[url] = contexts  
-        
-        # 如果pdf_find_url返回为空或结果非常少，尝试使用原始方法作为补充  
-        if len(all_urls) < 5:  # 阈值可以调整  
-            logger.warning(f"pdf_find_url仅找到 {len(all_urls)} 个URL，尝试补充使用原始方法")  
-            text = extract_text_from_pdf(pdf_url)  
-            additional_urls = extract_urls_from_text(text)  
-            
-            # 将原始方法找到的URL合并到结果中  
-            for url, contexts in additional_urls.items():  
-                if url not in all_urls:  
-                    all_urls[url] = contexts  
-                else:  
-                    all_urls[url].extend(contexts)  
-        
-        # 筛选数据集和基准测试相关链接  
-        benchmark_links = {}  
-        for url, contexts in all_urls.items():  
-            # 对URL的所有上下文进行检查  
-            relevant_contexts = []  
-            for context in contexts:  
-                if is_benchmark_or_dataset_link(url, context):  
-                    relevant_contexts.append(context)  
-            
-            # 如果该URL被识别为数据集/基准测试链接，保存所有相关上下文  
-            if relevant_contexts:  
-                benchmark_links[url] = relevant_contexts  
-        
-        # 清理临时文件  
-        try:  
-            os.unlink(temp_pdf_path)  
-            text_file = re.sub(r'\.pdf$', r'.txt', temp_pdf_path)  
-            if os.path.exists(text_file):  
-                os.unlink(text_file)  
-        except Exception as e:  
-            logger.warning(f"清理临时文件失败: {str(e)}")  
-        
-        return benchmark_links  
+def group_candidate_urls(all_urls: Dict[str, List[str]], sections: Dict[str, List[str]] = None,  
+                         layout: Dict[str, Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:  
+    """合并同一链接的不同写法；启用跳转解析时，短链接和DOI按最终目标合并，由目标地址参与判断  
     
-    except Exception as e:  
-        _on_error(f"处理PDF失败: {str(e)}")  
-        return {}  
-
-
-def process_conference(url: str, output_file: str, limit: int = None) -> None:  # 逻辑和 combine.py 一样，只不过不能调用 combine.py 内此函数，不然没用新的 extract_benchmark_links_from_paper
-    """处理会议论文，提取数据集和基准测试链接  
-    
-    Args:  
-        url: OpenReview会议URL  
-        output_file: 输出JSON文件路径  
-        limit: 限制处理的论文数量，None表示处理全部  
+    sections 为 paper_sections.tag_urls() 的结果时，每组记录各写法出现过的章节（group["sections"]）；  
+    layout 为 pdf_layout.find_layout() 的结果时，每组合并各写法的位置、标记和优先级（group["layout"]），  
+    版面中的链接按规范化的 canonical_key 对应到各写法，不要求与 pdftotext 得到的写法逐字相同  
     """  
-    print(f"开始处理会议: {url}")  
-    
-    # 获取所有论文PDF链接，这里使用try-except来捕获fetch_paper可能出现的错误  
-    try:  
-        paper_urls = fetch_paper(url)  
-        print(f"找到 {len(paper_urls)} 篇论文")  
-    except Exception as e:  
-        _on_error(f"获取论文失败: {str(e)}")  
-        # 如果fetch_paper失败，我们创建一个空列表  
-        paper_urls = []  
-    
-    # 如果找不到论文或者出错，直接保存空结果并退出  
-    if not paper_urls:  
-        _on_error("未找到论文，请检查会议URL是否正确")  
-        save_json(output_file, [])  
-        print(f"处理完成。找到 0 个唯一数据集/基准测试链接")  
-        return  
-    
-    # 如果设置了limit，只处理指定数量的论文  
-    if limit and limit > 0:  
-        paper_urls = paper_urls[:limit]  
-        print(f"根据限制，将只处理前 {limit} 篇论文")  
-    
-    # 处理每篇论文  
-    all_benchmarks = []  
-    
-    for i, pdf_url in enumerate(paper_urls):  
-        print(f"处理论文 {i+1}/{len(paper_urls)}: {pdf_url}")  
-        
+    redirects = {}  
+    if RESOLVE_REDIRECTS:  
         try:  
-            print(f"  分析论文中的数据集链接")  
-            
-            # 提取论文中的基准测试链接 - 使用整合了pdf_find_url的新函数  
-            benchmark_links = extract_benchmark_links_from_paper(pdf_url)  
-            
-            if benchmark_links:  
-                paper_id = pdf_url.split('id=')[-1] if 'id=' in pdf_url else f"paper_{i+1}"  
-                
-                # 为每个链接创建记录  
-                for url, contexts in benchmark_links.items():  
-                    all_benchmarks.append({  
-                        "url": url,  
-                        "paper_url": pdf_url,  
-                        "paper_id": paper_id,  
-                        "contexts": contexts  
-                    })  
-                
-                print(f"  找到 {len(benchmark_links)} 个数据集/基准测试链接")  
-            else:  
-                print("  未找到数据集/基准测试链接")  
-                
+            redirects = resolve_redirects(list(all_urls))  
+            if redirects:  
+                logger.info(f"解析了 {len(redirects)} 个短链接/跳转链接")  
         except Exception as e:  
-            print(f"  处理失败: {str(e)}")  
-        
-        # 避免请求过于频繁  
-        time.sleep(1)  
-    
-    # 去重处理  
-    unique_urls = {}  
-    for item in all_benchmarks:  
-        url = item["url"]  
-        if url not in unique_urls:  
-            unique_urls[url] = item  
-        else:  
-            # 合并上下文和来源论文  
-            unique_urls[url]["contexts"].extend(item["contexts"])  
-            # 去除重复上下文  
-            unique_urls[url]["contexts"] = list(set(unique_urls[url]["contexts"]))  
-            # 添加源论文记录  
-            if "source_papers" not in unique_urls[url]:  
-                unique_urls[url]["source_papers"] = [unique_urls[url]["paper_id"]]  
-            if item["paper_id"] not in unique_urls[url]["source_papers"]:  
-                unique_urls[url]["source_papers"].append(item["paper_id"])  
-    
-    # 转换为列表并保存  
-    result = list(unique_urls.values())  
-    save_json(output_file, result)  
-    print(f"处理完成。找到 {len(result)} 个唯一数据集/基准测试链接")  
+            _on_error(f"跳转解析失败: {str(e)}")  
+    groups = group_urls(all_urls, redirects)  
+    if sections is not None:  
+        for group in groups.values():  
+            group["sections"] = list(dict.fromkeys(s for form in group["variants"] for s in sections.get(form, [])))  
+    if layout is not None:  
+        by_key = {}  
+        for url, entry in layout.items():  
+            by_key.setdefault(canonical_key(url), []).append(entry)  
+        for group in groups.values():  
+            keys = dict.fromkeys(canonical_key(form) for form in group["variants"])  
+            found = [entry for key in keys for entry in by_key.get(key, [])]  
+            flags = list(dict.fromkeys(f for entry in found for f in entry["flags"]))  
+            group["layout"] = {"positions": [p for entry in found for p in entry["positions"]], "flags": flags,  
+                               "score": max([entry["score"] for entry in found], default=layout_score([]))}  
+    return groups  
 
-def process_local_pdf(pdf_path: str, output_file: str) -> None:  
-    """处理本地PDF文件，提取数据集和基准测试链接"""  
-    print(f"开始处理本地PDF: {pdf_path}")  
-    
-    # 确保文件存在  
-    if not os.path.exists(pdf_path):  
-        _on_error(f"文件不存在: {pdf_path}")  
-        save_json(output_file, [])  
-        return  
-    
-    # 使用pdf_find_url提取所有URL及上下文  
-    all_urls_from_pdf_find = pdf_find_url(pdf_path)  
-    
-    # 补充使用extract_text_from_local_pdf方法  
-    text = extract_text_from_local_pdf(pdf_path)  
-    additional_urls = extract_urls_from_text(text)  
-    
-    # 合并结果  
-    all_urls = {}  
-    for url, contexts in all_urls_from_pdf_find.items():  
-        all_urls[url] = contexts  
-    
-    for url, contexts in additional_urls.items():  
-        if url not in all_urls:  
-            all_urls[url] = contexts  
-        else:  
-            all_urls[url].extend(contexts)  
-    
-    # 筛选数据集和基准测试相关链接  
+
+def classify_url_groups(groups: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:  
+    """对 group_urls() 合并后的链接逐组判断，同一链接的不同写法只判断一次  
+    
+    规则命中的上下文全部保留；规则都未命中时，把该URL的所有上下文去重、按token预算截断后  
+    合并成一条，每篇论文每个URL只调用一次LLM，判断为是则保留全部上下文。  
+    判断结果缓存在整个运行共享的 verdict_cache 中：只依赖URL的结果按规范化URL缓存，  
+    LLM的结果按 (URL, 合并后上下文的指纹) 缓存，跨论文复用。  
+    启用 URL_STORE 时先查URL库：人工和URL规则的结论按URL直接使用；预分类器和LLM的结论依赖上下文，  
+    按 (URL, 合并后上下文的指纹) 存取（与 verdict_cache.context_key 相同），只有上下文相同时才复用。  
+    本篇论文得出的结论写回URL库  
+    """  
+    engine = get_rule_engine()  
+    cache = get_verdict_cache()  
     benchmark_links = {}  
-    for url, contexts in all_urls.items():  
-        # 对URL的所有上下文进行检查  
-        relevant_contexts = []  
+    reasons = {}  
+    pending = {}  # 等待LLM判断的 context_key -> [url, 合并后的上下文, 该URL的所有上下文]  
+    learned = []  # 写回URL库的只依赖URL的 (url, 结论, 来源, 原因)  
+    decided = []  # 写回URL库的依赖上下文的 (url, 合并后的上下文, 结论, 来源, 原因)  
+    known = _store_lookup([group["url"] for group in groups.values()])  
+    store_hits = 0  # 直接用URL库中的结论判断的链接数  
+    for group in groups.values():  
+        url, contexts = group["url"], group["contexts"]  
+        row = known.get(url)  
+        if row is not None and row["verdict"] is not None:  
+            store_hits += 1  
+            if row["verdict"]:  
+                benchmark_links[url], reasons[url] = list(contexts), f"Store {row['source']}"  
+            continue  
+        # 按所在章节直接排除（如只出现在参考文献中的论文引用），不经过规则和LLM  
+        decision, reason = section_policy(url, group.get("sections"))  
+        if decision is False:  
+            SECTION_STATS[reason] = SECTION_STATS.get(reason, 0) + 1  
+            continue  
+        decision, rule = cache.get_or_set(url_key(url), lambda: engine.classify_url(url))  
+        if decision is not None:  
+            learned.append((url, decision, "rule", f"Rule {rule}"))  
+            if decision:  
+                benchmark_links[url], reasons[url] = list(contexts), f"Rule {rule}"  
+            continue  
+        
+        # 规则 URL 部分无法判断，rule 为路径，逐条检查上下文规则  
         for context in contexts:  
-            if is_benchmark_or_dataset_link(url, context):  
-                relevant_contexts.append(context)  
+            is_link, context_rule = engine.classify_context(rule, context)  
+            if is_link:  
+                benchmark_links.setdefault(url, []).append(context)  
+                reasons.setdefault(url, f"Rule {context_rule}")  
+        if url in benchmark_links or not combine.USE_LLM:  
+            continue  
         
-        # 如果该URL被识别为数据集/基准测试链接，保存所有相关上下文  
-        if relevant_contexts:  
-            benchmark_links[url] = relevant_contexts  
-    
-    # 创建结果记录  
-    all_benchmarks = []  
-    for url, contexts in benchmark_links.items():  
-        all_benchmarks.append({  
-            "url": url,  
-            "pdf_path": pdf_path,  
-            "contexts": contexts  
-        })  
-    
-    # 保存结果  
-    save_json(output_file, all_benchmarks)  
-    print(f"处理完成。找到 {len(benchmark_links)} 个唯一数据集/基准测试链接")  
+        # 规则都未命中，合并上下文后交给LLM判断一次  
+        merged = merge_contexts(url, contexts, combine.LLM_CONTEXT_TOKENS, compress=combine.COMPRESS_CONTEXT)  
+        key = context_key(url, merged)  
+        cached = cache.get(key)  
+        if cached is None:  
+            pending[key] = (url, merged, contexts)  
+        elif cached[0]:  
+            benchmark_links[url], reasons[url] = list(contexts), cached[1]  
+    
+    # 之前的运行对同一URL、同一合并后上下文得出的结论直接使用  
+    if pending:  
+        stored = _store_lookup_contexts([pending[key][:2] for key in pending])  
+        for key in [key for key in pending if pending[key][:2] in stored]:  
+            url, merged, contexts = pending.pop(key)  
+            row = stored[(url, merged)]  
+            store_hits += 1  
+            cache.set(key, (row["verdict"], f"Store {row['source']}"))  
+            if row["verdict"]:  
+                benchmark_links[url], reasons[url] = list(contexts), f"Store {row['source']}"  
+    if URL_STORE is not None:  
+        URL_STORE.count(store_hits, len(groups) - store_hits)  
+    
+    # 预分类器有把握的直接判断，只把不确定的交给LLM  
+    if pending and combine.PRECLASSIFIER is not None:  
+        keys = list(pending)  
+        for key, decision in zip(keys, combine.PRECLASSIFIER.decide_many([pending[k][:2] for k in keys])):  
+            if decision is None:  
+                continue  
+            url, merged, contexts = pending.pop(key)  
+            cache.set(key, (decision, "Pre-classifier"))  
+            decided.append((url, merged, decision, "preclassifier", "Pre-classifier"))  
+            if decision:  
+                benchmark_links[url], reasons[url] = list(contexts), "Pre-classifier"  
+    
+    # 批量作业模式：已缓存的直接使用，其余写入批量请求，回收结果后再并入输出文件  
+    if pending and BATCH_JOB is not None:  
+        template = combine.link_prompt_template()  
+        for key, (url, merged, contexts) in pending.items():  
+            response = combine.LLM_CACHE.lookup(BATCH_JOB.model, template, url, merged) if combine.LLM_CACHE is not None else None  
+            if response is not None:  
+                is_link = parse_verdict(response) is True  
+                cache.set(key, (is_link, "LLM method"))  
+                decided.append((url, merged, is_link, "llm", "LLM method"))  
+                if is_link:  
+                    benchmark_links[url], reasons[url] = list(contexts), "LLM method"  
+                continue  
+            BATCH_JOB.add(key, template.format(url=url, context_text=merged), combine.VERDICT_MAX_TOKENS[combine.LLM_VERDICT],  
+                          {"paper": get_llm_metrics().paper, "url": url, "context": merged, "contexts": list(contexts)})  
+        pending = {}  
+    
+    # 按预期收益排序（发布声明、规则差一点命中的在前，参考文献里的在后），超出预算的只按规则判断  
+    if pending:  
+        sections = {group["url"]: group.get("sections") for group in groups.values()}  
+        layout = {group["url"]: group["layout"] for group in groups.values() if "layout" in group}  
+        order = {key: priority(url, contexts, sections.get(url), layout.get(url, {}).get("flags"))  
+                 for key, (url, _, contexts) in pending.items()}  
+        # 优先级相同时按版面位置的优先级（首页脚注在前）  
+        rank = {key: (-order[key], -layout.get(url, {}).get("score", 0)) for key, (url, _, _) in pending.items()}  
+        pending = dict(sorted(pending.items(), key=lambda kv: rank[kv[0]]))  
+        if LLM_BUDGET is not None:  
+            keys = list(pending)  
+            admitted = LLM_BUDGET.admit([(order[key], _llm_cost(*pending[key][:2])) for key in keys])  
+            for key, ok in zip(keys, admitted):  
+                if not ok:  
+                    LLM_BUDGET.record_skipped(pending.pop(key)[0], paper=get_llm_metrics().paper, priority=order[key])  
+    
+    # 批量模式下整篇论文合并请求  
+    if pending:  
+        keys = list(pending)  
+        breaker = combine.LLM_BREAKER  
+        seen = len(breaker.degraded) if breaker is not None else 0  
+        llm_results = classify_links_llm([pending[key][:2] for key in keys])  
+        # 熔断或出错时只按规则判断的链接不缓存，之后还要重新判断  
+        degraded = {d['url'] for d in breaker.degraded[seen:]} if breaker is not None else set()  
+        for key, is_link in zip(keys, llm_results):  
+            url, merged, contexts = pending[key]  
+            if url not in degraded:  
+                cache.set(key, (is_link, "LLM method"))  
+                decided.append((url, merged, is_link, "llm", "LLM method"))  
+            if is_link:  
+                benchmark_links[url], reasons[url] = list(contexts), "LLM method"  
+    
+    _store_record([group["url"] for group in groups.values()], learned, decided, get_llm_metrics().paper)  
+    for url in benchmark_links:  
+        logger.info(f"{reasons[url]} classified {url} as dataset/benchmark")  
+    return benchmark_links  
 
-def extract_text_from_local_pdf(pdf_path: str) -> str:  
-    """从本地PDF文件提取文本内容"""  
+
+def _store_lookup(urls: List[str]) -> Dict[str, Dict[str, Any]]:  
+    """URL库中已有的记录；未启用或读取失败时为空"""  
+    if URL_STORE is None:  
+        return {}  
     try:  
-        # 使用PyPDF2提取文本  
-        with open(pdf_path, 'rb') as file:  
-            reader = PyPDF2.PdfReader(file)  
-            
-            text = ""  
-            for page_num in range(len(reader.pages)):  
-                page_text = reader.pages[page_num].extract_text()  
-                if page_text:  
-                    text += page_text + "\n"  
-            
-            return text  
+        return URL_STORE.lookup_many(urls)  
     except Exception as e:  
-        _on_error(f"本地PDF处理失败: {str(e)}")  
-        return ""  
+        _on_error(f"URL库读取失败: {str(e)}")  
+        return {}  
 
-def main():  
-    """主函数，处理命令行参数"""  
-    parser = argparse.ArgumentParser(description='从OpenReview会议或本地PDF提取数据集和基准测试链接')  
-    
-    # 创建互斥组，要么处理会议，要么处理本地PDF  
-    source_group = parser.add_mutually_exclusive_group(required=True)  
-    source_group.add_argument('--conference', type=str, help='OpenReview会议URL')  
-    source_group.add_argument('--pdf', type=str, help='本地PDF文件路径')  
-    
-    parser.add_argument('-o', '--output', type=str, required=True, help='输出JSON文件路径')  
-    parser.add_argument('-l', '--limit', type=int, default=10, help='限制处理的论文数量，默认为10')  
-    parser.add_argument('--use-llm', action='store_true', help='是否使用LLM辅助判断，需要OpenAI API密钥')  
-    parser.add_argument('--openai-key', type=str, help='OpenAI API密钥')  
-    
-    args = parser.parse_args()  
-    
-    # 检查是否启用LLM  
-    if args.use_llm:  
-        if setup_llm(args.openai_key):  
-            print("使用LLM辅助判断已启用")  
-        else:  
-            print("LLM设置失败，将仅使用规则方法")  
-    
-    # 根据参数选择处理会议或本地PDF  
-    if args.conference:  
-        process_conference(args.conference, args.output, args.limit)  
-    elif args.pdf:  
-        process_local_pdf(args.pdf, args.output)  
 
-if __name__ == "__main__":  
-    main()
-import json  
-import os  
-import time  
-import re  
-import argparse  
-import tempfile  
-import subprocess  
-import html  
-import sys  
-from typing import List, Dict, Any, Set, Optional  
-from urllib.parse import urlparse, urlunparse  
-import requests  
-import PyPDF2  
-import io  
-import logging  
-from bs4 import BeautifulSoup  
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type  
+def _store_lookup_contexts(pairs: List[tuple]) -> Dict[tuple, Dict[str, Any]]:  
+    """URL库中同一 (URL, 合并后上下文) 已有的结论；未启用或读取失败时为空"""  
+    if URL_STORE is None:  
+        return {}  
+    try:  
+        return URL_STORE.lookup_contexts(pairs)  
+    except Exception as e:  
+        _on_error(f"URL库读取失败: {str(e)}")  
+        return {}  
 
-# 导入原始函数  
-from pdf_url import pdf_find_url
-# can_access, is_url, find_node_with_url, process_pdf, process_text, find_context
-from openreview import fetch_paper  
-from combine import is_benchmark_or_dataset_link, _on_error, _log, setup_llm, extract_text_from_pdf, extract_urls_from_text, save_json
-# verify_dataset_candidate, is_benchmark_or_dataset_link_llm, is_benchmark_or_dataset_link_rule, call_llm_with_retry 
 
-# LangChain相关导入  
-try:  
-    from langchain_openai import OpenAI  
-    from langchain_core.prompts import PromptTemplate  
-    from langchain.chains.llm import LLMChain  
-    LANGCHAIN_AVAILABLE = True  
-except ImportError:  
-    LANGCHAIN_AVAILABLE = False  
+def _store_record(urls: List[str], verdicts: List[tuple], decided: List[tuple], paper: str) -> None:  
+    """记录论文中出现的链接、只依赖URL的结论和依赖上下文的结论，写入失败不影响本次结果"""  
+    if URL_STORE is None:  
+        return  
+    try:  
+        URL_STORE.record_seen(urls, paper)  
+        if verdicts:  
+            URL_STORE.record_verdicts(verdicts, paper)  
+        if decided:  
+            URL_STORE.record_contexts(decided, paper)  
+    except Exception as e:  
+        _on_error(f"URL库写入失败: {str(e)}")  
 
-# 设置日志  
-logging.basicConfig(level=logging.INFO)  
-logger = logging.getLogger(__name__)  
 
-# 全局变量  
-USE_LLM = False  
-llm = None  
-prompt_link = None  
-RATE_LIMIT_DELAY = 3  
-LAST_API_CALL_TIME = 0  
+def _llm_cost(url: str, merged: str) -> int:  
+    """一条链接的LLM判断按预算单位估计的用量"""  
+    if LLM_BUDGET.unit == 'calls':  
+        return 1  
+    prompt = combine.link_prompt_template().format(url=url, context_text=merged)  
+    return estimate_tokens(prompt) + (combine.VERDICT_MAX_TOKENS[combine.LLM_VERDICT] or 256)  
+
+
+def print_run_summary() -> None:  
+    """打印运行统计"""  
+    _log(f"判定缓存命中率: {get_verdict_cache().summary()}")  
+    if URL_STORE is not None:  
+        _log(f"URL库: {URL_STORE.summary()}")  
+    if SECTION_STATS:  
+        _log("章节策略: " + "，".join(f"{reason} 排除 {n} 个" for reason, n in SECTION_STATS.items()))  
+    if combine.PRECLASSIFIER is not None:  
+        _log(f"预分类器: {combine.PRECLASSIFIER.report()}")  
+    if combine.LLM_CACHE is not None:  
+        _log(f"LLM缓存: {combine.LLM_CACHE.summary()}")  
+    if combine.LLM_CLIENT is not None:  
+        stats = combine.LLM_CLIENT.stats  
+        _log(f"LLM请求: {stats['requests']} 次，重试 {stats['retries']} 次，429 {stats['rate_limited']} 次，"  
+             f"失败 {stats['errors']} 次，token {stats['prompt_tokens']} + {stats['completion_tokens']}")  
+        if stats.get('hedged'):  
+            _log(f"对冲请求: {stats['hedged']} 次，其中 {stats['hedge_wins']} 次副本先返回")  
+        if isinstance(combine.LLM_CLIENT, TieredLLMClient):  
+            _log(f"模型分级: {combine.LLM_CLIENT.summary()}")  
+    if LLM_BUDGET is not None:  
+        _log(f"LLM预算: {LLM_BUDGET.report()}")  
+        if LLM_BUDGET.skipped and BUDGET_FILE:  
+            LLM_BUDGET.write(BUDGET_FILE)  
+            _log(f"超出预算、只按规则判断的链接已写入 {BUDGET_FILE}")  
+    breaker = combine.LLM_BREAKER  
+    if combine.USE_LLM and breaker is not None and (breaker.stats['opened'] or breaker.degraded):  
+        _log(f"LLM熔断: {breaker.summary()}")  
+    degraded = REQUEUE_CARRY + (list(breaker.degraded) if breaker is not None else [])  
+    # 重新处理时总是重写降级文件，只留下仍未用LLM判断的论文  
+    if DEGRADED_FILE and (degraded or REQUEUE_PAPERS is not None):  
+        write_degraded(DEGRADED_FILE, degraded)  
+        papers = {d['paper'] for d in degraded if d['paper'] is not None}  
+        if papers:  
+            _log(f"{len(papers)} 篇论文中有链接只按规则判断，已写入 {DEGRADED_FILE}，"  
+                 f"接口恢复后可用 --requeue {DEGRADED_FILE} 重新处理")  
+        else:  
+            _log(f"所有论文都已用LLM判断，{DEGRADED_FILE} 已清空")  
+    metrics = get_llm_metrics()  
+    if metrics.run['calls'] or metrics.run['cache_hits'] or metrics.run['context_tokens_in']:  
+        # 每篇论文的LLM调用耗时、token、费用和缓存命中  
+        print(metrics.table())  
+    if LLM_METRICS_FILE:  
+        metrics.write(LLM_METRICS_FILE)  
+        _log(f"LLM指标已写入 {LLM_METRICS_FILE}")  
 
 
-def extract_benchmark_links_from_paper(pdf_url: str) -> Dict[str, List[str]]:  
-    """从论文中提取数据集和基准测试相关链接，整合pdf_find_url功能"""  
+def extract_benchmark_links_from_paper(pdf_url: str, sections: Dict[str, List[str]] = None,  
+                                       layout: Dict[str, Dict[str, Any]] = None) -> Dict[str, List[str]]:  
+    """从论文中提取数据集和基准测试相关链接，整合pdf_find_url功能  
+    
+    sections 不为 None 时填入每个链接出现的章节（front/abstract/body/references/...）；  
+    layout 不为 None 且启用 LAYOUT_MODE 时填入每个链接的版面位置、标记和优先级  
+    """  
     try:  
         # 下载PDF并保存到临时文件  
         response = requests.get(pdf_url)  
@@ -359,7 +363,9 @@ def extract_benchmark_links_from_paper(pdf_url: str) -> Dict[str, List[str]]:
         logger.info(f"PDF已下载到临时文件: {temp_pdf_path}")  
         
         # 使用pdf_find_url提取所有URL及上下文  
-        all_urls_from_pdf_find = pdf_find_url(temp_pdf_path)  
+        url_sections = {}  
+        url_layout = {} if LAYOUT_MODE else None  
+        all_urls_from_pdf_find = pdf_find_url(temp_pdf_path, url_sections, url_layout)  
         
         # 修改上下文格式，确保与extract_urls_from_text一致  
         all_urls = {}  
@@ -371,6 +377,8 @@ def extract_benchmark_links_from_paper(pdf_url: str) -> Dict[str, List[str]]:
             logger.warning(f"pdf_find_url仅找到 {len(all_urls)} 个URL，尝试补充使用原始方法")  
             text = extract_text_from_pdf(pdf_url)  
             additional_urls = extract_urls_from_text(text)  
+            for url, found in tag_urls(text.split('\n'), additional_urls).items():  
+                url_sections.setdefault(url, found)  
             
             # 将原始方法找到的URL合并到结果中  
             for url, contexts in additional_urls.items():  
@@ -380,17 +388,12 @@ def extract_benchmark_links_from_paper(pdf_url: str) -> Dict[str, List[str]]:
                     all_urls[url].extend(contexts)  
         
         # 筛选数据集和基准测试相关链接  
-        benchmark_links = {}  
-        for url, contexts in all_urls.items():  
-            # 对URL的所有上下文进行检查  
-            relevant_contexts = []  
-            for context in contexts:  
-                if is_benchmark_or_dataset_link(url, context):  
-                    relevant_contexts.append(context)  
-            
-            # 如果该URL被识别为数据集/基准测试链接，保存所有相关上下文  
-            if relevant_contexts:  
-                benchmark_links[url] = relevant_contexts  
+        groups = group_candidate_urls(all_urls, url_sections, url_layout)  
+        benchmark_links = classify_url_groups(groups)  
+        if sections is not None:  
+            sections.update({group["url"]: group["sections"] for group in groups.values()})  
+        if layout is not None and url_layout is not None:  
+            layout.update({group["url"]: group["layout"] for group in groups.values()})  
         
         # 清理临时文件  
         try:  
@@ -408,13 +411,43 @@ def extract_benchmark_links_from_paper(pdf_url: str) -> Dict[str, List[str]]:
         return {}  
 
 
-def process_conference(url: str, output_file: str, limit: int = None) -> None:  # 逻辑和 combine.py 一样，只不过不能调用 combine.py 内此函数，不然没用新的 extract_benchmark_links_from_paper
+def check_link_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:  
+    """批量检查链接是否可访问，记录状态码和跳转后的地址，去掉确定失效的链接"""  
+    try:  
+        results = validate_urls([record["url"] for record in records])  
+    except Exception as e:  
+        _on_error(f"链接检查失败，保留全部链接: {str(e)}")  
+        return records  
+    if URL_STORE is not None:  
+        try:  
+            URL_STORE.record_status(results)  
+        except Exception as e:  
+            _on_error(f"URL库写入失败: {str(e)}")  
+    
+    kept = []  
+    for record in records:  
+        result = results.get(record["url"])  
+        if is_dead(result):  
+            _log(f"丢弃失效链接: {record['url']} ({result['status'] or result['error']})")  
+            continue  
+        if result:  
+            record["status"] = result["status"]  
+            if result["final_url"] and result["final_url"] != record["url"]:  
+                record["final_url"] = result["final_url"]  
+        kept.append(record)  
+    
+    print(f"链接检查完成，{len(records) - len(kept)} 个失效链接已去除")  
+    return kept  
+
+
+def process_conference(url: str, output_file: str, limit: int = None, check_links: bool = False) -> None:  # 逻辑和 combine.py 一样，只不过不能调用 combine.py 内此函数，不然没用新的 extract_benchmark_links_from_paper
     """处理会议论文，提取数据集和基准测试链接  
     
     Args:  
         url: OpenReview会议URL  
         output_file: 输出JSON文件路径  
         limit: 限制处理的论文数量，None表示处理全部  
+        check_links: 是否检查链接可访问性并去掉失效链接  
     """  
     print(f"开始处理会议: {url}")  
     
@@ -434,11 +467,22 @@ def process_conference(url: str, output_file: str, limit: int = None) -> None:
         print(f"处理完成。找到 0 个唯一数据集/基准测试链接")  
         return  
     
+    # 只重新处理上次降级判断的论文；保留所有论文的ID到地址的对应，合并旧结果时使用  
+    paper_sources = {u.split('id=')[-1]: {"paper_url": u, "paper_id": u.split('id=')[-1]} for u in paper_urls if 'id=' in u}  
+    if REQUEUE_PAPERS is not None:  
+        paper_urls = [u for u in paper_urls if 'id=' in u and u.split('id=')[-1] in REQUEUE_PAPERS]  
+        print(f"重新处理上次降级判断的 {len(paper_urls)} 篇论文")  
+    
     # 如果设置了limit，只处理指定数量的论文  
     if limit and limit > 0:  
         paper_urls = paper_urls[:limit]  
         print(f"根据限制，将只处理前 {limit} 篇论文")  
     
+    # 本次处理的论文ID（与下面的 paper_id 一致）  
+    processed = [u.split('id=')[-1] if 'id=' in u else f"paper_{i+1}" for i, u in enumerate(paper_urls)]  
+    if REQUEUE_PAPERS is not None:  
+        REQUEUE_CARRY[:] = [d for d in REQUEUE_CARRY if d['paper'] not in processed]  
+    
     # 处理每篇论文  
     all_benchmarks = []  
     
@@ -447,21 +491,27 @@ def process_conference(url: str, output_file: str, limit: int = None) -> None:
         
         try:  
             print(f"  分析论文中的数据集链接")  
+            paper_id = pdf_url.split('id=')[-1] if 'id=' in pdf_url else f"paper_{i+1}"  
+            get_llm_metrics().begin_paper(paper_id)  
+            BATCH_SOURCES[paper_id] = {"paper_url": pdf_url, "paper_id": paper_id}  
             
             # 提取论文中的基准测试链接 - 使用整合了pdf_find_url的新函数  
-            benchmark_links = extract_benchmark_links_from_paper(pdf_url)  
+            sections, layout = {}, {}  
+            benchmark_links = extract_benchmark_links_from_paper(pdf_url, sections, layout)  
             
             if benchmark_links:  
-                paper_id = pdf_url.split('id=')[-1] if 'id=' in pdf_url else f"paper_{i+1}"  
-                
                 # 为每个链接创建记录  
                 for url, contexts in benchmark_links.items():  
-                    all_benchmarks.append({  
+                    record = {  
                         "url": url,  
                         "paper_url": pdf_url,  
                         "paper_id": paper_id,  
-                        "contexts": contexts  
-                    })  
+                        "contexts": contexts,  
+                        "sections": sections.get(url, [])  
+                    }  
+                    if url in layout:  
+                        record["layout"] = layout[url]  
+                    all_benchmarks.append(record)  
                 
                 print(f"  找到 {len(benchmark_links)} 个数据集/基准测试链接")  
             else:  
@@ -473,29 +523,145 @@ def process_conference(url: str, output_file: str, limit: int = None) -> None:
         # 避免请求过于频繁  
         time.sleep(1)  
     
-    # 去重处理  
+    # 转换为列表并保存  
+    result = dedupe_records(all_benchmarks)  
+    if check_links:  
+        result = check_link_records(result)  
+    # 重新处理时只替换这些论文的记录，保留上次其他论文的结果  
+    if REQUEUE_PAPERS is not None and os.path.exists(output_file):  
+        with open(output_file, encoding='utf-8') as f:  
+            result = replace_paper_records(json.load(f), result, set(processed), {**paper_sources, **BATCH_SOURCES})  
+    save_json(output_file, result)  
+    print(f"处理完成。找到 {len(result)} 个唯一数据集/基准测试链接")  
+    if BATCH_JOB is not None:  
+        submit_batch_job(output_file, "conference")  
+    print_run_summary()  
+
+def dedupe_records(all_benchmarks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:  
+    """合并各论文的链接记录"""  
+    # 去重处理（按规范化键，http/https、www、arXiv abs/pdf 等写法视为同一链接）  
     unique_urls = {}  
     for item in all_benchmarks:  
-        url = item["url"]  
-        if url not in unique_urls:  
-            unique_urls[url] = item  
+        key = canonical_key(item["url"])  
+        if key not in unique_urls:  
+            unique_urls[key] = item  
         else:  
             # 合并上下文和来源论文  
-            unique_urls[url]["contexts"].extend(item["contexts"])  
-            # 去除重复上下文  
-            unique_urls[url]["contexts"] = list(set(unique_urls[url]["contexts"]))  
-            # 添加源论文记录  
-            if "source_papers" not in unique_urls[url]:  
-                unique_urls[url]["source_papers"] = [unique_urls[url]["paper_id"]]  
-            if item["paper_id"] not in unique_urls[url]["source_papers"]:  
-                unique_urls[url]["source_papers"].append(item["paper_id"])  
+            unique_urls[key]["contexts"].extend(item["contexts"])  
+            # 去除重复上下文（保持出现顺序，每次运行输出相同）  
+            unique_urls[key]["contexts"] = list(dict.fromkeys(unique_urls[key]["contexts"]))  
+            # 保留原始写法  
+            if item["url"] != unique_urls[key]["url"]:  
+                variants = unique_urls[key].setdefault("variants", [unique_urls[key]["url"]])  
+                if item["url"] not in variants:  
+                    variants.append(item["url"])  
+            # 合并出现过的章节  
+            if item.get("sections"):  
+                merged = unique_urls[key].setdefault("sections", [])  
+                merged.extend(s for s in item["sections"] if s not in merged)  
+            # 合并版面位置和标记，优先级取最高  
+            if item.get("layout"):  
+                merged = unique_urls[key].get("layout") or {"positions": [], "flags": [], "score": 0.0}  
+                unique_urls[key]["layout"] = {  
+                    "positions": merged["positions"] + [p for p in item["layout"]["positions"] if p not in merged["positions"]],  
+                    "flags": merged["flags"] + [f for f in item["layout"]["flags"] if f not in merged["flags"]],  
+                    "score": max(merged["score"], item["layout"]["score"])  
+                }  
+            # 判断依据保留第一条记录的  
+            if item.get("reason") and not unique_urls[key].get("reason"):  
+                unique_urls[key]["reason"] = item["reason"]  
+            # 添加源论文记录（已合并过的记录带着自己的 source_papers）  
+            if "source_papers" not in unique_urls[key]:  
+                unique_urls[key]["source_papers"] = [unique_urls[key]["paper_id"]]  
+            for paper in item.get("source_papers", [item["paper_id"]]):  
+                if paper not in unique_urls[key]["source_papers"]:  
+                    unique_urls[key]["source_papers"].append(paper)  
+    return list(unique_urls.values())  
+
+def replace_paper_records(old: List[Dict[str, Any]], new: List[Dict[str, Any]], papers: Set[str],  
+                          sources: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:  
+    """用重新处理得到的记录替换 old 中 papers 这些论文的记录，其他论文的记录保留  
     
-    # 转换为列表并保存  
-    result = list(unique_urls.values())  
+    sources 为论文ID到 {"paper_url", "paper_id"} 的对应（同 BATCH_SOURCES），记录改由其他论文引用时从中取地址  
+    """  
+    kept = []  
+    for record in old:  
+        cited = record.get("source_papers", [record.get("paper_id")])  
+        remaining = [p for p in cited if p not in papers]  
+        if not remaining:  
+            continue  
+        if record.get("paper_id") in papers:  
+            # 优先换成知道地址的论文；都不知道时去掉已不对应的 paper_url  
+            paper_id = next((p for p in remaining if p in sources), remaining[0])  
+            record["paper_id"] = paper_id  
+            if paper_id in sources:  
+                record.update(sources[paper_id])  
+            else:  
+                record.pop("paper_url", None)  
+        if "source_papers" in record:  
+            record["source_papers"] = remaining  
+        kept.append(record)  
+    return dedupe_records(kept + new)  
+
+def batch_state_file(output_file: str) -> str:  
+    """批量作业状态文件的路径"""  
+    return os.path.splitext(output_file)[0] + '_batch_job.json'  
+
+def submit_batch_job(output_file: str, mode: str) -> None:  
+    """写出批量请求文件并提交，保存作业状态供 --collect-batch 回收；提交失败时下次回收再提交"""  
+    if not len(BATCH_JOB):  
+        _log("没有需要LLM判断的链接，未提交批量作业")  
+        return  
+    state_file = batch_state_file(output_file)  
+    requests_file = os.path.splitext(output_file)[0] + '_batch.jsonl'  
+    try:  
+        BATCH_JOB.submit(BATCH_CLIENT, requests_file)  
+        _log(f"已提交批量作业 {BATCH_JOB.batch_id}：{len(BATCH_JOB)} 条请求（{requests_file}）")  
+    except Exception as e:  
+        _on_error(f"批量作业提交失败: {str(e)}，请求已写入 {requests_file}，回收时重新提交")  
+    BATCH_JOB.save(state_file, output=output_file, mode=mode, verdict=combine.LLM_VERDICT,  
+                   requests_file=requests_file, sources=BATCH_SOURCES)  
+    _log(f"作业状态已保存到 {state_file}，完成后用 --collect-batch {state_file} 回收结果")  
+
+def collect_batch_job(state_file: str, output_file: str, poll_interval: float) -> None:  
+    """等待批量作业完成，结果写入LLM缓存和判定缓存，判断为是的链接并入输出文件"""  
+    job, state = BatchJob.load(state_file)  
+    if job.batch_id is None:  
+        job.submit(BATCH_CLIENT, state['requests_file'])  
+        job.save(state_file, **{k: state[k] for k in ('output', 'mode', 'verdict', 'requests_file', 'sources')})  
+        _log(f"已提交批量作业 {job.batch_id}")  
+    answers = job.collect(BATCH_CLIENT, poll_interval)  
+    
+    # 结果存入LLM缓存，之后的运行（包括 --llm-cache replay）直接复用  
+    combine.LLM_VERDICT = state['verdict']  
+    template = combine.link_prompt_template()  
+    llm_cache = combine.LLM_CACHE or LLMCache('record')  
+    cache = get_verdict_cache()  
+    records = []  
+    for custom_id, items in job.items.items():  
+        response = answers.get(custom_id)  
+        if response is None:  
+            continue  
+        is_link = parse_verdict(response) is True  
+        url, merged = items[0]["url"], items[0]["context"]  
+        llm_cache.store(job.model, template, url, merged, response)  
+        cache.set(context_key(url, merged), (is_link, "LLM method"))  
+        for item in items:  
+            _store_record([item["url"]], [], [(item["url"], item["context"], is_link, "llm", "LLM method")], item["paper"])  
+        if is_link:  
+            for item in items:  
+                records.append({"url": item["url"], **state['sources'].get(item["paper"], {}), "contexts": item["contexts"]})  
+    
+    result = []  
+    if os.path.exists(output_file):  
+        with open(output_file, encoding='utf-8') as f:  
+            result = json.load(f)  
+    result = dedupe_records(result + records) if state['mode'] == "conference" else result + records  
     save_json(output_file, result)  
-    print(f"处理完成。找到 {len(result)} 个唯一数据集/基准测试链接")  
+    print(f"回收完成。{len(answers)}/{len(job)} 条请求有结果，LLM新增 {len(records)} 条链接记录，共 {len(result)} 个链接")  
+    print_run_summary()  
 
-def process_local_pdf(pdf_path: str, output_file: str) -> None:  
+def process_local_pdf(pdf_path: str, output_file: str, check_links: bool = False) -> None:  
     """处理本地PDF文件，提取数据集和基准测试链接"""  
     print(f"开始处理本地PDF: {pdf_path}")  
     
@@ -506,11 +672,17 @@ def process_local_pdf(pdf_path: str, output_file: str) -> None:
         return  
     
     # 使用pdf_find_url提取所有URL及上下文  
-    all_urls_from_pdf_find = pdf_find_url(pdf_path)  
+    get_llm_metrics().begin_paper(os.path.basename(pdf_path))  
+    BATCH_SOURCES[os.path.basename(pdf_path)] = {"pdf_path": pdf_path}  
+    url_sections = {}  
+    url_layout = {} if LAYOUT_MODE else None  
+    all_urls_from_pdf_find = pdf_find_url(pdf_path, url_sections, url_layout)  
     
     # 补充使用extract_text_from_local_pdf方法  
     text = extract_text_from_local_pdf(pdf_path)  
     additional_urls = extract_urls_from_text(text)  
+    for url, found in tag_urls(text.split('\n'), additional_urls).items():  
+        url_sections.setdefault(url, found)  
     
     # 合并结果  
     all_urls = {}  
@@ -524,30 +696,33 @@ def process_local_pdf(pdf_path: str, output_file: str) -> None:
             all_urls[url].extend(contexts)  
     
     # 筛选数据集和基准测试相关链接  
-    benchmark_links = {}  
-    for url, contexts in all_urls.items():  
-        # 对URL的所有上下文进行检查  
-        relevant_contexts = []  
-        for context in contexts:  
-            if is_benchmark_or_dataset_link(url, context):  
-                relevant_contexts.append(context)  
-        
-        # 如果该URL被识别为数据集/基准测试链接，保存所有相关上下文  
-        if relevant_contexts:  
-            benchmark_links[url] = relevant_contexts  
+    groups = group_candidate_urls(all_urls, url_sections, url_layout)  
+    benchmark_links = classify_url_groups(groups)  
+    sections = {group["url"]: group["sections"] for group in groups.values()}  
+    layout = {group["url"]: group["layout"] for group in groups.values() if "layout" in group}  
     
     # 创建结果记录  
     all_benchmarks = []  
     for url, contexts in benchmark_links.items():  
-        all_benchmarks.append({  
+        record = {  
             "url": url,  
             "pdf_path": pdf_path,  
-            "contexts": contexts  
-        })  
+            "contexts": contexts,  
+            "sections": sections.get(url, [])  
+        }  
+        if url in layout:  
+            record["layout"] = layout[url]  
+        all_benchmarks.append(record)  
+    
+    if check_links:  
+        all_benchmarks = check_link_records(all_benchmarks)  
     
     # 保存结果  
     save_json(output_file, all_benchmarks)  
-    print(f"处理完成。找到 {len(benchmark_links)} 个唯一数据集/基准测试链接")  
+    print(f"处理完成。找到 {len(all_benchmarks)} 个唯一数据集/基准测试链接")  
+    if BATCH_JOB is not None:  
+        submit_batch_job(output_file, "pdf")  
+    print_run_summary()  
 
 def extract_text_from_local_pdf(pdf_path: str) -> str:  
     """从本地PDF文件提取文本内容"""  
@@ -575,26 +750,120 @@ def main():
     source_group = parser.add_mutually_exclusive_group(required=True)  
     source_group.add_argument('--conference', type=str, help='OpenReview会议URL')  
     source_group.add_argument('--pdf', type=str, help='本地PDF文件路径')  
+    source_group.add_argument('--collect-batch', type=str, metavar='STATE_FILE', help='回收 --llm-batch-job 提交的批量作业，结果并入 -o 指定的输出文件')  
     
     parser.add_argument('-o', '--output', type=str, required=True, help='输出JSON文件路径')  
     parser.add_argument('-l', '--limit', type=int, default=10, help='限制处理的论文数量，默认为10')  
     parser.add_argument('--use-llm', action='store_true', help='是否使用LLM辅助判断，需要OpenAI API密钥')  
     parser.add_argument('--openai-key', type=str, help='OpenAI API密钥')  
+    parser.add_argument('--check-links', action='store_true', help='并发检查链接可访问性（结果缓存在.cache/），去掉失效链接')  
+    parser.add_argument('--resolve-redirects', action='store_true', help='解析doi.org、bit.ly等短链接，按最终目标判断')  
+    parser.add_argument('--url-store', type=str, nargs='?', const=DEFAULT_STORE_FILE, metavar='PATH',  
+                        help=f'跨运行的URL库（SQLite），已有结论的链接不再经过规则和LLM，默认 {DEFAULT_STORE_FILE}')  
+    parser.add_argument('--layout', action='store_true', help='用 pdftohtml -xml 记录链接的页码、位置和字号，首页、脚注和图表标题中的链接优先交给LLM')  
+    parser.add_argument('--llm-async', action='store_true', help='使用异步LLM客户端，按RPM/TPM预算并发请求，429时退避')  
+    parser.add_argument('--llm-base-url', type=str, help='OpenAI兼容接口地址，默认 $OPENAI_BASE_URL 或 https://api.openai.com/v1')  
+    parser.add_argument('--llm-model', type=str, default=DEFAULT_MODEL, help='异步客户端使用的模型')  
+    parser.add_argument('--llm-chat', action='store_true', help='异步客户端使用 /chat/completions 接口')  
+    parser.add_argument('--llm-rpm', type=float, default=DEFAULT_RPM, help='每分钟请求数上限')  
+    parser.add_argument('--llm-tpm', type=float, default=DEFAULT_TPM, help='每分钟token数上限')  
+    parser.add_argument('--llm-concurrency', type=int, default=16, help='同时在途的LLM请求数上限')  
+    parser.add_argument('--llm-verdict', choices=combine.VERDICT_MODES, default=combine.LLM_VERDICT,  
+                        help='单条判断的回答方式：label 只输出 YES/NO（默认），json 只输出 {"verdict": ...}，explain 回答并简要解释')  
+    parser.add_argument('--llm-stream', action='store_true', help='流式读取LLM回答，YES/NO 一出现就停止')  
+    parser.add_argument('--llm-strong-model', type=str, help='分级判断：--llm-model 先判断，没把握或回答矛盾时交给这个更强的模型（需要异步客户端，自动启用）')  
+    parser.add_argument('--llm-strong-base-url', type=str, help='强模型的接口地址，默认与 --llm-base-url 相同')  
+    parser.add_argument('--llm-hedge', type=float, metavar='PCT',  
+                        help='对冲请求：超过最近请求耗时的该百分位（如95）仍未返回时再发一份，取先返回的结果（需要异步客户端，自动启用）')  
+    parser.add_argument('--llm-hedge-budget', type=float, default=DEFAULT_HEDGE_BUDGET, help='最多对冲的请求比例')  
+    parser.add_argument('--llm-min-confidence', type=float, default=DEFAULT_MIN_CONFIDENCE, help='便宜模型首个token的概率低于此值时升级到强模型（接口需支持logprobs）')  
+    parser.add_argument('--llm-budget', type=str,  
+                        help='整个运行的LLM用量上限，如 200k（token）或 "500 calls"；按预期收益排序发送，超出的链接只按规则判断并列在报告中')  
+    parser.add_argument('--llm-budget-reserve', type=float, default=DEFAULT_RESERVE, help='预算剩余不足此比例时只发送高优先级链接')  
+    parser.add_argument('--llm-breaker-failures', type=int, default=DEFAULT_FAILURE_THRESHOLD,  
+                        help='LLM连续失败多少次后熔断，只用规则判断；0 表示不熔断')  
+    parser.add_argument('--llm-breaker-reset', type=float, default=DEFAULT_RESET_TIMEOUT, help='熔断后每隔多少秒试探一次LLM接口')  
+    parser.add_argument('--degraded-file', type=str, help='只按规则判断的链接写入此JSON文件，默认为输出文件名加 _degraded')  
+    parser.add_argument('--requeue', type=str, metavar='DEGRADED_FILE', help='只重新处理 --degraded-file 中记录的论文')  
+    parser.add_argument('--llm-batch-job', action='store_true',  
+                        help='批量作业模式：待LLM判断的链接写入批量请求文件并提交到 /v1/batches，不等待结果；之后用 --collect-batch 回收')  
+    parser.add_argument('--batch-poll', type=float, default=60, help='回收批量作业时查询状态的间隔秒数')  
+    parser.add_argument('--llm-cache', choices=MODES, default='off',  
+                        help='LLM回复缓存（.cache/llm.sqlite）：record 读缓存并记录新回复，replay 只读缓存、不发送请求，off 不使用')  
+    parser.add_argument('--llm-context-tokens', type=int, default=DEFAULT_TOKEN_BUDGET, help='每个URL合并后交给LLM的上下文token上限')  
+    parser.add_argument('--no-context-compression', action='store_true', help='不压缩上下文（默认去掉作者列表、引用标记和与数据无关的句子）')  
+    parser.add_argument('--preclassifier', type=str, help='预分类器模型（preclassifier.py train 生成），有把握的链接不再调用LLM')  
+    parser.add_argument('--pre-low', type=float, help='预分类得分不高于此值直接判否，默认用模型保存的阈值')  
+    parser.add_argument('--pre-high', type=float, help='预分类得分不低于此值直接判是，默认用模型保存的阈值')  
+    parser.add_argument('--llm-batch', action='store_true', help='一篇论文的候选链接合并成一次LLM请求，模型遗漏的链接再逐条判断')  
+    parser.add_argument('--llm-batch-size', type=int, default=20, help='批量模式下每次请求最多包含的链接数')  
+    parser.add_argument('--verdict-cache-size', type=int, default=DEFAULT_MAXSIZE, help='判定缓存的最大条目数，超出按LRU淘汰')  
+    parser.add_argument('--llm-metrics', type=str, help='把每篇论文和整个运行的LLM调用指标（耗时分布、token、费用、缓存命中）写入此JSON文件')  
     
     args = parser.parse_args()  
     
+    global RESOLVE_REDIRECTS, LLM_METRICS_FILE, DEGRADED_FILE, REQUEUE_PAPERS, BATCH_JOB, BATCH_CLIENT, LLM_BUDGET, BUDGET_FILE, LAYOUT_MODE, URL_STORE  
+    RESOLVE_REDIRECTS = args.resolve_redirects  
+    if args.url_store:  
+        URL_STORE = URLStore(args.url_store)  
+    LAYOUT_MODE = args.layout  
+    LLM_METRICS_FILE = args.llm_metrics  
+    DEGRADED_FILE = args.degraded_file or os.path.splitext(args.output)[0] + '_degraded.json'  
+    if args.llm_budget:  
+        LLM_BUDGET = LLMBudget(*parse_budget(args.llm_budget), reserve=args.llm_budget_reserve)  
+        BUDGET_FILE = os.path.splitext(args.output)[0] + '_over_budget.json'  
+    if args.requeue:  
+        requeued = load_degraded(args.requeue)  
+        REQUEUE_PAPERS = set(requeued['papers'])  
+        REQUEUE_CARRY[:] = requeued['links']  
+    combine.LLM_BREAKER = CircuitBreaker(args.llm_breaker_failures, args.llm_breaker_reset) if args.llm_breaker_failures > 0 else None  
+    get_verdict_cache(args.verdict_cache_size)  
+    combine.LLM_BATCH = args.llm_batch  
+    combine.LLM_CONTEXT_TOKENS = args.llm_context_tokens  
+    combine.COMPRESS_CONTEXT = not args.no_context_compression  
+    combine.LLM_VERDICT = args.llm_verdict  
+    combine.LLM_STREAM = args.llm_stream  
+    combine.LLM_BATCH_SIZE = args.llm_batch_size  
+    
+    if args.preclassifier:  
+        combine.PRECLASSIFIER = PreClassifier.load(args.preclassifier, low=args.pre_low, high=args.pre_high)  
+    if args.llm_cache != 'off':  
+        combine.LLM_CACHE = LLMCache(args.llm_cache)  
+    
+    if args.llm_batch_job or args.collect_batch:  
+        BATCH_CLIENT = BatchClient(base_url=args.llm_base_url, api_key=args.openai_key)  
+    if args.collect_batch:  
+        collect_batch_job(args.collect_batch, args.output, args.batch_poll)  
+        return  
+    if args.llm_batch_job:  
+        # 不逐条调用LLM，只收集待判断的链接  
+        BATCH_JOB = BatchJob(args.llm_model, chat=args.llm_chat)  
+        combine.USE_LLM = True  
+    
     # 检查是否启用LLM  
-    if args.use_llm:  
-        if setup_llm(args.openai_key):  
+    elif args.use_llm:  
+        client = None  
+        hedge = {'hedge_percentile': args.llm_hedge, 'hedge_budget': args.llm_hedge_budget}  
+        if args.llm_async or args.llm_strong_model or args.llm_hedge:  
+            client = AsyncLLMClient(base_url=args.llm_base_url, api_key=args.openai_key, model=args.llm_model,  
+                                    chat=args.llm_chat, rpm=args.llm_rpm, tpm=args.llm_tpm,  
+                                    max_concurrency=args.llm_concurrency, **hedge)  
+        if args.llm_strong_model:  
+            # 两个模型通常有各自的配额，强模型单独限速  
+            strong = AsyncLLMClient(base_url=args.llm_strong_base_url or args.llm_base_url, api_key=args.openai_key,  
+                                    model=args.llm_strong_model, chat=args.llm_chat, rpm=args.llm_rpm,  
+                                    tpm=args.llm_tpm, max_concurrency=args.llm_concurrency, **hedge)  
+            client = TieredLLMClient([client, strong], min_confidence=args.llm_min_confidence)  
+        if setup_llm(args.openai_key, client=client):  
             print("使用LLM辅助判断已启用")  
         else:  
             print("LLM设置失败，将仅使用规则方法")  
     
     # 根据参数选择处理会议或本地PDF  
     if args.conference:  
-        process_conference(args.conference, args.output, args.limit)  
+        process_conference(args.conference, args.output, args.limit, args.check_links)  
     elif args.pdf:  
-        process_local_pdf(args.pdf, args.output)  
+        process_local_pdf(args.pdf, args.output, args.check_links)  
 
 if __name__ == "__main__":  
-    main()
\ No newline at end of file
+    main()
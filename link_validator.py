@@ -0,0 +1,207 @@
+"""
+Check whether links resolve, for thousands of urls at once.
+
+Each url is tried with HEAD first and falls back to a GET that reads at
+most a few bytes; redirects are followed and the final url and status are
+recorded. Requests run concurrently on asyncio with a global cap and a
+per-host cap, and results are kept in an on-disk cache with a
+time-to-live, so the same GitHub or HuggingFace link is checked once
+across all papers and runs. When most hosts of a batch fail to resolve,
+the network is down rather than the links: such dns errors are reported
+as unknown and not cached.
+
+Requirements:
+aiohttp
+
+Example usage:
+>>> results = validate_urls(['https://github.com/THU-KEG/RM-Bench', 'https://example.org/404'])
+>>> results['https://github.com/THU-KEG/RM-Bench']
+{'url': ..., 'ok': True, 'status': 200, 'final_url': ..., 'method': 'HEAD', ...}
+>>> is_dead(results['https://example.org/404'])
+True
+
+Command line:
+    python link_validator.py output.json           # check the "url" of each record
+    python link_validator.py https://a.org/x https://b.org/y
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from urllib.parse import urlparse
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+    # older aiohttp versions do not tell dns failures apart.
+    _DNS_ERRORS = getattr(aiohttp, 'ClientConnectorDNSError', ())
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+from disk_cache import DiskCache, cache_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 7 * 24 * 3600
+# timeouts and connection errors are often transient, recheck them sooner.
+ERROR_TTL = 6 * 3600
+
+# servers that answer these to HEAD may still serve GET.
+_RETRY_WITH_GET = {400, 403, 405, 406, 429, 500, 501, 503}
+
+# the resource is gone; anything else may just be bot protection.
+_DEAD_STATUS = {404, 410}
+
+# when at least this share of the hosts of a batch fail to resolve, the
+# resolver (or the network) is broken rather than the hosts.
+RESOLVER_FAILURE_SHARE = 0.5
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+def _with_scheme(url: str) -> str:
+    return url if '://' in url else 'https://' + url
+
+
+def is_dead(result: dict) -> bool:
+    """:return: True only when the link surely does not resolve."""
+    if result is None:
+        return False
+    if result.get('status') in _DEAD_STATUS:
+        return True
+    # 'resolver' (most hosts failing at once) is unknown, not dead.
+    return result.get('status') is None and result.get('error_kind') == 'dns'
+
+
+async def _request(session, method: str, url: str, max_bytes: int):
+    async with session.request(method, url, allow_redirects=True, max_redirects=10) as resp:
+        if method == 'GET':
+            # stop after a few bytes, we only need to know it answers.
+            await resp.content.read(max_bytes)
+        history = [str(r.url) for r in resp.history]
+        return resp.status, str(resp.url), history
+
+
+async def check_url(session, url: str, host_limits: dict, per_host: int,
+                    max_bytes: int = 4096) -> dict:
+    target = _with_scheme(url)
+    host = urlparse(target).netloc.lower()
+    sem = host_limits.setdefault(host, asyncio.Semaphore(per_host))
+    result = {'url': url, 'ok': False, 'status': None, 'final_url': None,
+              'method': None, 'redirects': [], 'error': None, 'error_kind': None}
+    async with sem:
+        for method in ('HEAD', 'GET'):
+            try:
+                status, final_url, history = await _request(session, method, target, max_bytes)
+            except aiohttp.ClientConnectorError as e:
+                result['error'], result['error_kind'] = str(e), (
+                    'dns' if isinstance(e, _DNS_ERRORS) else 'connect')
+                break
+            except asyncio.TimeoutError:
+                result['error'], result['error_kind'] = 'timeout', 'timeout'
+                continue
+            except Exception as e:
+                result['error'], result['error_kind'] = str(e) or type(e).__name__, 'other'
+                continue
+            result.update(status=status, final_url=final_url, method=method,
+                          redirects=history, error=None, error_kind=None)
+            if method == 'HEAD' and status in _RETRY_WITH_GET:
+                continue
+            break
+    result['ok'] = result['status'] is not None and 200 <= result['status'] < 400
+    result['checked'] = time.time()
+    return result
+
+
+async def validate_urls_async(urls: list, concurrency: int = 64, per_host: int = 4,
+                              timeout: float = 10.0, max_bytes: int = 4096) -> dict:
+    """Check urls without any caching. :return: {url: result}"""
+    if not AIOHTTP_AVAILABLE:
+        raise RuntimeError("aiohttp is required for link validation")
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host, ttl_dns_cache=600)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    host_limits = {}
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout,
+                                     headers=HEADERS) as session:
+        results = await asyncio.gather(
+            *(check_url(session, url, host_limits, per_host, max_bytes) for url in urls))
+    _mark_resolver_failure(results)
+    return {r['url']: r for r in results}
+
+
+def _mark_resolver_failure(results: list) -> None:
+    """Turn dns errors into 'resolver' errors when most hosts of the batch failed to resolve."""
+    hosts, failed = set(), set()
+    for r in results:
+        host = urlparse(_with_scheme(r['url'])).netloc.lower()
+        hosts.add(host)
+        if r['error_kind'] == 'dns':
+            failed.add(host)
+    if hosts and len(failed) >= RESOLVER_FAILURE_SHARE * len(hosts):
+        logger.warning(f"{len(failed)}/{len(hosts)} hosts failed to resolve, treating dns errors as unknown")
+        for r in results:
+            if r['error_kind'] == 'dns':
+                r['error_kind'] = 'resolver'
+
+
+def _fresh(result: dict) -> bool:
+    if result.get('error') is None:
+        return True
+    return time.time() - result.get('checked', 0) < ERROR_TTL
+
+
+def validate_urls(urls: list, cache: DiskCache = None, ttl: float = DEFAULT_TTL,
+                  **kwargs) -> dict:
+    """
+    Check urls, reusing cached results.
+    :param cache: defaults to .cache/links.sqlite
+    :param kwargs: see validate_urls_async().
+    :return: {url: result}
+    """
+    urls = list(dict.fromkeys(urls))
+    if cache is None:
+        cache = DiskCache(cache_path('links.sqlite'), ttl=ttl)
+    results = {u: r for u, r in cache.get_many(urls).items() if _fresh(r)}
+    missing = [u for u in urls if u not in results]
+    if missing:
+        logger.info(f"checking {len(missing)} links, {len(results)} cached")
+        checked = asyncio.run(validate_urls_async(missing, **kwargs))
+        # a broken resolver says nothing about the links, check them again next time.
+        cache.set_many({u: r for u, r in checked.items() if r['error_kind'] != 'resolver'})
+        results.update(checked)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check whether links resolve')
+    parser.add_argument('inputs', nargs='+', help='urls or output json files')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--per-host', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    args = parser.parse_args()
+
+    urls = []
+    for item in args.inputs:
+        if item.endswith('.json'):
+            with open(item, 'r', encoding='utf-8') as fobj:
+                urls += [r['url'] for r in json.load(fobj)]
+        else:
+            urls.append(item)
+
+    results = validate_urls(urls, concurrency=args.concurrency,
+                            per_host=args.per_host, timeout=args.timeout)
+    ok = 0
+    for url in dict.fromkeys(urls):
+        r = results[url]
+        ok += r['ok']
+        mark = 'ok  ' if r['ok'] else ('dead' if is_dead(r) else '??  ')
+        print(mark, r['status'], url, '->', r['final_url'] or r['error'])
+    print(f"{ok}/{len(results)} links ok", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Offline batch jobs for OpenAI-compatible batch endpoints.
+
+Instead of one interactive completion per link, every pending prompt of a
+run is written to a JSONL request file (one request per line, with a
+custom_id), uploaded to /v1/files and submitted to /v1/batches. The batch
+runs on the provider's side within its completion window, at a lower
+price, and its output file is downloaded and matched back to the
+requests by custom_id once it has finished. Crawling and extraction do
+not wait for the LLM at all.
+
+BatchJob collects the requests of a run; identical requests (same key)
+are sent once and their answer is shared by everything that asked.
+The job state (requests' metadata, file and batch ids) is saved as JSON,
+so collecting can happen in a later process. stub_server serves the
+same endpoints for local runs.
+
+Requirements:
+requests
+
+Example usage:
+>>> job = BatchJob(model='gpt-4o-mini')
+>>> job.add(('context', 'github.com/a/data', '1f2e'), 'Is https://github.com/a/data ...', 2, {'paper_id': 'odjMSBSWRt'})
+'req-0'
+>>> client = BatchClient(base_url='http://127.0.0.1:8765/v1', api_key='sk-stub')
+>>> job.submit(client, 'run_batch.jsonl')
+'batch_1'
+>>> job.save('run_batch_job.json')
+>>> job, state = BatchJob.load('run_batch_job.json')   # e.g. in a later process
+>>> answers = job.collect(client, poll_interval=30)
+>>> answers['req-0']
+'YES'
+"""
+import json
+import logging
+import os
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = 'https://api.openai.com/v1'
+COMPLETION_WINDOW = '24h'
+DEFAULT_MAX_TOKENS = 256
+# states after which a batch does not change any more.
+FINAL_STATES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class BatchError(Exception):
+    pass
+
+
+class BatchClient:
+    """The /files and /batches endpoints of an OpenAI-compatible API."""
+
+    def __init__(self, base_url: str = None, api_key: str = None, timeout: float = 60.0):
+        self.base_url = (base_url or os.environ.get('OPENAI_BASE_URL') or DEFAULT_BASE_URL).rstrip('/')
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f"Bearer {api_key or os.environ.get('OPENAI_API_KEY', '')}"
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        resp = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        if resp.status_code >= 400:
+            raise BatchError(f"{method} {path}: HTTP {resp.status_code}: {resp.text[:200]}")
+        return resp
+
+    def upload(self, path: str) -> str:
+        """:return: the id of the uploaded request file."""
+        with open(path, 'rb') as f:
+            resp = self._request('POST', '/files', data={'purpose': 'batch'},
+                                 files={'file': (os.path.basename(path), f, 'application/jsonl')})
+        return resp.json()['id']
+
+    def create(self, input_file_id: str, endpoint: str) -> dict:
+        return self._request('POST', '/batches', json={'input_file_id': input_file_id, 'endpoint': endpoint,
+                                                       'completion_window': COMPLETION_WINDOW}).json()
+
+    def retrieve(self, batch_id: str) -> dict:
+        return self._request('GET', f'/batches/{batch_id}').json()
+
+    def content(self, file_id: str) -> str:
+        return self._request('GET', f'/files/{file_id}/content').text
+
+    def wait(self, batch_id: str, poll_interval: float = 30.0, timeout: float = None) -> dict:
+        """Poll until the batch is in a final state. :return: the batch object."""
+        start = time.monotonic()
+        while True:
+            batch = self.retrieve(batch_id)
+            counts = batch.get('request_counts') or {}
+            logger.info(f"batch {batch_id}: {batch['status']} "
+                        f"({counts.get('completed', 0)}/{counts.get('total', '?')} done)")
+            if batch['status'] in FINAL_STATES:
+                return batch
+            if timeout is not None and time.monotonic() - start > timeout:
+                raise BatchError(f"batch {batch_id} not finished after {timeout:.0f}s")
+            time.sleep(poll_interval)
+
+
+def _answer_text(body: dict, chat: bool):
+    choices = body.get('choices') or []
+    if not choices:
+        return None
+    if chat:
+        return (choices[0].get('message') or {}).get('content')
+    return choices[0].get('text')
+
+
+class BatchJob:
+
+    def __init__(self, model: str, chat: bool = False):
+        self.model = model
+        self.chat = chat
+        self.requests = {}   # custom_id -> request body
+        self.items = {}      # custom_id -> metadata of everything that asked it
+        self._ids = {}       # key -> custom_id
+        self.input_file_id = None
+        self.batch_id = None
+
+    @property
+    def endpoint(self) -> str:
+        return '/v1/chat/completions' if self.chat else '/v1/completions'
+
+    def __len__(self):
+        return len(self.requests)
+
+    def add(self, key, prompt: str, max_tokens: int, meta: dict) -> str:
+        """
+        Queue a prompt, once per `key`.
+        :param meta: kept in items[custom_id], to match the answer back.
+        :return: the custom_id of the request.
+        """
+        key = json.dumps(key, ensure_ascii=False)
+        custom_id = self._ids.get(key)
+        if custom_id is None:
+            custom_id = self._ids[key] = f"req-{len(self._ids)}"
+            body = {'model': self.model, 'max_tokens': max_tokens or DEFAULT_MAX_TOKENS, 'temperature': 0.1}
+            if self.chat:
+                body['messages'] = [{'role': 'user', 'content': prompt}]
+            else:
+                body['prompt'] = prompt
+            self.requests[custom_id] = body
+            self.items[custom_id] = []
+        self.items[custom_id].append(meta)
+        return custom_id
+
+    def write(self, path: str) -> None:
+        """Write the request file, one JSON request per line."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for custom_id, body in self.requests.items():
+                f.write(json.dumps({'custom_id': custom_id, 'method': 'POST', 'url': self.endpoint,
+                                    'body': body}, ensure_ascii=False) + '\n')
+
+    def submit(self, client: BatchClient, path: str) -> str:
+        """Write, upload and start the batch. :return: the batch id."""
+        self.write(path)
+        self.input_file_id = client.upload(path)
+        self.batch_id = client.create(self.input_file_id, self.endpoint)['id']
+        logger.info(f"submitted {len(self.requests)} requests as batch {self.batch_id}")
+        return self.batch_id
+
+    def collect(self, client: BatchClient, poll_interval: float = 30.0, timeout: float = None) -> dict:
+        """
+        Wait for the batch and download its output.
+        :return: {custom_id: answer text}; failed requests are left out.
+        """
+        batch = client.wait(self.batch_id, poll_interval, timeout)
+        if batch['status'] != 'completed':
+            raise BatchError(f"batch {self.batch_id} {batch['status']}")
+        answers = {}
+        if batch.get('output_file_id'):
+            for line in client.content(batch['output_file_id']).splitlines():
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                response = result.get('response') or {}
+                text = _answer_text(response.get('body') or {}, self.chat) \
+                    if response.get('status_code') == 200 else None
+                if text is not None:
+                    answers[result['custom_id']] = text
+        failed = len(self.requests) - len(answers)
+        if failed:
+            logger.warning(f"batch {self.batch_id}: {failed} of {len(self.requests)} requests failed")
+        return answers
+
+    def save(self, path: str, **extra) -> None:
+        """Save the job, with `extra` fields for the caller, to collect it later."""
+        state = {'model': self.model, 'chat': self.chat, 'input_file_id': self.input_file_id,
+                 'batch_id': self.batch_id, 'requests': self.requests, 'items': self.items, **extra}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=1)
+
+    @classmethod
+    def load(cls, path: str):
+        """:return: (the job, the whole saved state)"""
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+        job = cls(state['model'], state['chat'])
+        job.requests, job.items = state['requests'], state['items']
+        job.input_file_id, job.batch_id = state['input_file_id'], state['batch_id']
+        return job, state
@@ -0,0 +1,160 @@
+"""
+A run-level ceiling on LLM usage, in tokens or calls, and the order in
+which pending LLM decisions use it.
+
+What the run has spent is read from llm_metrics, so retries, escalations
+to a stronger model and batch prompts all count. Before each round of
+LLM calls, the scheduler passes the pending links with their priority
+and estimated cost to admit(). Links are admitted highest priority first
+while they fit in what is left. Once less than `reserve` of the budget
+remains, only links of at least HIGH_PRIORITY are sent. This keeps the
+tail of the budget for the links most likely to be missed datasets in
+later papers. Links that are not admitted keep their rule verdict and
+are listed by report() and write().
+
+priority() is the expected recall gain of asking the LLM about a link:
+- release statements ("code and data are available at", footnotes of
+  the front matter) and rule near-misses (a dataset domain whose path
+  has no dataset keyword, data words around the link) come first;
+- links inside bibliography entries come last.
+With the sections of the paper (paper_sections), a link of the front
+matter (title page footnotes) counts as a release statement and a link
+that is only mentioned in the references as a bibliography entry. The
+layout flags of pdf_layout do the same for first-page links and
+footnotes, and a link in a figure or table caption counts as data words.
+
+Example usage:
+>>> budget = LLMBudget(*parse_budget('200k'))
+>>> priority('https://github.com/a/b', ['Our code and data are available at https://github.com/a/b.'])
+1.0
+>>> budget.admit([(0.9, 400), (0.1, 400)])
+[True, True]
+>>> budget.record_skipped('https://doi.org/10.1/x', paper='odjMSBSWRt', priority=0.1)
+>>> print(budget.report())
+"""
+import json
+import re
+import threading
+
+from llm_context import DATA_WORDS
+from llm_metrics import get_llm_metrics
+from rule_engine import get_rule_engine, split_url
+
+UNITS = ('tokens', 'calls')
+DEFAULT_RESERVE = 0.2
+HIGH_PRIORITY = 0.7
+
+_BUDGET = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kKmM]?)\s*(tokens?|calls?)?\s*$')
+_RELEASE = re.compile(
+    r'(?:code|data|dataset|benchmark|models?|weights)\s+(?:\w+\s+){0,3}(?:is|are)\s+(?:publicly\s+|freely\s+)?'
+    r'(?:available|released|hosted)|available\s+(?:at|from|on)|we\s+(?:publicly\s+)?release|'
+    r'project\s+page|can\s+be\s+(?:found|downloaded|accessed)', re.I)
+_REFERENCE = re.compile(
+    r'\bIn\s+Proceedings\b|\bProceedings\s+of\b|\barXiv\s+preprint\b|\bpp\.\s*\d|\bvol\.\s*\d|'
+    r'\bConference\s+on\b|\bJournal\s+of\b|\bTransactions\s+on\b|\bet\s+al\.\s*[,(]?\s*(?:19|20)\d{2}', re.I)
+_YEAR = re.compile(r'\b(?:19|20)\d{2}[a-z]?\b')
+
+
+def parse_budget(text: str) -> tuple:
+    """
+    :param text: e.g. '200000', '200k tokens', '1.5M', '500 calls'.
+    :return: (limit, unit)
+    """
+    m = _BUDGET.match(text)
+    if not m:
+        raise ValueError(f"invalid LLM budget: {text!r}")
+    limit = float(m.group(1)) * {'': 1, 'k': 1e3, 'm': 1e6}[m.group(2).lower()]
+    unit = 'calls' if (m.group(3) or '').startswith('call') else 'tokens'
+    return int(limit), unit
+
+
+def _looks_like_reference(context: str) -> bool:
+    return bool(_REFERENCE.search(context)) or len(_YEAR.findall(context)) >= 3
+
+
+def priority(url: str, contexts: list, sections: list = None, layout: list = None) -> float:
+    """
+    :param sections: the sections `url` is mentioned in, see paper_sections.
+    :param layout: its layout flags, see pdf_layout.
+    :return: the expected recall gain of an LLM verdict for `url`, 0..1.
+    """
+    text = ' '.join(contexts)
+    sections = set(sections or ())
+    layout = set(layout or ())
+    score = 0.5
+    if _RELEASE.search(text) or 'front' in sections or layout & {'first_page', 'footnote'}:
+        score += 0.4
+    domain, _ = split_url(url if '://' in url else 'https://' + url)
+    if get_rule_engine().domains.lookup(domain) is not None:
+        # a dataset domain without a dataset keyword in the path.
+        score += 0.2
+    if DATA_WORDS.search(text) or 'caption' in layout:
+        score += 0.1
+    if sections == {'references'} or (contexts and all(_looks_like_reference(c) for c in contexts)):
+        score -= 0.5
+    return round(min(1.0, max(0.0, score)), 2)
+
+
+class LLMBudget:
+
+    def __init__(self, limit: int, unit: str = 'tokens', reserve: float = DEFAULT_RESERVE):
+        """
+        :param limit: the most tokens (prompt and completion) or calls of the run.
+        :param reserve: the share of the budget kept for high-priority links.
+        """
+        if unit not in UNITS:
+            raise ValueError(f"unknown budget unit: {unit}")
+        self.limit = limit
+        self.unit = unit
+        self.reserve = reserve
+        self.admitted = 0
+        self.skipped = []
+        self._lock = threading.Lock()
+
+    def spent(self) -> int:
+        run = get_llm_metrics().run
+        if self.unit == 'calls':
+            return run['calls']
+        return run['prompt_tokens'] + run['completion_tokens']
+
+    def admit(self, items: list) -> list:
+        """
+        :param items: [(priority, estimated cost in the budget's unit), ...]
+        :return: whether each item may be sent, in the order of `items`.
+        """
+        left = self.limit - self.spent()
+        floor = self.reserve * self.limit
+        ret = [False] * len(items)
+        for i in sorted(range(len(items)), key=lambda i: -items[i][0]):
+            p, cost = items[i]
+            if cost > left or (left - cost < floor and p < HIGH_PRIORITY):
+                continue
+            ret[i] = True
+            left -= cost
+        with self._lock:
+            self.admitted += sum(ret)
+        return ret
+
+    def record_skipped(self, url: str, paper: str = None, priority: float = None) -> None:
+        with self._lock:
+            self.skipped.append({'paper': paper, 'url': url, 'priority': priority})
+
+    def summary(self) -> str:
+        return (f"{self.spent()}/{self.limit} {self.unit} used, {self.admitted} links sent, "
+                f"{len(self.skipped)} left to the rules")
+
+    def report(self, limit: int = 20) -> str:
+        """:return: the summary and the skipped links, highest priority first."""
+        with self._lock:
+            skipped = sorted(self.skipped, key=lambda s: -(s['priority'] or 0))
+        lines = [self.summary()]
+        lines += [f"  {s['priority']:.2f} {s['paper']} {s['url']}" for s in skipped[:limit]]
+        if len(skipped) > limit:
+            lines.append(f"  ... {len(skipped) - limit} more")
+        return '\n'.join(lines)
+
+    def write(self, path: str) -> None:
+        with self._lock:
+            data = {'limit': self.limit, 'unit': self.unit, 'spent': self.spent(), 'skipped': self.skipped}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,109 @@
+"""
+A persistent cache of LLM responses with record/replay modes.
+
+Entries are keyed by (model, prompt template version, url, normalized
+context). The template version is a digest of the template text, so
+editing a prompt invalidates its old responses by itself.
+
+Modes:
+  record   serve cached responses, send and store the rest
+  replay   serve cached responses only; a miss raises LLMCacheMiss and no
+           request is ever sent, so a recorded run can be reproduced
+           offline
+  off      no cache (callers simply do not create one)
+
+Example usage:
+>>> cache = LLMCache('record')
+>>> cache.fetch('gpt-3.5-turbo-instruct', LINK_PROMPT_TEMPLATE, url, context,
+...             lambda: call_llm(url, context))   # sent once, then served from disk
+'YES'
+>>> LLMCache('replay').fetch(...)                 # never sends; raises LLMCacheMiss if unseen
+'YES'
+"""
+import hashlib
+import json
+import threading
+
+from disk_cache import DiskCache, cache_path
+from llm_metrics import get_llm_metrics
+
+MODES = ('record', 'replay', 'off')
+DEFAULT_CACHE_FILE = cache_path('llm.sqlite')
+
+
+class LLMCacheMiss(Exception):
+    """Raised in replay mode for a prompt that was never recorded."""
+
+
+def template_version(template: str) -> str:
+    return hashlib.sha1(template.encode('utf-8')).hexdigest()[:12]
+
+
+def normalize_context(context: str) -> str:
+    return ' '.join(context.split())
+
+
+class LLMCache:
+
+    def __init__(self, mode: str = 'record', path: str = DEFAULT_CACHE_FILE):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"unknown llm cache mode: {mode}")
+        self.mode = mode
+        self.path = path
+        self._cache = DiskCache(path)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0}
+
+    @property
+    def online(self) -> bool:
+        """False in replay mode, where no request may be sent."""
+        return self.mode != 'replay'
+
+    @staticmethod
+    def key(model: str, template: str, url: str, context: str) -> str:
+        raw = json.dumps([model, template_version(template), url, normalize_context(context)],
+                         ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def lookup(self, model: str, template: str, url: str, context: str):
+        """:return: the recorded response, or None."""
+        entry = self._cache.get(self.key(model, template, url, context))
+        self._count('hits' if entry is not None else 'misses')
+        get_llm_metrics().record_cache(entry is not None)
+        return entry['response'] if entry is not None else None
+
+    def store(self, model: str, template: str, url: str, context: str, response: str) -> None:
+        # the context is kept so that recorded runs can serve as labelled data.
+        self._cache.set(self.key(model, template, url, context),
+                        {'model': model, 'template': template_version(template), 'url': url,
+                         'context': normalize_context(context), 'response': response})
+        self._count('stored')
+
+    def entries(self):
+        """:return: an iterator over the recorded entries."""
+        for _, entry in self._cache.items():
+            yield entry
+
+    def fetch(self, model: str, template: str, url: str, context: str, call):
+        """
+        :param call: sends the request and returns the response; only
+          called on a miss in record mode.
+        """
+        response = self.lookup(model, template, url, context)
+        if response is not None:
+            return response
+        if not self.online:
+            raise LLMCacheMiss(f"no recorded response for {url}")
+        response = call()
+        self.store(model, template, url, context, response)
+        return response
+
+    def summary(self) -> str:
+        s = self.stats
+        total = s['hits'] + s['misses']
+        rate = s['hits'] / total if total else 0.0
+        return f"{self.mode}: {s['hits']}/{total} hits ({rate:.1%}), {s['stored']} stored"
@@ -0,0 +1,460 @@
+"""
+An asynchronous client for OpenAI-compatible completion endpoints that
+keeps many requests in flight under requests-per-minute and
+tokens-per-minute budgets.
+
+Both budgets are token buckets. A request reserves one request and its
+estimated tokens (prompt plus max_tokens, as the API counts them) before
+it is sent; the estimate is corrected with the `usage` of the response.
+A 429 pauses every request of the client for the time the server asks
+for (Retry-After) or an exponential backoff, since it means the shared
+quota is exhausted. 5xx, timeouts and connection errors are retried for
+that request only.
+
+With `until`, a request is streamed and closed as soon as until(text) is
+true, e.g. once a YES/NO label has arrived (has_verdict), so the model's
+remaining tokens are neither waited for nor generated further; token
+counts of a stopped stream are estimated.
+
+With `hedge_percentile`, a request that has not answered within that
+percentile of the recent latencies (counted from when it was sent, so
+time spent queueing on the budgets does not trigger it) is sent a second
+time and whichever copy answers first is taken; the other is cancelled.
+At most `hedge_budget` of all calls are hedged, so a slow endpoint is not
+flooded with duplicates.
+
+The client runs its own event loop in a background thread, so the
+synchronous pipeline can call complete() from anywhere and
+complete_many() to run a whole batch concurrently.
+
+Requirements:
+aiohttp
+
+Example usage:
+>>> server, base_url = start_stub_server()   # from stub_server
+>>> client = AsyncLLMClient(base_url=base_url + 'v1', api_key='sk-stub', rpm=600, tpm=200000)
+>>> client.complete('Is https://huggingface.co/datasets/x a dataset? Answer YES or NO.')
+'YES'
+>>> client.complete_many(['... https://pytorch.org ...', '... https://github.com/a/benchmark ...'])
+['NO', 'YES']
+>>> client.close()
+"""
+import asyncio
+import collections
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+from llm_metrics import get_llm_metrics, percentile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = 'https://api.openai.com/v1'
+# the model langchain_openai.OpenAI uses by default.
+DEFAULT_MODEL = 'gpt-3.5-turbo-instruct'
+DEFAULT_RPM = 500
+DEFAULT_TPM = 200000
+DEFAULT_HEDGE_BUDGET = 0.05
+# successful calls needed before the hedge delay is trusted.
+HEDGE_MIN_SAMPLES = 20
+
+_RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# a YES/NO label; CJK characters count as word characters, so \b is not used.
+_LABEL = re.compile(r'(?<![A-Z])(YES|NO)(?![A-Z])')
+_LABEL_DONE = re.compile(r'(?<![A-Z])(YES|NO)[^A-Z]')
+
+
+class LLMError(Exception):
+
+    def __init__(self, msg: str, status: int = None):
+        super().__init__(msg)
+        self.status = status
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    A tokenizer-free upper-ish estimate: ~4 ASCII characters per token,
+    one token per other character (CJK text is about one token each).
+    """
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+def verdict_labels(text: str) -> list:
+    """:return: the YES/NO labels in `text`, in order."""
+    return _LABEL.findall(text.upper())
+
+
+def parse_verdict(text: str):
+    """
+    :return: True for YES, False for NO, None when there is no label. The
+      first label is the verdict, so an explanation that mentions "yes"
+      after "NO" does not flip it; {"verdict": "YES"} parses too.
+    """
+    labels = verdict_labels(text)
+    return labels[0] == 'YES' if labels else None
+
+
+def has_verdict(text: str) -> bool:
+    """:return: True once a complete label has arrived in a streamed answer."""
+    return _LABEL_DONE.search(text.upper()) is not None
+
+
+class RateLimiter:
+    """
+    Token buckets for requests and tokens per minute, starting full.
+    `None` disables a budget.
+    """
+
+    def __init__(self, rpm: float = None, tpm: float = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = rpm or 0
+        self._tokens = tpm or 0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = None
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _wait_time(self, tokens: int) -> float:
+        wait = 0.0
+        if self.rpm and self._requests < 1:
+            wait = (1 - self._requests) * 60 / self.rpm
+        if self.tpm:
+            # a request larger than the whole budget waits for a full bucket.
+            need = min(tokens, self.tpm) - self._tokens
+            if need > 0:
+                wait = max(wait, need * 60 / self.tpm)
+        return wait
+
+    async def acquire(self, tokens: int) -> None:
+        """Wait until one request of `tokens` tokens fits in both budgets."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # one waiter at a time, so requests go out in arrival order.
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    wait = self._wait_time(tokens)
+                    if wait <= 0:
+                        if self.rpm:
+                            self._requests -= 1
+                        if self.tpm:
+                            self._tokens -= tokens
+                        return
+                await asyncio.sleep(wait)
+
+    def adjust(self, reserved: int, used: int) -> None:
+        """Give back (or take) the difference between reserved and used tokens."""
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + reserved - used)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every request back for `seconds`, e.g. after a 429."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def _retry_after(resp) -> float:
+    """:return: seconds the server asks us to wait, or None."""
+    for header in ('retry-after-ms', 'Retry-After', 'x-ratelimit-reset-requests'):
+        value = resp.headers.get(header)
+        if not value:
+            continue
+        try:
+            seconds = float(value.rstrip('s'))
+        except ValueError:
+            continue
+        return seconds / 1000 if header == 'retry-after-ms' else seconds
+    return None
+
+
+class AsyncLLMClient:
+
+    def __init__(self, base_url: str = None, api_key: str = None, model: str = DEFAULT_MODEL,
+                 chat: bool = False, rpm: float = DEFAULT_RPM, tpm: float = DEFAULT_TPM,
+                 max_concurrency: int = 16, timeout: float = 30.0, max_retries: int = 5,
+                 temperature: float = 0.1, max_tokens: int = 256,
+                 hedge_percentile: float = None, hedge_budget: float = DEFAULT_HEDGE_BUDGET):
+        """
+        :param base_url: e.g. https://api.openai.com/v1, defaults to $OPENAI_BASE_URL.
+        :param chat: use /chat/completions instead of /completions.
+        :param rpm: requests per minute, None for no limit.
+        :param tpm: tokens per minute, None for no limit.
+        :param hedge_percentile: e.g. 95 to send a duplicate of requests slower
+          than 95% of the recent ones, None to never hedge.
+        :param hedge_budget: the largest share of calls that may be hedged.
+        """
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("aiohttp is required for the async LLM client")
+        self.base_url = (base_url or os.environ.get('OPENAI_BASE_URL') or DEFAULT_BASE_URL).rstrip('/')
+        self.api_key = api_key or os.environ.get('OPENAI_API_KEY', '')
+        self.model = model
+        self.chat = chat
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.limiter = RateLimiter(rpm, tpm)
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget
+        self.stats = {'calls': 0, 'requests': 0, 'retries': 0, 'rate_limited': 0, 'errors': 0,
+                      'prompt_tokens': 0, 'completion_tokens': 0, 'hedged': 0, 'hedge_wins': 0}
+        # latencies of recent successful calls, for the hedge delay.
+        self._latencies = collections.deque(maxlen=200)
+
+        self._session = None
+        self._sem = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def model_name(self) -> str:
+        return self.model
+
+    def _payload(self, prompt: str, max_tokens: int, scored: bool = False, stream: bool = False) -> dict:
+        payload = {'model': self.model, 'temperature': self.temperature, 'max_tokens': max_tokens}
+        if stream:
+            payload['stream'] = True
+        if self.chat:
+            payload['messages'] = [{'role': 'user', 'content': prompt}]
+            if scored:
+                payload['logprobs'] = True
+        else:
+            payload['prompt'] = prompt
+            if scored:
+                payload['logprobs'] = 1
+        return payload
+
+    def _text(self, data: dict) -> str:
+        choice = data['choices'][0]
+        if self.chat:
+            return choice['message']['content'] or ''
+        return choice['text']
+
+    def _confidence(self, data: dict):
+        """:return: probability of the first non-blank token of the answer, None without logprobs."""
+        logprobs = data['choices'][0].get('logprobs') or {}
+        if self.chat:
+            pairs = [(t.get('token', ''), t.get('logprob')) for t in logprobs.get('content') or []]
+        else:
+            pairs = list(zip(logprobs.get('tokens') or [], logprobs.get('token_logprobs') or []))
+        for token, logprob in pairs:
+            if token.strip() and logprob is not None:
+                return math.exp(logprob)
+        return None
+
+    async def _read_stream(self, resp, until) -> dict:
+        """
+        Read server-sent events until `until(text)` holds or the stream ends.
+        :return: the answer in the shape of a non-streamed response, without usage.
+        """
+        text, logprobs = '', {}
+        async for line in resp.content:
+            line = line.strip()
+            if not line.startswith(b'data:'):
+                continue
+            data = line[5:].strip()
+            if data == b'[DONE]':
+                break
+            choices = json.loads(data).get('choices') or [{}]
+            choice = choices[0]
+            if self.chat:
+                text += (choice.get('delta') or {}).get('content') or ''
+                logprobs.setdefault('content', []).extend((choice.get('logprobs') or {}).get('content') or [])
+            else:
+                text += choice.get('text') or ''
+                for k in ('tokens', 'token_logprobs'):
+                    logprobs.setdefault(k, []).extend((choice.get('logprobs') or {}).get(k) or [])
+            if until(text):
+                break
+        choice = {'logprobs': logprobs}
+        if self.chat:
+            choice['message'] = {'content': text}
+        else:
+            choice['text'] = text
+        return {'choices': [choice]}
+
+    async def _ensure_session(self):
+        if self._session is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+            headers = {'Authorization': f'Bearer {self.api_key}'}
+            self._session = aiohttp.ClientSession(
+                headers=headers, timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    def _hedge_delay(self):
+        """:return: seconds after which a request is hedged, None to not hedge it."""
+        if self.hedge_percentile is None or len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return percentile(list(self._latencies), self.hedge_percentile / 100)
+
+    def _may_hedge(self) -> bool:
+        return self.stats['hedged'] < self.hedge_budget * self.stats['calls']
+
+    async def acomplete(self, prompt: str, max_tokens: int = None, scored: bool = False, until=None):
+        """
+        :param scored: also ask for logprobs and return (text, confidence),
+          where confidence is the probability of the first answer token or
+          None when the server gives no logprobs.
+        :param until: stream the answer and stop reading once until(text) is true.
+        :return: the completion text; raises LLMError when retries are exhausted.
+        """
+        self.stats['calls'] += 1
+        delay = self._hedge_delay()
+        sent = asyncio.Event()
+        primary = asyncio.ensure_future(self._acomplete(prompt, max_tokens, scored, until, sent))
+        if delay is None:
+            return await primary
+        backup = None
+        try:
+            waiter = asyncio.ensure_future(sent.wait())
+            await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            if not primary.done():
+                await asyncio.wait({primary}, timeout=delay)
+            if primary.done() or not self._may_hedge():
+                return await primary
+            self.stats['hedged'] += 1
+            logger.info(f"LLM request slower than {delay:.2f}s, hedging")
+            backup = asyncio.ensure_future(self._acomplete(prompt, max_tokens, scored, until, hedge=True))
+            pending, error = {primary, backup}, None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.stats['hedge_wins'] += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            # the losing copy, or both when the caller gave up.
+            for task in (primary, backup):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _acomplete(self, prompt: str, max_tokens: int = None, scored: bool = False, until=None,
+                         sent: asyncio.Event = None, hedge: bool = False):
+        """One copy of a call, with its retries. :param sent: set once the request is sent."""
+        await self._ensure_session()
+        max_tokens = max_tokens or self.max_tokens
+        reserved = estimate_tokens(prompt) + max_tokens
+        url = self.base_url + ('/chat/completions' if self.chat else '/completions')
+        payload = self._payload(prompt, max_tokens, scored, stream=until is not None)
+
+        # queue wait covers the budgets, 429 pauses, concurrency slots and retry backoff.
+        call = {'queue_wait': 0.0, 'latency': 0.0, 'retries': 0, 'rate_limited': 0,
+                'estimated': until is not None, 'cancelled': False}
+        try:
+            for attempt in range(self.max_retries + 1):
+                start = time.monotonic()
+                await self.limiter.acquire(reserved)
+                delay = min(20.0, 2 ** attempt) * (0.5 + random.random() / 2)
+                try:
+                    async with self._sem:
+                        started = time.monotonic()
+                        call['queue_wait'] += started - start
+                        self.stats['requests'] += 1
+                        if sent is not None:
+                            sent.set()
+                        try:
+                            async with self._session.post(url, json=payload) as resp:
+                                if resp.status == 200:
+                                    if until is not None:
+                                        data = await self._read_stream(resp, until)
+                                        answer = estimate_tokens(self._text(data))
+                                        data['usage'] = {'prompt_tokens': estimate_tokens(prompt),
+                                                         'completion_tokens': answer,
+                                                         'total_tokens': estimate_tokens(prompt) + answer}
+                                    else:
+                                        data = await resp.json(content_type=None)
+                                    usage = data.get('usage') or {}
+                                    self.stats['prompt_tokens'] += usage.get('prompt_tokens', 0)
+                                    self.stats['completion_tokens'] += usage.get('completion_tokens', 0)
+                                    self.limiter.adjust(reserved, usage.get('total_tokens', reserved))
+                                    call['usage'] = usage
+                                    if scored:
+                                        return self._text(data), self._confidence(data)
+                                    return self._text(data)
+                                body = await resp.text()
+                                if resp.status not in _RETRY_STATUS:
+                                    self.stats['errors'] += 1
+                                    raise LLMError(f"HTTP {resp.status}: {body[:200]}", resp.status)
+                                if resp.status == 429:
+                                    self.stats['rate_limited'] += 1
+                                    call['rate_limited'] += 1
+                                    delay = _retry_after(resp) or delay
+                                    # the quota is shared, so every request backs off.
+                                    self.limiter.pause(delay)
+                                error = LLMError(f"HTTP {resp.status}: {body[:200]}", resp.status)
+                        finally:
+                            call['latency'] += time.monotonic() - started
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = LLMError(f"{type(e).__name__}: {e}")
+                if attempt < self.max_retries:
+                    self.stats['retries'] += 1
+                    call['retries'] += 1
+                    logger.info(f"LLM request failed ({error}), retry {attempt + 1} in {delay:.1f}s")
+                    start = time.monotonic()
+                    await asyncio.sleep(delay)
+                    call['queue_wait'] += time.monotonic() - start
+            self.stats['errors'] += 1
+            raise error
+        except asyncio.CancelledError:
+            call['cancelled'] = True
+            raise
+        finally:
+            usage = call.pop('usage', None)
+            if usage is not None:
+                self._latencies.append(call['latency'])
+            get_llm_metrics().record_call(
+                self.model, ok=usage is not None, hedge=hedge,
+                prompt_tokens=(usage or {}).get('prompt_tokens', 0),
+                completion_tokens=(usage or {}).get('completion_tokens', 0), **call)
+
+    def complete(self, prompt: str, max_tokens: int = None, scored: bool = False, until=None):
+        """Blocking version of acomplete(), callable from any thread."""
+        future = asyncio.run_coroutine_threadsafe(self.acomplete(prompt, max_tokens, scored, until), self._loop)
+        return future.result()
+
+    def complete_many(self, prompts: list, max_tokens: int = None, scored: bool = False,
+                      until=None) -> list:
+        """
+        Run all prompts concurrently within the budgets.
+        :return: one completion per prompt, or the LLMError it failed with.
+        """
+        async def run():
+            return await asyncio.gather(*(self.acomplete(p, max_tokens, scored, until) for p in prompts),
+                                        return_exceptions=True)
+        return asyncio.run_coroutine_threadsafe(run(), self._loop).result()
+
+    def close(self) -> None:
+        async def close_session():
+            if self._session is not None:
+                await self._session.close()
+        asyncio.run_coroutine_threadsafe(close_session(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
@@ -0,0 +1,254 @@
+"""
+Build the single context the LLM sees for one url of a paper.
+
+A url is usually extracted several times: the pdftohtml anchor, the
+pdftotext line window, the PyPDF2 window and repeated citations give
+overlapping or identical snippets. merge_contexts() collapses them:
+- whitespace is normalized and snippets contained in another are dropped,
+- shifted windows of the same passage are joined at their overlap,
+- near-duplicates (word 3-gram containment >= NEAR_DUPLICATE) are dropped,
+- with `compress`, each snippet is reduced by compress_context(): author
+  lists and citation markers are dropped and only the sentence with the
+  url and nearby sentences about data are kept,
+- each remaining snippet is cut to a window around the url mention so
+  that all of them fit in a token budget.
+Tokens before and after are recorded in llm_metrics for the run summary.
+
+Example usage:
+>>> merge_contexts('github.com/a/b', ['The code is at github.com/a/b. We',
+...                                   'The code is at github.com/a/b.  We'])
+'The code is at github.com/a/b. We'
+>>> strip_author_lists('Ann Lee, Bo Wu, Cy Ng, and Di Xu. 2024. Title.')
+'Ann Lee et al. 2024. Title.'
+>>> compress_context('https://github.com/a/b', 'Ann Lee et al. proposed it. It is fast. '
+...                  'We train on MNIST [3, 4]. Data is at https://github.com/a/b.')
+'... We train on MNIST. Data is at https://github.com/a/b.'
+"""
+import re
+from urllib.parse import urlparse
+
+from llm_client import estimate_tokens
+from llm_metrics import get_llm_metrics
+
+DEFAULT_TOKEN_BUDGET = 300
+NEAR_DUPLICATE = 0.8
+# shifted windows must share at least this many characters to be joined.
+MIN_OVERLAP = 40
+SEPARATOR = '\n---\n'
+# sentences further than this from the url mention are only kept when they talk about data.
+NEIGHBOURS = 1
+DATA_WORDS = re.compile(
+    r'data|benchmark|corpus|corpora|download|release|available|repositor|code|annotat|leaderboard|'
+    r'evaluat|split|train|test set|collect', re.I)
+
+_SENTENCE_END = re.compile(r'(?<=[.!?;])\s+(?=[A-Z0-9\[(])')
+_NOT_AN_END = re.compile(r'(?:\bet al|\b[A-Z]|\be\.g|\bi\.e|\bvs|\bFig|\bEq|\bSec|\bTab|\bNo)\.$')
+# a person's name: two to four capitalized words or initials, "Kevin M.Esvelt".
+_NAME = r"[A-Z](?:[a-z][\w'\-]*|\.)(?:\s*[A-Z](?:[a-z][\w'\-]*|\.)){1,3}"
+AUTHOR_RUN = 4
+_AUTHORS = re.compile(rf"({_NAME})(?:,\s*(?:and\s+)?{_NAME}){{{AUTHOR_RUN - 1},}}(?:,?\s+and\s+{_NAME})?\.?")
+# a run of names is only an author list when it looks like a bibliography
+# entry: a name has an initial, "et al." follows, or a year or venue
+# follows within the title. Lists of dataset or tool names ("Penn
+# Treebank, Open Images, ...") have none of these.
+_INITIAL = re.compile(r'(?:^|\s)[A-Z]\.')
+_ENTRY_FOLLOWS = re.compile(r'[\s.,:]*(?:et al\b|\(?(?:19|20)\d{2}[a-z]?\b)')
+_ENTRY_NEAR = re.compile(
+    r'\b(?:19|20)\d{2}[a-z]?\s*[.,)]|\.\s+In\s+(?!(?:Table|Figure|Fig|Section|Sec|Appendix|This|These|Our)\b)[A-Z]|'
+    r'\(eds?\.\)|\bProceedings\b|\barXiv\b|\bJournal\b|\bConference\b|\bTransactions\b')
+# how far after the names the year or venue may come.
+ENTRY_WINDOW = 200
+_CITATION_NOISE = [
+    re.compile(r'\s*\[\d+(?:\s*[,\u2013-]\s*\d+)*\]'),                         # [12], [3, 4-6]
+    re.compile(r'\s*\((?:[A-Z][^()]{0,60}?(?:et al\.?|and [A-Z]\w+),?\s*\d{4}[a-z]?;?\s*)+\)'),  # (Lee et al., 2020)
+    re.compile(r'\s*ISSN\s+[\dX\-, ]+\.?'),
+]
+
+
+def normalize(text: str) -> str:
+    return ' '.join(text.split())
+
+
+def _shingles(text: str) -> set:
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < 3:
+        return {tuple(words)}
+    return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def _join_overlap(a: str, b: str) -> str:
+    """:return: `a` and `b` joined where the end of `a` is the start of `b`, or None."""
+    probe = b[:MIN_OVERLAP]
+    if len(probe) < MIN_OVERLAP:
+        return None
+    start = a.find(probe)
+    while start >= 0:
+        if b.startswith(a[start:]):
+            return a[:start] + b
+        start = a.find(probe, start + 1)
+    return None
+
+
+def dedupe_contexts(contexts: list) -> list:
+    """:return: the distinct snippets of `contexts`, in their original order."""
+    kept = []
+    for text in (normalize(c) for c in contexts):
+        if not text or any(text in k for k in kept):
+            continue
+        # keep the longer form when an earlier snippet is contained in this one.
+        kept = [k for k in kept if k not in text]
+        for i, k in enumerate(kept):
+            joined = _join_overlap(k, text) or _join_overlap(text, k)
+            if joined:
+                kept[i] = joined
+                break
+        else:
+            kept.append(text)
+
+    ret, seen = [], []
+    for text in kept:
+        shingles = _shingles(text)
+        if any(len(shingles & s) >= NEAR_DUPLICATE * min(len(shingles), len(s)) for s in seen):
+            continue
+        ret.append(text)
+        seen.append(shingles)
+    return ret
+
+
+def find_mention(url: str, text: str) -> int:
+    """:return: position of `url` in `text` (or of its host), -1 if absent."""
+    bare = re.sub(r'^https?://', '', url).rstrip('/')
+    for needle in (bare, bare[:40], urlparse('https://' + bare).netloc):
+        if needle:
+            pos = text.find(needle)
+            if pos >= 0:
+                return pos
+    return -1
+
+
+def mention_window(url: str, text: str, max_chars: int) -> str:
+    """:return: at most `max_chars` of `text` centred on the url mention, cut at spaces."""
+    if len(text) <= max_chars:
+        return text
+    pos = find_mention(url, text)
+    center = pos + len(url) // 2 if pos >= 0 else 0
+    start = max(0, min(center - max_chars // 2, len(text) - max_chars))
+    end = start + max_chars
+    if start > 0:
+        space = text.find(' ', start)
+        start = space + 1 if 0 <= space < start + 20 else start
+    if end < len(text):
+        space = text.rfind(' ', end - 20, end)
+        end = space if space > start else end
+    return text[start:end]
+
+
+def strip_author_lists(text: str) -> str:
+    """
+    :return: `text` with author lists of AUTHOR_RUN or more names cut to 'First Author et al.'
+
+    >>> strip_author_lists('Kevin M. Esvelt, Bo Wu, Cy Ng, and Di Xu. Delay, detect, defend.')
+    'Kevin M. Esvelt et al. Delay, detect, defend.'
+    >>> strip_author_lists('We evaluate on Penn Treebank, Open Images, Visual Genome, Common Crawl, and Natural Questions.')
+    'We evaluate on Penn Treebank, Open Images, Visual Genome, Common Crawl, and Natural Questions.'
+    >>> strip_author_lists('We use Hugging Face, Google Drive, Zenodo Records, Kaggle Datasets, and Papers With Code. '
+    ...                    'All of them are public.')
+    'We use Hugging Face, Google Drive, Zenodo Records, Kaggle Datasets, and Papers With Code. All of them are public.'
+    >>> strip_author_lists('Damai Dai, Yifan Song, Jingjing Xu, Zhifang Sui, and Lei Li. Calibrating factual knowledge. In EMNLP, 2022.')
+    'Damai Dai et al. Calibrating factual knowledge. In EMNLP, 2022.'
+    """
+    def collapse(m):
+        if _INITIAL.search(m.group(0)) or _ENTRY_FOLLOWS.match(text, m.end()) \
+                or _ENTRY_NEAR.search(text, m.end(), m.end() + ENTRY_WINDOW):
+            return m.group(1) + ' et al.'
+        return m.group(0)
+    return _AUTHORS.sub(collapse, text)
+
+
+def split_sentences(text: str) -> list:
+    ret = []
+    for s in _SENTENCE_END.split(text):
+        if ret and _NOT_AN_END.search(ret[-1]):
+            ret[-1] += ' ' + s
+        elif s:
+            ret.append(s)
+    return ret
+
+
+def compress_context(url: str, text: str, max_tokens: int = None) -> str:
+    """
+    :return: the sentence of `text` that mentions `url`, plus its neighbours
+      and other sentences about data, without author lists and citation
+      markers; dropped stretches are marked with '...'.
+    """
+    text = strip_author_lists(normalize(text))
+    for pattern in _CITATION_NOISE:
+        text = pattern.sub('', text)
+    sentences = split_sentences(text)
+    if len(sentences) <= 1:
+        return text
+
+    pos, mention = find_mention(url, text), None
+    if pos >= 0:
+        offset = 0
+        for i, s in enumerate(sentences):
+            offset = text.find(s, offset)
+            if offset <= pos < offset + len(s):
+                mention = i
+                break
+            offset += len(s)
+    if mention is None:
+        # a url split over lines: the sentence with most of its host.
+        mention = len(sentences) - 1
+
+    def wanted(i):
+        return abs(i - mention) <= NEIGHBOURS or DATA_WORDS.search(sentences[i])
+
+    # nearest sentences first, so the budget keeps what surrounds the mention.
+    order = sorted((i for i in range(len(sentences)) if wanted(i)), key=lambda i: (abs(i - mention), i))
+    kept, tokens = set(), 0
+    for i in order:
+        cost = estimate_tokens(sentences[i])
+        if kept and max_tokens and tokens + cost > max_tokens:
+            continue
+        kept.add(i)
+        tokens += cost
+
+    ret = []
+    for i in sorted(kept):
+        if ret and i - 1 not in kept or not ret and i > 0:
+            ret.append('...')
+        ret.append(sentences[i])
+    return ' '.join(ret)
+
+
+def merge_contexts(url: str, contexts: list, max_tokens: int = DEFAULT_TOKEN_BUDGET,
+                   compress: bool = False) -> str:
+    """:return: one context for `url`, within about `max_tokens` tokens."""
+    snippets = dedupe_contexts(contexts)
+    if not snippets:
+        return ''
+    before = estimate_tokens(SEPARATOR.join(snippets))
+    merged = _fit_budget(url, snippets, max_tokens, compress)
+    get_llm_metrics().record_context(before, estimate_tokens(merged))
+    return merged
+
+
+def _fit_budget(url: str, snippets: list, max_tokens: int, compress: bool) -> str:
+    if compress:
+        per_snippet = max(max_tokens // len(snippets), 40)
+        snippets = dedupe_contexts([compress_context(url, s, per_snippet) for s in snippets])
+    merged = SEPARATOR.join(snippets)
+    if estimate_tokens(merged) <= max_tokens:
+        return merged
+
+    # share the budget evenly; when it still runs out, later snippets are dropped.
+    chars = max_tokens * len(merged) // estimate_tokens(merged)
+    per_snippet = max(chars // len(snippets), 160)
+    ret = []
+    for text in snippets:
+        window = mention_window(url, text, per_snippet)
+        if ret and estimate_tokens(SEPARATOR.join(ret + [window])) > max_tokens:
+            break
+        ret.append(window)
+    return SEPARATOR.join(ret)
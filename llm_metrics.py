@@ -0,0 +1,216 @@
+"""
+Per-call metrics of LLM requests, aggregated per paper and per run.
+
+Every request sent to the LLM records how long it waited before it was
+sent (rate limiting, concurrency slots, 429 pauses), its latency, its
+prompt/completion tokens and its retries; LLM cache lookups record hits
+and misses. Calls are attributed to the paper set with begin_paper() and are also
+totalled per model, which gives per-tier figures for llm_router.
+Latencies go into fixed histogram buckets and the samples are kept for
+percentiles. Hedged duplicates (llm_client) are calls of their own;
+the copy that lost the race is recorded as cancelled, not as an error,
+and its latency is not a sample. Cost is estimated from PRICES for the model of each call.
+
+merge_contexts() records the tokens of each url's contexts before and
+after deduplication, compression and the token budget, so the summary
+shows how many prompt tokens context preparation saved.
+
+Token counts come from the `usage` of the response when the client sees
+it (llm_client) and are estimated from the text otherwise (LangChain).
+
+Example usage:
+>>> metrics = get_llm_metrics()
+>>> metrics.begin_paper('odjMSBSWRt')
+>>> metrics.record_call('gpt-3.5-turbo-instruct', latency=0.42, queue_wait=0.1,
+...                     prompt_tokens=160, completion_tokens=1)
+>>> metrics.record_cache(hit=True)
+>>> print(metrics.table())
+>>> metrics.write('llm_metrics.json')
+"""
+import bisect
+import json
+import threading
+import time
+
+# USD per 1M (prompt, completion) tokens; the longest matching prefix wins.
+PRICES = {
+    'gpt-3.5-turbo-instruct': (1.5, 2.0),
+    'gpt-3.5-turbo': (0.5, 1.5),
+    'gpt-4o-mini': (0.15, 0.6),
+    'gpt-4o': (2.5, 10.0),
+    'gpt-4.1-mini': (0.4, 1.6),
+    'gpt-4.1-nano': (0.1, 0.4),
+    'gpt-4.1': (2.0, 8.0),
+}
+# upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+RUN = '(run)'
+
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """:return: estimated USD cost of one call, 0 for unknown models."""
+    prefixes = [p for p in PRICES if model and model.startswith(p)]
+    if not prefixes:
+        return 0.0
+    price_in, price_out = PRICES[max(prefixes, key=len)]
+    return (prompt_tokens * price_in + completion_tokens * price_out) / 1e6
+
+
+def percentile(samples: list, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _new_totals() -> dict:
+    return {'calls': 0, 'errors': 0, 'retries': 0, 'rate_limited': 0, 'hedges': 0, 'cancelled': 0,
+            'cache_hits': 0, 'cache_misses': 0,
+            'prompt_tokens': 0, 'completion_tokens': 0, 'estimated_tokens': 0, 'cost': 0.0,
+            'queue_wait': 0.0, 'latency': 0.0, 'context_tokens_in': 0, 'context_tokens_out': 0,
+            'histogram': [0] * (len(LATENCY_BUCKETS) + 1), 'latencies': []}
+
+
+class LLMMetrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.paper = None
+        self.papers = {}
+        self.models = {}
+        self.run = _new_totals()
+        self.started = time.time()
+
+    def begin_paper(self, paper_id: str) -> None:
+        """Attribute the following calls to `paper_id`."""
+        with self._lock:
+            self.paper = paper_id
+            self.papers.setdefault(paper_id, _new_totals())
+
+    def _targets(self) -> list:
+        if self.paper is None:
+            return [self.run]
+        return [self.run, self.papers[self.paper]]
+
+    def record_call(self, model: str, latency: float, queue_wait: float = 0.0,
+                    prompt_tokens: int = 0, completion_tokens: int = 0, retries: int = 0,
+                    rate_limited: int = 0, ok: bool = True, estimated: bool = False,
+                    hedge: bool = False, cancelled: bool = False) -> None:
+        """
+        Record one logical call (all its attempts).
+        :param latency: seconds spent in requests, without queue_wait.
+        :param estimated: the token counts are estimated, not reported by the API.
+        :param hedge: the call is a hedged duplicate of another.
+        :param cancelled: the call was abandoned, e.g. it lost a hedge race.
+        """
+        cost = call_cost(model, prompt_tokens, completion_tokens)
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, latency)
+        with self._lock:
+            model_totals = self.models.setdefault(model, _new_totals())
+            for t in self._targets() + [model_totals]:
+                t['calls'] += 1
+                t['errors'] += 0 if ok or cancelled else 1
+                t['hedges'] += 1 if hedge else 0
+                t['cancelled'] += 1 if cancelled else 0
+                t['retries'] += retries
+                t['rate_limited'] += rate_limited
+                t['prompt_tokens'] += prompt_tokens
+                t['completion_tokens'] += completion_tokens
+                if estimated:
+                    t['estimated_tokens'] += prompt_tokens + completion_tokens
+                t['cost'] += cost
+                t['queue_wait'] += queue_wait
+                t['latency'] += latency
+                if not cancelled:
+                    t['histogram'][bucket] += 1
+                    t['latencies'].append(latency)
+
+    def record_retry(self, count: int = 1) -> None:
+        """Retries that are not part of a record_call(), e.g. tenacity's."""
+        with self._lock:
+            for t in self._targets():
+                t['retries'] += count
+
+    def record_wait(self, seconds: float) -> None:
+        """Time spent waiting outside a record_call(), e.g. the fixed rate-limit delay."""
+        with self._lock:
+            for t in self._targets():
+                t['queue_wait'] += seconds
+
+    def record_context(self, tokens_in: int, tokens_out: int) -> None:
+        """Tokens of a url's contexts before and after they were prepared for the prompt."""
+        with self._lock:
+            for t in self._targets():
+                t['context_tokens_in'] += tokens_in
+                t['context_tokens_out'] += tokens_out
+
+    def record_cache(self, hit: bool) -> None:
+        with self._lock:
+            for t in self._targets():
+                t['cache_hits' if hit else 'cache_misses'] += 1
+
+    @staticmethod
+    def _row(t: dict) -> dict:
+        row = {k: v for k, v in t.items() if k != 'latencies'}
+        row['latency_p50'] = percentile(t['latencies'], 0.5)
+        row['latency_p95'] = percentile(t['latencies'], 0.95)
+        row['latency_p99'] = percentile(t['latencies'], 0.99)
+        row['latency_max'] = max(t['latencies'], default=0.0)
+        return row
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {'started': self.started, 'elapsed': time.time() - self.started,
+                    'latency_buckets': list(LATENCY_BUCKETS),
+                    'run': self._row(self.run),
+                    'papers': {p: self._row(t) for p, t in self.papers.items()},
+                    'models': {m: self._row(t) for m, t in self.models.items()}}
+
+    def table(self) -> str:
+        """:return: one line per paper and a run total, plus the run's latency histogram."""
+        data = self.to_dict()
+        header = (f"{'paper':<16} {'calls':>5} {'err':>4} {'retry':>5} {'429':>4} {'cache':>9} "
+                  f"{'tokens in/out':>15} {'cost $':>8} {'wait s':>7} {'llm s':>7} {'p50':>6} {'p95':>6} {'p99':>6}")
+        lines = [header]
+        rows = list(data['papers'].items()) + [(RUN, data['run'])]
+        if len(data['models']) > 1:
+            rows += [(f"[{m}]", r) for m, r in data['models'].items()]
+        for name, r in rows:
+            lines.append(
+                f"{name[:16]:<16} {r['calls']:>5} {r['errors']:>4} {r['retries']:>5} {r['rate_limited']:>4} "
+                f"{r['cache_hits']:>4}/{r['cache_misses']:<4} "
+                f"{r['prompt_tokens']:>8}/{r['completion_tokens']:<6} {r['cost']:>8.4f} "
+                f"{r['queue_wait']:>7.1f} {r['latency']:>7.1f} {r['latency_p50']:>6.2f} {r['latency_p95']:>6.2f} {r['latency_p99']:>6.2f}")
+        bounds = [f"<={b}s" for b in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+        if data['run']['calls']:
+            lines.append('latency: ' + ' '.join(f"{b}:{n}" for b, n in zip(bounds, data['run']['histogram']) if n))
+        run = data['run']
+        if run['context_tokens_in']:
+            saved = run['context_tokens_in'] - run['context_tokens_out']
+            lines.append(f"context: {run['context_tokens_in']} -> {run['context_tokens_out']} tokens, "
+                         f"{saved} saved ({saved / run['context_tokens_in']:.1%})")
+        if run['hedges']:
+            lines.append(f"hedged: {run['hedges']} duplicate requests, {run['cancelled']} cancelled")
+        if data['run']['estimated_tokens']:
+            lines.append(f"{data['run']['estimated_tokens']} of the tokens are estimated from the text")
+        return '\n'.join(lines)
+
+    def write(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.paper = None
+            self.papers = {}
+            self.models = {}
+            self.run = _new_totals()
+            self.started = time.time()
+
+
+_metrics = LLMMetrics()
+
+
+def get_llm_metrics() -> LLMMetrics:
+    """:return: the metrics shared by the whole process."""
+    return _metrics
@@ -0,0 +1,165 @@
+"""
+Route LLM prompts through a cascade of models: a fast, cheap model answers
+first and only answers it is unsure of go to the next, stronger model.
+
+An answer is escalated when
+- it has no YES/NO verdict ('unparseable'); as in parse_verdict(), the
+  first label is the verdict, so an explanation that goes on to say "no
+  model weights" after a YES is not a reason to escalate,
+- the probability of its first token is below `min_confidence`
+  ('low confidence'); this needs an endpoint that returns logprobs, and
+  is skipped for endpoints that do not,
+- the request failed after the client's own retries ('error').
+The last tier's answer is always taken. Answers that are JSON arrays
+(batch prompts) are not escalated; the links a batch answer leaves out are
+classified one by one and go through the cascade then.
+
+Every tier is an llm_client.AsyncLLMClient, so any OpenAI-compatible
+endpoint works, including stub_server. TieredLLMClient has the interface
+of AsyncLLMClient that combine uses (complete, complete_many, model,
+max_concurrency, stats, close) and can be set as combine.LLM_CLIENT.
+Per-tier latency, tokens and cost are in llm_metrics under each model.
+
+Example usage:
+>>> server, base_url = start_stub_server()   # from stub_server
+>>> cheap = AsyncLLMClient(base_url=base_url + 'v1', model='gpt-4o-mini')
+>>> strong = AsyncLLMClient(base_url=base_url + 'v1', model='gpt-4o')
+>>> router = TieredLLMClient([cheap, strong], min_confidence=0.8)
+>>> router.complete('Is https://github.com/a/data a dataset? Answer YES or NO.')   # asked twice
+'YES'
+>>> router.summary()
+'gpt-4o-mini: 0 decided; gpt-4o: 1 decided; escalated: low confidence 1'
+>>> router.close()
+"""
+import logging
+import threading
+
+from llm_client import LLMError, parse_verdict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_CONFIDENCE = 0.8
+
+
+def escalation_reason(text: str, confidence: float = None,
+                      min_confidence: float = DEFAULT_MIN_CONFIDENCE):
+    """
+    :return: why `text` should go to a stronger model, or None to accept it.
+
+    >>> escalation_reason('YES. It hosts the data; no model weights.') is None
+    True
+    >>> escalation_reason('The repository is a baseline.')
+    'unparseable'
+    >>> escalation_reason('NO', confidence=0.55)
+    'low confidence'
+    """
+    if text.lstrip().startswith('['):
+        return None
+    if parse_verdict(text) is None:
+        return 'unparseable'
+    if confidence is not None and confidence < min_confidence:
+        return 'low confidence'
+    return None
+
+
+class TieredLLMClient:
+
+    def __init__(self, tiers: list, min_confidence: float = DEFAULT_MIN_CONFIDENCE):
+        """
+        :param tiers: AsyncLLMClient instances, cheapest first.
+        """
+        if not tiers:
+            raise ValueError("at least one tier is required")
+        self.tiers = tiers
+        self.min_confidence = min_confidence
+        self.decided = [0] * len(tiers)
+        self.escalated = {}
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> str:
+        # part of the LLM cache key: a cascade answers differently from its first model.
+        return '>'.join(t.model for t in self.tiers)
+
+    model_name = model
+
+    @property
+    def max_concurrency(self) -> int:
+        return self.tiers[0].max_concurrency
+
+    @property
+    def stats(self) -> dict:
+        """The request stats of all tiers summed, as AsyncLLMClient.stats."""
+        ret = {}
+        for tier in self.tiers:
+            for k, v in tier.stats.items():
+                ret[k] = ret.get(k, 0) + v
+        ret['escalated'] = sum(self.escalated.values())
+        return ret
+
+    def _accept(self, level: int, text: str, confidence, reason: str = None) -> bool:
+        if level == len(self.tiers) - 1:
+            reason = None
+        elif reason is None:
+            reason = escalation_reason(text, confidence, self.min_confidence)
+        with self._lock:
+            if reason is None:
+                self.decided[level] += 1
+            else:
+                self.escalated[reason] = self.escalated.get(reason, 0) + 1
+        if reason is not None:
+            logger.info(f"{self.tiers[level].model} answer escalated ({reason}"
+                        + (f", p={confidence:.2f})" if confidence is not None else ")"))
+        return reason is None
+
+    def complete(self, prompt: str, max_tokens: int = None, until=None) -> str:
+        for level, tier in enumerate(self.tiers[:-1]):
+            try:
+                text, confidence = tier.complete(prompt, max_tokens, scored=True, until=until)
+            except LLMError:
+                self._accept(level, None, None, 'error')
+                continue
+            if self._accept(level, text, confidence):
+                return text
+        text = self.tiers[-1].complete(prompt, max_tokens, until=until)
+        self._accept(len(self.tiers) - 1, text, None)
+        return text
+
+    def complete_many(self, prompts: list, max_tokens: int = None, until=None) -> list:
+        """
+        Each tier runs its share concurrently; only the escalated prompts
+        are sent to the next tier.
+        :return: one completion per prompt, or the LLMError it failed with.
+        """
+        results = [None] * len(prompts)
+        todo = list(range(len(prompts)))
+        for level, tier in enumerate(self.tiers):
+            last = level == len(self.tiers) - 1
+            answers = tier.complete_many([prompts[i] for i in todo], max_tokens, scored=not last, until=until)
+            escalated = []
+            for i, answer in zip(todo, answers):
+                if isinstance(answer, Exception):
+                    results[i] = answer
+                    if not last:
+                        self._accept(level, None, None, 'error')
+                        escalated.append(i)
+                    continue
+                text, confidence = (answer, None) if last else answer
+                results[i] = text
+                if not self._accept(level, text, confidence):
+                    escalated.append(i)
+            todo = escalated
+            if not todo:
+                break
+        return results
+
+    def summary(self) -> str:
+        with self._lock:
+            parts = [f"{t.model}: {n} decided" for t, n in zip(self.tiers, self.decided)]
+            if self.escalated:
+                parts.append('escalated: ' + ', '.join(f"{k} {v}" for k, v in sorted(self.escalated.items())))
+        return '; '.join(parts)
+
+    def close(self) -> None:
+        for tier in self.tiers:
+            tier.close()
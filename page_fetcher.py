@@ -0,0 +1,220 @@
+"""
+Fetch the text of candidate pages for content verification.
+
+Pages are fetched concurrently on asyncio with a global cap and a
+per-host cap. Reading stops after `max_bytes`, and the text is pulled out
+with a streaming html.parser that skips scripts, styles and markup and
+stops collecting once it has `max_chars` characters, instead of building
+a full BeautifulSoup tree of the whole page. Files that are not text
+(zip, pdf, ...) are described by their content type and size, which is
+what tells a download link apart.
+
+Results are cached by cleaned url (url_canon.clean_url, with https:// for
+scheme-less urls), in memory for the run and on disk with a time-to-live,
+so github.com/x/y and https://github.com/x/y/ are fetched once. The
+canonical key is not used here: it maps github.com/x/y/tree/main/data to
+the repository, whose page says nothing about that folder.
+
+Requirements:
+aiohttp
+
+Example usage:
+>>> pages = fetch_pages(['https://github.com/THU-KEG/RM-Bench', 'https://pytorch.org'])
+>>> pages['https://pytorch.org'][:40]
+'PyTorch PyTorch Foundation is the deep'
+>>> extract_page_content('https://github.com/THU-KEG/RM-Bench')   # served from the cache
+'GitHub - THU-KEG/RM-Bench ...'
+"""
+import asyncio
+import logging
+import re
+import threading
+import time
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+from disk_cache import DiskCache, cache_path
+from url_canon import clean_url
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 3 * 24 * 3600
+ERROR_TTL = 6 * 3600
+MAX_BYTES = 512 * 1024
+MAX_CHARS = 4000
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+_SKIP_TAGS = {'script', 'style', 'noscript', 'svg', 'template', 'iframe'}
+_TEXT_TYPES = ('text/plain', 'text/markdown', 'text/csv', 'application/json')
+
+
+class _TextExtractor(HTMLParser):
+    """Collects visible text until `max_chars` characters are gathered."""
+
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.parts = []
+        self.size = 0
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if self._skip or self.size >= self.max_chars:
+            return
+        data = data.strip()
+        if data:
+            self.parts.append(data)
+            self.size += len(data) + 1
+
+    @property
+    def full(self) -> bool:
+        return self.size >= self.max_chars
+
+
+def html_to_text(html: str, max_chars: int = MAX_CHARS) -> str:
+    parser = _TextExtractor(max_chars)
+    # feed in pieces so that parsing stops soon after enough text is found.
+    for start in range(0, len(html), 16384):
+        parser.feed(html[start:start + 16384])
+        if parser.full:
+            break
+    return re.sub(r'\s+', ' ', ' '.join(parser.parts)).strip()[:max_chars]
+
+
+async def _read_capped(resp, max_bytes: int) -> tuple:
+    """:return: (at most `max_bytes` of the body, whether it was cut)"""
+    chunks, size = [], 0
+    async for chunk in resp.content.iter_chunked(16384):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            return b''.join(chunks)[:max_bytes], True
+    return b''.join(chunks), False
+
+
+async def fetch_page(session, url: str, host_limits: dict, per_host: int,
+                     max_bytes: int = MAX_BYTES, max_chars: int = MAX_CHARS) -> dict:
+    target = url if '://' in url else 'https://' + url
+    host = urlparse(target).netloc.lower()
+    sem = host_limits.setdefault(host, asyncio.Semaphore(per_host))
+    result = {'url': url, 'text': None, 'status': None, 'content_type': None,
+              'truncated': False, 'error': None}
+    async with sem:
+        try:
+            async with session.get(target, allow_redirects=True, max_redirects=10) as resp:
+                result['status'] = resp.status
+                result['content_type'] = resp.content_type
+                if resp.status >= 400:
+                    result['error'] = f"HTTP {resp.status}"
+                elif resp.content_type in ('text/html', 'application/xhtml+xml') \
+                        or resp.content_type in _TEXT_TYPES:
+                    body, result['truncated'] = await _read_capped(resp, max_bytes)
+                    text = body.decode(resp.charset or 'utf-8', errors='replace')
+                    if resp.content_type in _TEXT_TYPES:
+                        text = re.sub(r'\s+', ' ', text).strip()[:max_chars]
+                    else:
+                        text = html_to_text(text, max_chars)
+                    result['text'] = text or None
+                else:
+                    # a download: do not read it, its type and size say enough.
+                    size = resp.content_length
+                    result['text'] = f"[{resp.content_type} file" + (f", {size} bytes]" if size else "]")
+        except asyncio.TimeoutError:
+            result['error'] = 'timeout'
+        except Exception as e:
+            result['error'] = str(e) or type(e).__name__
+    result['fetched'] = time.time()
+    return result
+
+
+async def fetch_pages_async(urls: list, concurrency: int = 32, per_host: int = 4,
+                            timeout: float = 10.0, max_bytes: int = MAX_BYTES,
+                            max_chars: int = MAX_CHARS) -> dict:
+    """Fetch pages without any caching. :return: {url: result}"""
+    if not AIOHTTP_AVAILABLE:
+        raise RuntimeError("aiohttp is required for fetching pages")
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host, ttl_dns_cache=600)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    host_limits = {}
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout,
+                                     headers=HEADERS) as session:
+        results = await asyncio.gather(
+            *(fetch_page(session, url, host_limits, per_host, max_bytes, max_chars) for url in urls))
+    return {r['url']: r for r in results}
+
+
+def _fresh(result: dict) -> bool:
+    if result.get('error') is None:
+        return True
+    return time.time() - result.get('fetched', 0) < ERROR_TTL
+
+
+# pages fetched during this run, by page_key().
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+def page_key(url: str) -> str:
+    """
+    >>> page_key('github.com/x/y/tree/main/data/')
+    'https://github.com/x/y/tree/main/data'
+    """
+    return clean_url(url if '://' in url else 'https://' + url)
+
+
+def fetch_pages(urls: list, cache: DiskCache = None, ttl: float = DEFAULT_TTL, **kwargs) -> dict:
+    """
+    Fetch the text of pages, reusing pages already fetched by page_key().
+    :param cache: defaults to .cache/pages.sqlite
+    :param kwargs: see fetch_pages_async().
+    :return: {url: text or None}
+    """
+    keys = {url: page_key(url) for url in dict.fromkeys(urls)}
+    with _memo_lock:
+        results = {k: _memo[k] for k in set(keys.values()) if k in _memo}
+    if len(results) < len(set(keys.values())):
+        if cache is None:
+            cache = DiskCache(cache_path('pages.sqlite'), ttl=ttl)
+        results.update({k: r for k, r in cache.get_many(
+            [k for k in set(keys.values()) if k not in results]).items() if _fresh(r)})
+
+    # one request per key, for the first spelling seen.
+    missing = {}
+    for url, key in keys.items():
+        if key not in results:
+            missing.setdefault(key, url)
+    if missing:
+        logger.info(f"fetching {len(missing)} pages, {len(results)} cached")
+        fetched = asyncio.run(fetch_pages_async(list(missing.values()), **kwargs))
+        by_key = {key: fetched[url] for key, url in missing.items()}
+        cache.set_many(by_key)
+        results.update(by_key)
+    with _memo_lock:
+        _memo.update(results)
+    return {url: results[key]['text'] for url, key in keys.items()}
+
+
+def extract_page_content(url: str):
+    """:return: up to MAX_CHARS characters of the page text, or None."""
+    try:
+        return fetch_pages([url])[url]
+    except Exception as e:
+        logger.warning(f"Failed to retrieve content from {url}: {str(e)}")
+        return None
@@ -0,0 +1,140 @@
+"""
+Find the sections of a paper in its pdftotext output and tag every url
+with the sections it is mentioned in.
+
+Sections are coarse: front (title, authors, affiliations, before the
+abstract), abstract, body, acknowledgements, references and appendix.
+Headings are recognized by their text ("1 INTRODUCTION", "References",
+"Appendix"), by numbered headings once the abstract is over, and by
+lettered headings ("A ADDITIONAL RESULTS", "B.1 Datasets") after the
+references.
+
+Most urls of a paper are arXiv/DOI links in its bibliography. With the
+sections known, section_policy() can reject a citation url that only
+appears in the references before the rules or the LLM look at it.
+
+Example usage:
+>>> lines = open('paper.txt', encoding='utf-8').read().split('\\n')
+>>> find_sections(lines)
+[(0, 'front'), (17, 'abstract'), (31, 'body'), (631, 'acknowledgements'), (642, 'references'), (785, 'appendix')]
+>>> tag_urls(lines, ['https://arxiv.org/abs/2310.06825', 'https://github.com/kaistAI/Knowledge-Entropy'])
+{'https://arxiv.org/abs/2310.06825': ['references'], 'https://github.com/kaistAI/Knowledge-Entropy': ['body']}
+>>> section_policy('https://arxiv.org/abs/2310.06825', ['references'])
+(False, 'references:citation')
+"""
+import bisect
+import os
+import re
+
+SECTIONS = ('front', 'abstract', 'body', 'acknowledgements', 'references', 'appendix')
+
+_NUMBER = r'(?:\d+(?:\.\d+)*\.?|[IVX]+\.|[A-H](?:\.\d+)*\.?)'
+_KNOWN = {
+    'abstract': 'abstract',
+    'introduction': 'body', 'related work': 'body', 'background': 'body', 'preliminaries': 'body',
+    'method': 'body', 'methods': 'body', 'methodology': 'body', 'approach': 'body',
+    'experiment': 'body', 'experiments': 'body', 'experimental setup': 'body', 'results': 'body',
+    'evaluation': 'body', 'discussion': 'body', 'conclusion': 'body', 'conclusions': 'body',
+    'limitations': 'body',
+    'acknowledgement': 'acknowledgements', 'acknowledgements': 'acknowledgements',
+    'acknowledgment': 'acknowledgements', 'acknowledgments': 'acknowledgements',
+    'references': 'references', 'bibliography': 'references',
+    'appendix': 'appendix', 'appendices': 'appendix', 'supplementary material': 'appendix',
+}
+_HEADING = re.compile(rf'^(?:{_NUMBER}\s+)?([A-Za-z][A-Za-z ]{{2,40}}?)\s*:?$')
+_NUMBERED = re.compile(r'^\d+\.?\s+[A-Z][A-Za-z\-]+(?:\s+[A-Za-z\-]+){0,8}$')
+_LETTERED = re.compile(r'^[A-H](?:\.\d+)*\s+[A-Z][A-Za-z\-]+(?:\s+[A-Za-z\-]+){0,8}$')
+
+# hosts of papers rather than of resources; a link to them in the
+# bibliography is a citation.
+CITATION_HOSTS = (
+    'arxiv.org', 'doi.org', 'aclanthology.org', 'aclweb.org', 'openreview.net', 'dl.acm.org',
+    'ieeexplore.ieee.org', 'proceedings.neurips.cc', 'papers.nips.cc', 'proceedings.mlr.press',
+    'link.springer.com', 'semanticscholar.org', 'openaccess.thecvf.com', 'ojs.aaai.org', 'ijcai.org',
+    'jmlr.org', 'nature.com', 'science.org', 'sciencedirect.com', 'scholar.google.com',
+)
+_DOI = re.compile(r'^(?:doi:)?10\.\d{4,}/', re.I)
+
+
+def _heading(line: str, current: str):
+    """:return: the section a heading line starts, or None."""
+    line = line.strip()
+    if not line or len(line) > 80:
+        return None
+    m = _HEADING.match(line)
+    if m:
+        title = m.group(1).strip().lower()
+        if title in _KNOWN:
+            return _KNOWN[title]
+    if current in ('front', 'abstract') and _NUMBERED.match(line):
+        return 'body'
+    if current in ('references', 'appendix') and _LETTERED.match(line):
+        return 'appendix'
+    return None
+
+
+def find_sections(lines: list) -> list:
+    """:return: [(first line index, section), ...], starting with (0, 'front')."""
+    ret = [(0, 'front')]
+    for i, line in enumerate(lines):
+        section = _heading(line, ret[-1][1])
+        if section is not None and section != ret[-1][1]:
+            ret.append((i, section))
+    return ret
+
+
+def _needle(url: str) -> str:
+    """The start of `url` as it is printed."""
+    needle = re.sub(r'^https?://(?:www\.)?', '', url)
+    return needle[:30]
+
+
+def tag_urls(lines: list, urls) -> dict:
+    """:return: {url: [section of each mention, in order, without repeats]}"""
+    sections = find_sections(lines)
+    starts = [s for s, _ in sections]
+    # lines are joined without a separator, so urls broken over two lines are found too.
+    text = ''.join(lines)
+    line_starts = [0]
+    for line in lines[:-1]:
+        line_starts.append(line_starts[-1] + len(line))
+    ret = {}
+    for url in urls:
+        needle = _needle(url)
+        found = []
+        pos = text.find(needle) if needle else -1
+        while pos >= 0:
+            line_no = bisect.bisect_right(line_starts, pos) - 1
+            section = sections[bisect.bisect_right(starts, line_no) - 1][1]
+            if section not in found:
+                found.append(section)
+            pos = text.find(needle, pos + len(needle))
+        ret[url] = found
+    return ret
+
+
+def tag_file(text_file: str, urls) -> dict:
+    """tag_urls() for a pdftotext output file; empty when it is missing."""
+    if not os.path.exists(text_file):
+        return {}
+    with open(text_file, encoding='utf-8', errors='replace') as fobj:
+        return tag_urls(fobj.read().split('\n'), urls)
+
+
+def is_citation_url(url: str) -> bool:
+    """:return: True for links to papers (arXiv, DOI, proceedings), not to resources."""
+    if _DOI.match(url):
+        return True
+    host = re.sub(r'^[a-zA-Z][a-zA-Z0-9+.\-]*://', '', url).split('/')[0].lower()
+    host = host[4:] if host.startswith('www.') else host
+    return any(host == h or host.endswith('.' + h) for h in CITATION_HOSTS)
+
+
+def section_policy(url: str, sections: list) -> tuple:
+    """
+    Cheap decisions from where a url is mentioned, taken before rules and LLM.
+    :return: (False, reason) to reject the url, or (None, None) to go on.
+    """
+    if sections and set(sections) == {'references'} and is_citation_url(url):
+        return False, 'references:citation'
+    return None, None
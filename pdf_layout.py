@@ -0,0 +1,177 @@
+"""
+Where the urls of a paper are printed: page, vertical position and font
+size, from the output of `pdftohtml -xml`.
+
+process_pdf() in pdf_url.py runs `pdftohtml -s`, which keeps the links
+but not their position, so a footnote of the title page looks like any
+line of the body. Here every url (a link, or plain text matching the url
+pattern, read across a line break the way process_text() does) is
+recorded with its page, its top as a share of the page height and its
+font size, and flagged:
+- first_page: on page 1, where papers announce their code and data;
+- footnote: in the bottom part of the page, in a smaller font than the
+  body text;
+- caption: in a "Figure N" / "Table N" caption.
+
+layout_score() turns the flags into a priority, 0..1, that schedulers
+and the LLM budget use to look at the most promising links first.
+
+Requirements:
+poppler-utils
+beautifulsoup4==4.12.2
+
+Example usage:
+>>> layout = find_layout('paper.pdf')
+>>> layout['https://github.com/kaistAI/Knowledge-Entropy']
+{'positions': [{'page': 1, 'top': 0.91, 'size': 9.0}], 'flags': ['first_page', 'footnote'], 'score': 0.8}
+"""
+import collections
+import html
+import re
+import subprocess
+import sys
+import warnings
+
+from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
+
+from url_canon import clean_url
+
+# below this share of the page height, small print is a footnote.
+FOOTNOTE_TOP = 0.75
+# caption lines after the "Figure N" line, in the same font and at most
+# CAPTION_GAP line heights below the previous line.
+CAPTION_LINES = 3
+CAPTION_GAP = 2.0
+
+FLAG_WEIGHTS = {'first_page': 0.2, 'footnote': 0.3, 'caption': 0.1}
+BASE_SCORE = 0.3
+
+# the patterns of process_text() in pdf_url.py.
+_URL = re.compile(r"https?://(?:www\.)?[-a-zA-Z0-9@:%._+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b[-a-zA-Z0-9()@:%_+.~#?&/=]*")
+_BACKUP_URL = re.compile(r"(?:www\.)?[-a-zA-Z0-9@:%._+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}/[-a-zA-Z0-9()@:%_+.~#?&=/]*")
+_CAPTION = re.compile(r'^\s*(?:Figure|Fig\.|Table)\s*\d+', re.I)
+
+
+def _on_error(msg: str):
+    print("\033[01;31m[!]\033[0;m", msg, file=sys.stderr)
+
+
+def layout_score(flags) -> float:
+    """:return: the priority of a url printed with these flags, 0..1."""
+    return round(min(1.0, BASE_SCORE + sum(FLAG_WEIGHTS.get(f, 0) for f in flags)), 2)
+
+
+def _number(value, default=0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _text_urls(line: str, next_line: str) -> list:
+    """
+    The urls of `line`, completed with `next_line` when pdftohtml broke
+    them, as process_text() reads the lines of pdftotext.
+
+    >>> _text_urls('Code: https://github.com/kaistAI/Knowledge-', 'Entropy and data')
+    ['https://github.com/kaistAI/Knowledge-', 'https://github.com/kaistAI/Knowledge-Entropy']
+    >>> _text_urls('see huggingface.co/datasets/a/b.', '')
+    ['huggingface.co/datasets/a/b.']
+    """
+    joined = line + next_line
+    ret = []
+    for pattern in (_URL, _BACKUP_URL):
+        m1 = pattern.findall(line)
+        m2 = pattern.findall(joined)
+        m2 = m2[:len(m1)] if m1 else m2[:1]
+        if 'http' not in line:
+            # the url starts on the next line, it is found there.
+            m2 = []
+        ret = list(dict.fromkeys(m1 + m2))
+        # scheme-less urls only when there is no url at all.
+        if ret or 'http' in joined:
+            break
+    return ret
+
+
+def parse_layout(xml_doc: str) -> dict:
+    """
+    :param xml_doc: the output of `pdftohtml -xml -stdout`.
+    :return: {url: {'positions': [{'page', 'top', 'size'}, ...], 'flags': [...], 'score': float}}
+    """
+    with warnings.catch_warnings():
+        # html.parser, as process_pdf(); it copes with broken pdftohtml output.
+        warnings.simplefilter('ignore', XMLParsedAsHTMLWarning)
+        soup = BeautifulSoup(xml_doc, 'html.parser')
+    sizes = {}
+    lines = []   # (page number, page height, text element)
+    for page in soup.find_all('page'):
+        number = int(_number(page.get('number'), 0))
+        height = _number(page.get('height'), 1.0) or 1.0
+        for spec in page.find_all('fontspec'):
+            sizes[spec.get('id')] = _number(spec.get('size'))
+        for text in page.find_all('text'):
+            lines.append((number, height, text, html.unescape(text.get_text()).strip()))
+
+    # the body font is the size of most of the text.
+    weight = collections.Counter()
+    for _, _, text, _ in lines:
+        weight[sizes.get(text.get('font'), 0.0)] += len(text.get_text())
+    body_size = weight.most_common(1)[0][0] if weight else 0.0
+
+    ret = {}
+    caption = None   # (page, font, lines left, top of its last line) of the caption being read
+    for i, (number, height, text, content) in enumerate(lines):
+        font = text.get('font')
+        line_top, line_height = _number(text.get('top')), _number(text.get('height'), 1.0)
+        if _CAPTION.match(content):
+            caption = (number, font, CAPTION_LINES, line_top)
+        elif caption is not None:
+            page, cfont, left, last_top = caption
+            follows = page == number and cfont == font and 0 <= line_top - last_top <= CAPTION_GAP * line_height
+            caption = (page, cfont, left - 1, line_top) if follows and left > 0 else None
+
+        urls = [a.get('href') for a in text.find_all('a') if (a.get('href') or '').startswith('http')]
+        next_line = lines[i + 1][3] if i + 1 < len(lines) and lines[i + 1][0] == number else ''
+        urls += _text_urls(content, next_line)
+        if not urls:
+            continue
+        top = line_top / height
+        size = sizes.get(font, 0.0)
+        flags = []
+        if number == 1:
+            flags.append('first_page')
+        if top >= FOOTNOTE_TOP and 0 < size < body_size:
+            flags.append('footnote')
+        if caption is not None:
+            flags.append('caption')
+        for url in dict.fromkeys(clean_url(re.sub(r'\.+$', '', u)) for u in urls):
+            entry = ret.setdefault(url, {'positions': [], 'flags': [], 'score': 0.0})
+            entry['positions'].append({'page': number, 'top': round(top, 2), 'size': size})
+            entry['flags'] += [f for f in flags if f not in entry['flags']]
+            entry['score'] = max(entry['score'], layout_score(flags))
+    return ret
+
+
+def find_layout(pdf_filename: str) -> dict:
+    """parse_layout() of a pdf file; empty when pdftohtml fails."""
+    try:
+        res = subprocess.run(
+            ["pdftohtml",
+             "-xml",
+             "-i",      # ignore images
+             "-hidden", # force hidden text extraction
+             "-stdout", # print to stdout
+             pdf_filename],
+            capture_output=True)
+    except OSError as e:
+        _on_error(f"cannot run pdftohtml: {e}")
+        return {}
+    if res.returncode != 0:
+        _on_error("pdftohtml -xml failed.")
+        return {}
+    try:
+        return parse_layout(res.stdout.decode(errors='replace'))
+    except Exception as e:
+        _on_error(f"layout parsing failed: {e}")
+        return {}
@@ -55,7 +55,8 @@ The url `should` be https://doi.org/10.1145/3551349.3556958, not
 https://doi.org/10.1145/3551349.3556958ACM
 
 Given such condition, both urls will be added to output of process_text(), 
-so one of them is INVALID, and there's not much I can do about it.
+so one of them is INVALID. pdf_find_url() resolves this with url_repair.py, 
+which keeps only the best-scoring candidate of each mention.
 """
 
 #
@@ -65,6 +66,10 @@ from bs4 import BeautifulSoup
 import bs4
 import requests
 from urllib.parse import urlparse, urlunparse
+from url_canon import clean_url
+from url_repair import repair_urls
+from paper_sections import tag_file
+from pdf_layout import find_layout
 
 import re
 import html
@@ -214,16 +219,8 @@ def can_access(url: str):
     if len(res) > 1:
         return False
 
-    return True
-
-    # directly accessing the url via internet will be good :)
-
-    try:
-        res = requests.get(url, timeout=5.0)
-        res.raise_for_status()
-        assert res.status_code == 200
-    except:
-        return False
+    # directly accessing the url via internet is done in bulk afterwards,
+    # see link_validator.validate_urls().
     return True
 
 def process_text(text_file: str):
@@ -444,10 +441,14 @@ def find_dataset_in_file(text_file: str):
     del tokens
     return datasets
 
-def pdf_find_url(pdf_file: str) -> dict:
+def pdf_find_url(pdf_file: str, sections: dict = None, layout: dict = None) -> dict:
     """
     Combine the advantages of both process_text and process_pdf, also
     deduplicate the output of them.
+    :param sections: if given, filled with {url: [sections it is mentioned in]},
+      see paper_sections.py.
+    :param layout: if given, filled with {url: page, position and flags}
+      from `pdftohtml -xml`, see pdf_layout.py.
 
     Example Usage:
     >>> pdf_find_url ('paper.pdf')
@@ -472,25 +473,26 @@ def pdf_find_url(pdf_file: str) -> dict:
         _on_error("pdftotext failed.")
         r2 = {}
     
-    ret = {}
-    def normalize_url(url: str) -> str:
-        #
-        # FIXME: should we even do this?
-        #
-        parsed = urlparse(url)
-        # Remove trailing slash from the path if present
-        normalized_path = parsed.path.rstrip('/')
-        # Reconstruct the URL without trailing slash
-        return urlunparse(parsed._replace(path=normalized_path))
-    
+    # process_text() emits both the truncated and the joined form of urls
+    # split across lines; keep only the best candidate of each mention.
+    r2 = repair_urls(r2, anchors=r1.keys())
+
     ret = {}
     _log(f"len(r1) = {len(r1)}, len(r2) = {len(r2)}")
+    # r1 and r2 disagree on trailing slashes and punctuation, merge them
+    # on the cleaned form; see url_canon.py for the full canonicalization.
     for r in [r1, r2]:
         for k in r:
-            if k not in ret:
-                ret[k] = []
-            ret[k] += r[k]
+            url = clean_url(k)
+            if url not in ret:
+                ret[url] = []
+            ret[url] += r[k]
     
+    if sections is not None:
+        sections.update(tag_file(re.sub(r'\.pdf$', r'.txt', pdf_file), ret.keys()))
+    if layout is not None:
+        layout.update(find_layout(pdf_file))
+
     del r1
     del r2
     try:
@@ -0,0 +1,298 @@
+"""
+A small CPU-only classifier that decides the obvious cases among the
+links the rules reject, so that only the uncertain ones go to the LLM.
+
+Features are hashed: host and host labels, path tokens and character
+4-grams of the path, plus word unigrams and bigrams of the (merged)
+context, each in its own namespace. The model is a logistic regression
+trained with full-batch gradient descent; rows are stored CSR-style and
+scored with one vectorized NumPy pass per paper.
+
+A link scoring <= `low` is rejected and one scoring >= `high` accepted
+without an LLM call; everything in between goes to the LLM.
+
+Training data:
+- test/<conf>_llm.json vs test/<conf>.json: links only the LLM run kept
+  are positives (the LLM said YES after the rules said no),
+- paper texts (pdftotext .txt or .pdf): links of a paper of an LLM run
+  that the run did not keep, and that the rules reject, are negatives,
+- a recorded LLM cache (--llm-cache record): every recorded verdict.
+
+Requirements:
+numpy
+
+Example usage:
+>>> model = PreClassifier.load('preclassifier.npz')
+>>> model.decide_many([('https://arxiv.org/abs/2106.09685', 'LoRA [12]'),
+...                    ('https://github.com/x/y', 'our benchmark suite')])
+[False, None]
+>>> print(model.report())
+
+Command line:
+    python preclassifier.py train --papers downloaded_papers/*.pdf odj.txt -o preclassifier.npz
+    python preclassifier.py score preclassifier.npz https://arxiv.org/abs/2106.09685 "LoRA [12]"
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import zlib
+from urllib.parse import urlparse
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from url_canon import canonical_key
+from llm_client import parse_verdict
+from llm_context import merge_contexts
+
+DIMS = 1 << 18
+DEFAULT_LOW = 0.1
+DEFAULT_HIGH = 0.95
+DEFAULT_MODEL_FILE = 'preclassifier.npz'
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+_WORD = re.compile(r'[a-z][a-z0-9\-]+')
+
+
+def features(url: str, context: str) -> list:
+    """:return: the feature strings of a (url, context) pair."""
+    parsed = urlparse(url.lower() if '://' in url else 'https://' + url.lower())
+    host = parsed.netloc[4:] if parsed.netloc.startswith('www.') else parsed.netloc
+    path = parsed.path.rstrip('/') + ('?' + parsed.query if parsed.query else '')
+    ret = ['h:' + host]
+    ret += ['hl:' + label for label in host.split('.')]
+    ret += ['p:' + t for t in _TOKEN.findall(path)]
+    ret += ['pc:' + path[i:i + 4] for i in range(min(len(path) - 3, 80))]
+    ret.append(f'pd:{min(path.count("/"), 6)}')
+    words = _WORD.findall(context.lower())
+    ret += ['c:' + w for w in words]
+    ret += [f'c2:{a} {b}' for a, b in zip(words, words[1:])]
+    return ret
+
+
+def vectorize(pairs: list, dims: int = DIMS):
+    """:return: (indptr, indices, values) of the hashed, L2-normalized rows."""
+    indptr, indices, values = [0], [], []
+    for url, context in pairs:
+        row = sorted({zlib.crc32(f.encode('utf-8')) & (dims - 1) for f in features(url, context)})
+        indices.extend(row)
+        values.extend([1 / len(row) ** 0.5] * len(row))
+        indptr.append(len(indices))
+    return (np.array(indptr, dtype=np.int64), np.array(indices, dtype=np.int64),
+            np.array(values, dtype=np.float32))
+
+
+def _sigmoid(z):
+    return 1 / (1 + np.exp(-np.clip(z, -30, 30)))
+
+
+class PreClassifier:
+
+    def __init__(self, weights, bias: float, low: float = DEFAULT_LOW, high: float = DEFAULT_HIGH):
+        self.weights = weights
+        self.bias = bias
+        self.low = low
+        self.high = high
+        self.dims = len(weights)
+        self.stats = {'auto_no': 0, 'auto_yes': 0, 'to_llm': 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def train(cls, pairs: list, labels: list, epochs: int = 300, lr: float = 2.0,
+              l2: float = 1e-5, dims: int = DIMS, **kwargs) -> 'PreClassifier':
+        """Fit on (url, context) pairs; classes are weighted to be balanced."""
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("numpy is required for the pre-classifier")
+        indptr, indices, values = vectorize(pairs, dims)
+        y = np.array(labels, dtype=np.float32)
+        n = len(y)
+        rows = np.repeat(np.arange(n), np.diff(indptr))
+        pos = max(y.sum(), 1)
+        sample_weight = np.where(y > 0, n / (2 * pos), n / (2 * max(n - pos, 1))).astype(np.float32)
+        w = np.zeros(dims, dtype=np.float32)
+        b = 0.0
+        for _ in range(epochs):
+            z = np.bincount(rows, weights=w[indices] * values, minlength=n) + b
+            err = (_sigmoid(z) - y) * sample_weight
+            grad = np.bincount(indices, weights=err[rows] * values, minlength=dims) / n
+            w -= lr * (grad + l2 * w).astype(np.float32)
+            b -= lr * float(err.mean())
+        return cls(w, b, **kwargs)
+
+    def score_many(self, pairs: list):
+        """:return: probability that each pair is a dataset/benchmark link."""
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        indptr, indices, values = vectorize(pairs, self.dims)
+        rows = np.repeat(np.arange(len(pairs)), np.diff(indptr))
+        z = np.bincount(rows, weights=self.weights[indices] * values, minlength=len(pairs))
+        return _sigmoid(z + self.bias)
+
+    def decide_many(self, pairs: list) -> list:
+        """:return: True/False where the model is confident, None for the LLM."""
+        ret = []
+        for p in self.score_many(pairs):
+            ret.append(False if p <= self.low else True if p >= self.high else None)
+        with self._lock:
+            self.stats['auto_no'] += ret.count(False)
+            self.stats['auto_yes'] += ret.count(True)
+            self.stats['to_llm'] += ret.count(None)
+        return ret
+
+    def decide(self, url: str, context: str):
+        return self.decide_many([(url, context)])[0]
+
+    def report(self) -> str:
+        """:return: how many LLM calls the thresholds saved so far."""
+        s = self.stats
+        total = s['auto_no'] + s['auto_yes'] + s['to_llm']
+        saved = s['auto_no'] + s['auto_yes']
+        rate = saved / total if total else 0.0
+        return (f"{total} links rejected by rules: {s['auto_no']} rejected and {s['auto_yes']} "
+                f"accepted without LLM, {s['to_llm']} sent to LLM; LLM calls reduced by "
+                f"{saved}/{total} ({rate:.1%}) at low={self.low} high={self.high}")
+
+    def save(self, path: str = DEFAULT_MODEL_FILE) -> None:
+        np.savez_compressed(path, weights=self.weights, bias=np.float32(self.bias),
+                            low=np.float32(self.low), high=np.float32(self.high))
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_MODEL_FILE, low: float = None, high: float = None) -> 'PreClassifier':
+        """:param low/high: override the thresholds stored with the model."""
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("numpy is required for the pre-classifier")
+        data = np.load(path)
+        # thresholds are stored as float32, round them back.
+        return cls(data['weights'], float(data['bias']),
+                   low=round(float(data['low']), 6) if low is None else low,
+                   high=round(float(data['high']), 6) if high is None else high)
+
+
+def _paper_urls(path: str) -> dict:
+    """:return: {url: [context, ...]} of a pdftotext .txt or a .pdf file."""
+    if path.endswith('.txt'):
+        from pdf_url import process_text
+        return process_text(path)
+    import PyPDF2
+    from combine import extract_urls_from_text
+    with open(path, 'rb') as fobj:
+        reader = PyPDF2.PdfReader(fobj)
+        text = '\n'.join(page.extract_text() or '' for page in reader.pages)
+    return extract_urls_from_text(text)
+
+
+def build_training_set(test_dir: str = 'test', papers: list = (), llm_cache: str = None):
+    """:return: (pairs, labels) from the sources listed in the module docstring."""
+    from rule_engine import get_rule_engine
+    engine = get_rule_engine()
+    pairs, labels = [], []
+    kept_by_paper = {}
+
+    for llm_file in sorted(glob.glob(os.path.join(test_dir, '*_llm.json'))):
+        rule_file = llm_file[:-len('_llm.json')] + '.json'
+        with open(llm_file, 'r', encoding='utf-8') as fobj:
+            llm_records = json.load(fobj)
+        rule_keys = set()
+        if os.path.exists(rule_file):
+            with open(rule_file, 'r', encoding='utf-8') as fobj:
+                rule_keys = {canonical_key(r['url']) for r in json.load(fobj)}
+        for record in llm_records:
+            key = canonical_key(record['url'])
+            kept_by_paper.setdefault(record.get('paper_id'), set()).add(key)
+            if key not in rule_keys:
+                pairs.append((record['url'], merge_contexts(record['url'], record['contexts'], compress=True)))
+                labels.append(1)
+
+    for path in papers:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        ids = [p for p in kept_by_paper if p and p.startswith(stem)]
+        if len(ids) != 1:
+            print(f"skip {path}: not a paper of an LLM run", file=sys.stderr)
+            continue
+        kept = kept_by_paper[ids[0]]
+        try:
+            paper_urls = _paper_urls(path)
+        except Exception as e:
+            print(f"skip {path}: {e}", file=sys.stderr)
+            continue
+        for url, contexts in paper_urls.items():
+            if canonical_key(url) in kept:
+                continue
+            if any(engine.classify(url, c)[0] for c in contexts):
+                continue
+            pairs.append((url, merge_contexts(url, contexts, compress=True)))
+            labels.append(0)
+
+    if llm_cache:
+        from llm_cache import LLMCache
+        for entry in LLMCache('replay', llm_cache).entries():
+            if 'context' in entry:
+                pairs.append((entry['url'], entry['context']))
+                labels.append(int(parse_verdict(entry['response']) is True))
+    return pairs, labels
+
+
+def evaluate(model: PreClassifier, pairs: list, labels: list) -> str:
+    """:return: accuracy and LLM call reduction of `model` on labelled pairs."""
+    p = model.score_many(pairs)
+    y = np.array(labels)
+    auto_no, auto_yes = p <= model.low, p >= model.high
+    decided = auto_no | auto_yes
+    wrong = (auto_no & (y == 1)) | (auto_yes & (y == 0))
+    return (f"{len(y)} pairs ({int(y.sum())} positive): accuracy at 0.5 "
+            f"{((p >= 0.5) == (y == 1)).mean():.1%}; low={model.low} high={model.high}: "
+            f"{int(auto_no.sum())} auto-rejected, {int(auto_yes.sum())} auto-accepted, "
+            f"LLM calls reduced by {decided.mean():.1%}, "
+            f"{int(wrong.sum())} decided against the LLM label")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-classifier that gates LLM calls')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_train = sub.add_parser('train')
+    p_train.add_argument('--test-dir', default='test')
+    p_train.add_argument('--papers', nargs='*', default=[], help='pdftotext .txt or .pdf files of LLM-run papers')
+    p_train.add_argument('--llm-cache', help='a recorded .cache/llm.sqlite')
+    p_train.add_argument('--low', type=float, default=DEFAULT_LOW)
+    p_train.add_argument('--high', type=float, default=DEFAULT_HIGH)
+    p_train.add_argument('--holdout', type=float, default=0.2, help='fraction kept for evaluation')
+    p_train.add_argument('-o', '--output', default=DEFAULT_MODEL_FILE)
+    p_score = sub.add_parser('score')
+    p_score.add_argument('model')
+    p_score.add_argument('url')
+    p_score.add_argument('context', nargs='?', default='')
+    args = parser.parse_args()
+
+    if args.command == 'score':
+        model = PreClassifier.load(args.model)
+        print(f"{model.score_many([(args.url, args.context)])[0]:.3f}", model.decide(args.url, args.context))
+        return
+
+    pairs, labels = build_training_set(args.test_dir, args.papers, args.llm_cache)
+    if not pairs or len(set(labels)) < 2:
+        print("need both positive and negative examples", file=sys.stderr)
+        sys.exit(1)
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(pairs))
+    n_test = int(len(pairs) * args.holdout)
+    test_idx, train_idx = order[:n_test], order[n_test:]
+    model = PreClassifier.train([pairs[i] for i in train_idx], [labels[i] for i in train_idx],
+                                low=args.low, high=args.high)
+    if n_test:
+        print("holdout:", evaluate(model, [pairs[i] for i in test_idx], [labels[i] for i in test_idx]))
+    # the saved model is fitted on everything.
+    model = PreClassifier.train(pairs, labels, low=args.low, high=args.high)
+    print("train:", evaluate(model, pairs, labels))
+    model.save(args.output)
+    print(f"saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
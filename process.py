@@ -4,12 +4,13 @@ import time
 import re  
 import argparse  
 from typing import List, Dict, Any, Set  
-from urllib.parse import urlparse, quote, quote_plus  
+from urllib.parse import quote, quote_plus  
 import requests  
 import PyPDF2  
 import io  
 import tempfile  
 from pdf_url import can_access
+from rule_engine import get_rule_engine
 from openreview import fetch_paper
 
 from bs4 import BeautifulSoup  
@@ -79,64 +80,9 @@ def extract_urls_from_text(text: str, validate_urls: bool = False) -> Dict[str,
     return result  
 
 
-def is_benchmark_or_dataset_link(url: str, context: str = "") -> bool:  
-    """判断URL是否是数据集或基准测试相关的链接"""  
-    # 解析URL  
-    parsed = urlparse(url)  
-    domain = parsed.netloc.lower()  
-    path = parsed.path.lower()  
-    
-    # 数据集相关域名和路径关键词  
-    dataset_domains = {  
-        'github.com': ['dataset', 'benchmark', 'data', 'corpus', 'evaluation'],  
-        'huggingface.co': ['datasets'],  
-        'kaggle.com': ['datasets'],  
-        'paperswithcode.com': ['datasets', 'benchmarks'],  
-        'tensorflow.org': ['datasets', 'data'],  
-        'pytorch.org': ['data', 'datasets'],  
-        'zenodo.org': [],  # 整个域名都是数据集相关  
-        'figshare.com': [],  
-        'data.mendeley.com': [],  
-        'datadryad.org': [],  
-        'dataverse.harvard.edu': [],  
-        'catalog.ldc.upenn.edu': [],  
-        'archive.ics.uci.edu': []  
-    }  
-    
-    # 检查域名  
-    if domain in dataset_domains:  
-        if not dataset_domains[domain]:  # 空列表表示整个域名都是数据集相关  
-            return True  
-        for keyword in dataset_domains[domain]:  
-            if keyword in path:  
-                return True  
-    
-    # 检查路径中的关键词  
-    dataset_keywords = [  
-        'dataset', 'benchmark', 'corpus', 'data-download',   
-        'download-data', 'data/download', 'download/data',  
-        'evaluate', 'evaluation', 'metrics', 'performance',  
-        'leaderboard', 'competition', 'challenge'  
-    ]  
-    for keyword in dataset_keywords:  
-        if keyword in path:  
-            return True  
-    
-    # 检查上下文中的关键词  
-    context_lower = context.lower()  
-    context_keywords = [  
-        'dataset', 'data set', 'benchmark', 'corpus', 'repository',   
-        'evaluation', 'metric', 'leaderboard', 'test set',  
-        'training data', 'test data', 'evaluation data',  
-        'repository for', 'official implementation', 'code for'  
-    ]  
-    for keyword in context_keywords:  
-        if keyword in context_lower:  
-            # 上下文中包含关键词，并且URL看起来不是博客或主页  
-            if not any(x in path for x in ['blog', 'post', 'article', 'news', 'about']):  
-                return True  
-    
-    return False  
+def is_benchmark_or_dataset_link(url: str, context: str = "") -> bool:
+    """判断URL是否是数据集或基准测试相关的链接（规则见 rules.json，不使用排除规则）"""
+    return get_rule_engine(exclusions=False).classify(url, context)[0]
 
 def extract_benchmark_links_from_paper(pdf_url: str) -> Dict[str, List[str]]:  
     """从论文中提取数据集和基准测试相关链接"""  
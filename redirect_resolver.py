@@ -0,0 +1,153 @@
+"""
+Resolve short links and redirects (doi.org, bit.ly, tinyurl, ...) to the
+url they finally point to, so that classification judges the target
+instead of the surface domain.
+
+Redirect chains are followed hop by hop and every hop is cached on disk,
+so a DOI cited by many papers is resolved once, and chains that share a
+hop stop early.
+
+Requirements:
+aiohttp
+
+Example usage:
+>>> resolve_redirects(['https://doi.org/10.5281/zenodo.3233986', 'https://github.com/a/b'])
+{'https://doi.org/10.5281/zenodo.3233986': 'https://zenodo.org/records/3233986'}
+
+Command line:
+    python redirect_resolver.py https://bit.ly/xyz https://doi.org/10.1145/3551349.3556958
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from urllib.parse import urljoin, urlparse
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+from disk_cache import DiskCache, cache_path
+from link_validator import HEADERS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 30 * 24 * 3600
+MAX_HOPS = 10
+
+# hosts whose urls say nothing about what they point to.
+REDIRECT_HOSTS = {
+    'doi.org', 'dx.doi.org', 'bit.ly', 'tinyurl.com', 't.co', 'goo.gl',
+    'ow.ly', 'is.gd', 'buff.ly', 'rb.gy', 'shorturl.at', 'cutt.ly',
+    'anonymous.4open.science', 'aka.ms', 'git.io', 'hf.co',
+}
+
+# a hop with this value ends the chain.
+_FINAL = ''
+
+
+def is_redirect_candidate(url: str) -> bool:
+    host = urlparse(url if '://' in url else 'https://' + url).netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    return host in REDIRECT_HOSTS
+
+
+async def _next_hop(session, url: str):
+    """:return: the Location of a redirect, _FINAL if `url` is not one, None on error."""
+    for method in ('HEAD', 'GET'):
+        try:
+            async with session.request(method, url, allow_redirects=False) as resp:
+                if resp.status in (301, 302, 303, 307, 308) and 'Location' in resp.headers:
+                    return urljoin(url, resp.headers['Location'])
+                if method == 'HEAD' and resp.status in (403, 405, 501):
+                    continue
+                return _FINAL
+        except Exception as e:
+            logger.debug(f"{method} {url} failed: {e}")
+            continue
+    return None
+
+
+async def _resolve_one(session, url: str, hops: dict, sem: asyncio.Semaphore) -> str:
+    """:return: the final url; `hops` caches url -> next hop."""
+    current = url if '://' in url else 'https://' + url
+    seen = set()
+    for _ in range(MAX_HOPS):
+        if current in seen:
+            break
+        seen.add(current)
+        if current not in hops:
+            async with sem:
+                hop = await _next_hop(session, current)
+            if hop is None:
+                # unreachable, keep what we have but do not cache the failure.
+                break
+            hops[current] = hop
+        if hops[current] == _FINAL:
+            break
+        current = hops[current]
+    return current
+
+
+async def resolve_redirects_async(urls: list, hops: dict, concurrency: int = 32,
+                                  timeout: float = 10.0) -> dict:
+    if not AIOHTTP_AVAILABLE:
+        raise RuntimeError("aiohttp is required to resolve redirects")
+    sem = asyncio.Semaphore(concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(timeout=client_timeout, headers=HEADERS) as session:
+        finals = await asyncio.gather(*(_resolve_one(session, u, hops, sem) for u in urls))
+    return dict(zip(urls, finals))
+
+
+def resolve_redirects(urls: list, cache: DiskCache = None, only_known_hosts: bool = True,
+                      **kwargs) -> dict:
+    """
+    :param only_known_hosts: only resolve urls on REDIRECT_HOSTS.
+    :param kwargs: see resolve_redirects_async().
+    :return: {url: final url} for the urls that redirect somewhere else.
+    """
+    if only_known_hosts:
+        urls = [u for u in urls if is_redirect_candidate(u)]
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+    if cache is None:
+        cache = DiskCache(cache_path('redirects.sqlite'), ttl=DEFAULT_TTL)
+
+    # preload the cached hops of every chain.
+    hops = {}
+    frontier = [u if '://' in u else 'https://' + u for u in urls]
+    while frontier:
+        found = cache.get_many([u for u in frontier if u not in hops])
+        hops.update(found)
+        frontier = [h for h in found.values() if h != _FINAL and h not in hops]
+    known = dict(hops)
+
+    finals = asyncio.run(resolve_redirects_async(urls, hops, **kwargs))
+    cache.set_many({k: v for k, v in hops.items() if known.get(k) != v})
+
+    ret = {}
+    for url, final in finals.items():
+        if final != (url if '://' in url else 'https://' + url):
+            ret[url] = final
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resolve short links and redirects')
+    parser.add_argument('urls', nargs='+')
+    parser.add_argument('--all', action='store_true', help='resolve urls on any host')
+    args = parser.parse_args()
+
+    resolved = resolve_redirects(args.urls, only_known_hosts=not args.all)
+    for url in args.urls:
+        print(url, '->', resolved.get(url, url))
+    print(f"{len(resolved)}/{len(args.urls)} urls redirect", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
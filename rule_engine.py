@@ -0,0 +1,206 @@
+"""
+The rules of combine.is_benchmark_or_dataset_link_rule(), loaded from
+rules.json and compiled once:
+- dataset domains go into a trie over reversed domain labels,
+- every keyword list becomes a KeywordMatcher, pruned of keywords that
+  contain another keyword of the list,
+- urls are split with one precompiled regex instead of urlparse().
+
+classify_many() scores all candidates of a paper in one call and reports
+which rule made each decision. URL-only rules are evaluated once per
+distinct url.
+
+Example usage:
+>>> engine = get_rule_engine()
+>>> engine.classify('https://huggingface.co/datasets/ncbi/pubmed')
+(True, 'domain:huggingface.co/datasets')
+>>> engine.classify_many(['https://arxiv.org/abs/2410.09114', 'https://x.org/'],
+...                      ['a benchmark', 'the dataset is at'])
+[(False, 'exclude:arxiv.org'), (True, 'context:dataset')]
+"""
+import json
+import os
+import re
+import threading
+
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json')
+
+
+# scheme, netloc and path, split the same way as urlparse() does.
+_URL_SPLIT = re.compile(r'^(?:[a-zA-Z][a-zA-Z0-9+.\-]*:)?(?://([^/?#]*))?([^?#]*)')
+
+
+def split_url(url: str):
+    """
+    :return: (lower-case netloc, lower-case path), as urlparse() would give.
+
+    >>> split_url('https://GitHub.com/a/b?x=1')
+    ('github.com', '/a/b')
+    """
+    m = _URL_SPLIT.match(url)
+    netloc, path = m.group(1) or '', m.group(2)
+    # urlparse() moves `;params` of the last segment out of the path.
+    semi = path.find(';', path.rfind('/'))
+    if semi >= 0:
+        path = path[:semi]
+    return netloc.lower(), path.lower()
+
+
+class KeywordMatcher:
+    """
+    Tell whether a text contains any of a list of keywords.
+
+    A keyword that contains another keyword of the list is dropped, since
+    the shorter one matches whenever it does. The rest are tested with
+    `in`: for lists of this size, CPython's substring search beats both a
+    regex alternation and an automaton written in Python.
+    """
+
+    def __init__(self, keywords: list):
+        keywords = list(dict.fromkeys(k.lower() for k in keywords))
+        self.keywords = tuple(k for k in keywords
+                              if not any(o != k and o in k for o in keywords))
+
+    def search(self, text: str):
+        """:return: a keyword contained in `text`, or None."""
+        for keyword in self.keywords:
+            if keyword in text:
+                return keyword
+        return None
+
+    def __bool__(self):
+        return bool(self.keywords)
+
+
+class DomainTrie:
+    """
+    Map domains to values. `example.com` matches only that host;
+    `.example.com` also matches every subdomain of it.
+    """
+
+    _VALUE = '$'
+    _SUFFIX = '*'
+
+    def __init__(self):
+        self._root = {}
+
+    def insert(self, domain: str, value) -> None:
+        suffix = domain.startswith('.')
+        node = self._root
+        for label in reversed(domain.strip('.').lower().split('.')):
+            node = node.setdefault(label, {})
+        node[self._SUFFIX if suffix else self._VALUE] = (domain.strip('.'), value)
+
+    def lookup(self, host: str):
+        """:return: (domain, value) of the best match for `host`, or None."""
+        node = self._root
+        best = None
+        labels = list(reversed(host.lower().split('.')))
+        for i, label in enumerate(labels):
+            node = node.get(label)
+            if node is None:
+                return best
+            if i < len(labels) - 1 and self._SUFFIX in node:
+                best = node[self._SUFFIX]
+        return node.get(self._VALUE) or node.get(self._SUFFIX) or best
+
+
+class RuleEngine:
+
+    def __init__(self, config: dict, exclusions: bool = True):
+        """
+        :param config: the content of rules.json.
+        :param exclusions: apply `exclusion_patterns`; process.py runs without them.
+        """
+        self.exclusions = KeywordMatcher(config.get('exclusion_patterns', []) if exclusions else [])
+        self.domains = DomainTrie()
+        for domain, keywords in config.get('dataset_domains', {}).items():
+            self.domains.insert(domain, KeywordMatcher(keywords))
+        self.path_keywords = KeywordMatcher(config.get('path_keywords', []))
+        self.context_keywords = KeywordMatcher(config.get('context_keywords', []))
+        self.context_path_blocklist = KeywordMatcher(config.get('context_path_blocklist', []))
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_RULES_FILE, **kwargs) -> 'RuleEngine':
+        with open(path, 'r', encoding='utf-8') as fobj:
+            return cls(json.load(fobj), **kwargs)
+
+    def classify_url(self, url: str):
+        """
+        Evaluate the rules that only look at the url.
+        :return: (True/False, rule) when the url alone decides, otherwise
+          (None, path), where path is what the context rules need.
+        """
+        domain, path = split_url(url)
+
+        # 排除明显不是数据集的域名和路径
+        pattern = self.exclusions.search(domain) or self.exclusions.search(path)
+        if pattern:
+            return False, 'exclude:' + pattern
+
+        # 检查域名
+        entry = self.domains.lookup(domain)
+        if entry is not None:
+            name, keywords = entry
+            if not keywords:  # 空列表表示整个域名都是数据集相关
+                return True, 'domain:' + name
+            keyword = keywords.search(path)
+            if keyword:
+                return True, f'domain:{name}/{keyword}'
+
+        # 检查路径中的关键词
+        keyword = self.path_keywords.search(path)
+        if keyword:
+            return True, 'path:' + keyword
+        return None, path
+
+    def classify_context(self, path: str, context: str):
+        """:return: (True/False, rule) from the context rules."""
+        keyword = self.context_keywords.search(context.lower())
+        # 上下文中包含关键词，并且URL看起来不是博客或主页
+        if keyword and not self.context_path_blocklist.search(path):
+            return True, 'context:' + keyword
+        return False, None
+
+    def classify(self, url: str, context: str = ""):
+        """:return: (is dataset/benchmark link, rule that decided or None)"""
+        decision, rule = self.classify_url(url)
+        if decision is not None:
+            return decision, rule
+        return self.classify_context(rule, context)
+
+    def classify_many(self, urls: list, contexts: list = None) -> list:
+        """
+        :param contexts: one context per url, may be None.
+        :return: [(is dataset/benchmark link, rule), ...] in the order of `urls`.
+        """
+        if contexts is None:
+            contexts = [""] * len(urls)
+        url_results = {}
+        ret = []
+        for url, context in zip(urls, contexts):
+            result = url_results.get(url)
+            if result is None:
+                result = url_results[url] = self.classify_url(url)
+            decision, rule = result
+            if decision is None:
+                ret.append(self.classify_context(rule, context or ""))
+            else:
+                ret.append(result)
+        return ret
+
+
+_engines = {}
+_lock = threading.Lock()
+
+
+def get_rule_engine(path: str = DEFAULT_RULES_FILE, exclusions: bool = True) -> RuleEngine:
+    """:return: the engine compiled from `path`, built once per process."""
+    key = (path, exclusions)
+    engine = _engines.get(key)
+    if engine is None:
+        with _lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = _engines[key] = RuleEngine.load(path, exclusions=exclusions)
+    return engine
@@ -0,0 +1,180 @@
+"""
+Resolve dataset names to urls for a whole run at once.
+
+Names are first looked up in the offline knowledge base (dataset_kb.py);
+only the remaining ones are searched on bing. Queries are deduplicated
+across the run, cached on disk with a time-to-live, and executed as a
+batch through one reused browser session or through plain http requests.
+
+Example usage:
+>>> resolver = SearchResolver(kb=DatasetKB.load())
+>>> resolver.resolve_many(['ADE20K', 'Cityscapes', 'ADE-20K'])
+{'ADE20K': ['https://github.com/CSAILVision/ADE20K', ...], ...}
+>>> resolver.close()
+
+Command line (find dataset names in pdftotext outputs and resolve them):
+    python search_resolver.py paper1.txt paper2.txt --kb dataset_kb.json
+    python search_resolver.py --names ADE20K Cityscapes --base-url http://127.0.0.1:8765/
+"""
+import argparse
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bing import BING_URL, bing_search, bing_search_http, new_browser
+from dataset_kb import DEFAULT_KB_FILE, DatasetKB, normalize_name
+from disk_cache import DiskCache, cache_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 14 * 24 * 3600
+
+
+class SearchResolver:
+
+    def __init__(self, kb: DatasetKB = None, cache: DiskCache = None,
+                 mode: str = 'http', base_url: str = BING_URL,
+                 ttl: float = DEFAULT_TTL, workers: int = 4,
+                 query_suffix: str = ' dataset -csdn'):
+        """
+        :param mode: 'http' for plain requests, 'browser' for one reused firefox.
+        :param base_url: the search engine, point it at stub_server.py for tests.
+        """
+        if mode not in ('http', 'browser'):
+            raise ValueError(f"unknown search mode: {mode}")
+        self.kb = kb
+        self.cache = cache if cache is not None else DiskCache(cache_path('search.sqlite'), ttl=ttl)
+        self.mode = mode
+        self.base_url = base_url
+        self.workers = workers
+        self.query_suffix = query_suffix
+        self.stats = {'kb': 0, 'memo': 0, 'cache': 0, 'searched': 0, 'failed': 0}
+        # normalized name -> urls, shared by all lookups of this run.
+        self._memo = {}
+        # one session for all http workers, created before any of them runs.
+        self._session = requests.Session() if mode == 'http' else None
+        self._browser = None
+
+    def query_for(self, name: str) -> str:
+        return name.strip() + self.query_suffix
+
+    def _search_http(self, query: str) -> list:
+        return bing_search_http(query, session=self._session, base_url=self.base_url)
+
+    def _search_browser(self, query: str) -> list:
+        if self._browser is None:
+            self._browser = new_browser()
+        return bing_search(query, browser=self._browser, base_url=self.base_url)
+
+    def _search_batch(self, queries: list) -> dict:
+        ret = {}
+
+        def run(query):
+            try:
+                if self.mode == 'http':
+                    return query, self._search_http(query)
+                return query, self._search_browser(query)
+            except Exception as e:
+                logger.warning(f"search failed for {query!r}: {e}")
+                return query, None
+
+        if self.mode == 'http' and self._session is None:
+            # reopened after close().
+            self._session = requests.Session()
+        if self.mode == 'http' and self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                results = list(pool.map(run, queries))
+        else:
+            # a browser can only run one query at a time.
+            results = [run(q) for q in queries]
+
+        for query, urls in results:
+            if urls is None:
+                self.stats['failed'] += 1
+            else:
+                self.stats['searched'] += 1
+                ret[query] = urls
+        return ret
+
+    def resolve_many(self, names: list) -> dict:
+        """:return: {name: [url, ...]}, best first; empty list if nothing found."""
+        ret = {}
+        pending = {}    # normalized name -> query
+        for name in names:
+            key = normalize_name(name)
+            if key in self._memo:
+                self.stats['memo'] += 1
+                ret[name] = self._memo[key]
+                continue
+            if self.kb is not None:
+                urls = self.kb.lookup(name)
+                if urls:
+                    self.stats['kb'] += 1
+                    self._memo[key] = ret[name] = urls
+                    continue
+            if key not in pending:
+                pending[key] = self.query_for(name)
+
+        cached = self.cache.get_many(set(pending.values()))
+        self.stats['cache'] += len(cached)
+        missing = [q for q in dict.fromkeys(pending.values()) if q not in cached]
+        if missing:
+            logger.info(f"searching {len(missing)} queries, {len(cached)} cached")
+            found = self._search_batch(missing)
+            self.cache.set_many(found)
+            cached.update(found)
+
+        for key, query in pending.items():
+            if query in cached:
+                self._memo[key] = cached[query]
+        for name in names:
+            if name not in ret:
+                ret[name] = self._memo.get(normalize_name(name), [])
+        return ret
+
+    def resolve(self, name: str) -> list:
+        return self.resolve_many([name])[name]
+
+    def close(self) -> None:
+        if self._browser is not None:
+            self._browser.quit()
+            self._browser = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resolve dataset names to urls')
+    parser.add_argument('text_files', nargs='*', help='pdftotext outputs to find dataset names in')
+    parser.add_argument('--names', nargs='*', default=[], help='dataset names to resolve')
+    parser.add_argument('--kb', default=DEFAULT_KB_FILE, help='knowledge base built by dataset_kb.py')
+    parser.add_argument('--mode', choices=['http', 'browser'], default='http')
+    parser.add_argument('--base-url', default=BING_URL)
+    parser.add_argument('--ttl', type=float, default=DEFAULT_TTL, help='cache ttl in seconds')
+    args = parser.parse_args()
+
+    names = list(args.names)
+    if args.text_files:
+        from pdf_url import find_dataset_in_file
+        for text_file in args.text_files:
+            names += list(find_dataset_in_file(text_file))
+
+    cache = DiskCache(cache_path('search.sqlite'), ttl=args.ttl)
+    with SearchResolver(kb=DatasetKB.load(args.kb), cache=cache, mode=args.mode,
+                        base_url=args.base_url) as resolver:
+        for name, urls in resolver.resolve_many(names).items():
+            print(name, '->', urls[:3])
+        print(resolver.stats, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
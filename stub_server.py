@@ -0,0 +1,427 @@
+"""
+Local stand-ins for the external services used by the pipeline, so that
+the network-facing parts can be tried out offline.
+
+Currently served:
+  GET /                  a search page with the same form ids as bing.com
+  GET /search?q=...      a result page; results are derived from the query
+  GET|HEAD /status/<code>   answers with that status
+  GET|HEAD /redirect?to=<url>  a 302 redirect
+  GET /nohead            200 for GET, 405 for HEAD
+  POST /v1/completions, /v1/chat/completions
+                         an OpenAI-compatible LLM; answers YES for urls that
+                         look like datasets, and a JSON verdict array for
+                         batch prompts. --fail-429-every and --llm-latency
+                         simulate rate limits and slow responses,
+                         --llm-slow-every a slow tail. With
+                         `logprobs` the first token carries a confidence
+                         that is low for urls that only hint at data.
+                         Prompts that ask for a reason get one after the
+                         label, max_tokens cuts the answer, `stream` sends
+                         it as server-sent events and --llm-token-latency
+                         makes each generated token take time.
+  POST /v1/files, GET /v1/files/<id>/content
+  POST /v1/batches, GET /v1/batches/<id>
+                         an OpenAI-compatible batch service: the uploaded
+                         JSONL requests are answered like the completion
+                         endpoints, --batch-delay seconds after submission.
+
+Example usage:
+>>> server, base_url = start_stub_server()
+>>> from bing import bing_search_http
+>>> bing_search_http('ade20k dataset', base_url=base_url)
+['https://github.com/stub/ade20k', 'https://huggingface.co/datasets/stub/ade20k', ...]
+>>> server.shutdown()
+
+Command line:
+    python stub_server.py --port 8765
+"""
+import argparse
+import email.parser
+import email.policy
+import html
+import json
+import math
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def _slug(query: str) -> str:
+    words = [w for w in re.split(r'\W+', query.lower())
+             if w and w not in ('dataset', 'benchmark', 'csdn')]
+    return '-'.join(words) or 'empty'
+
+
+_URL = re.compile(r'https?://[^\s"\'<>]+')
+# items of a batch prompt, see combine.prompt_batch.
+_BATCH_ITEM = re.compile(r'"id":\s*(\d+),\s*"url":\s*"([^"]+)"')
+
+
+def llm_verdict(url: str) -> str:
+    """:return: 'YES' if `url` looks like a dataset or benchmark link."""
+    url = url.lower()
+    return 'YES' if any(k in url for k in ('dataset', 'benchmark', 'data', 'corpus', 'zenodo')) else 'NO'
+
+
+def llm_confidence(url: str) -> float:
+    """:return: how sure the stub model is of llm_verdict(url)."""
+    url = url.lower()
+    if any(k in url for k in ('dataset', 'benchmark', 'corpus', 'zenodo')):
+        return 0.97
+    if 'data' in url or 'github.com' in url:
+        # a bare 'data' or a code repository could go either way.
+        return 0.6
+    return 0.95
+
+
+REASON = '理由：从上下文看，这个链接指向论文使用或发布的资源，判断依据是链接所在句子的描述和链接的域名与路径。'
+# one token is about 4 ASCII characters or one other character.
+_TOKEN = re.compile(r'[\x00-\x7f]{1,4}|[^\x00-\x7f]')
+
+
+def llm_answer(prompt: str) -> str:
+    """:return: what the stub model says to `prompt`."""
+    items = _BATCH_ITEM.findall(prompt)
+    if items:
+        return json.dumps([{'id': int(i), 'verdict': llm_verdict(u)} for i, u in items])
+    m = _URL.search(prompt)
+    verdict = llm_verdict(m.group(0)) if m else 'NO'
+    if '"verdict"' in prompt:
+        return json.dumps({'verdict': verdict})
+    if '理由' in prompt or 'explain' in prompt.lower():
+        return f"{verdict}. {REASON}"
+    return verdict
+
+
+def llm_completion(payload: dict, chat: bool) -> tuple:
+    """:return: (prompt, answer tokens, logprobs or None, finish_reason) for a completion request."""
+    if chat:
+        prompt = '\n'.join(m.get('content') or '' for m in payload.get('messages', []))
+    else:
+        prompt = payload.get('prompt', '')
+    tokens = _TOKEN.findall(llm_answer(prompt))
+    finish_reason = 'stop'
+    if payload.get('max_tokens') and len(tokens) > payload['max_tokens']:
+        tokens, finish_reason = tokens[:payload['max_tokens']], 'length'
+    logprobs = None
+    m = _URL.search(prompt)
+    if payload.get('logprobs') and m and tokens and not tokens[0].startswith('['):
+        logprob = math.log(llm_confidence(m.group(0)))
+        if chat:
+            logprobs = {'content': [{'token': tokens[0], 'logprob': logprob, 'top_logprobs': []}]}
+        else:
+            logprobs = {'tokens': tokens[:1], 'token_logprobs': [logprob], 'top_logprobs': [None]}
+    return prompt, tokens, logprobs, finish_reason
+
+
+def completion_body(payload: dict, chat: bool, request_id: str) -> dict:
+    """:return: the non-streamed response to a completion request."""
+    prompt, tokens, logprobs, finish_reason = llm_completion(payload, chat)
+    choice = {'index': 0, 'finish_reason': finish_reason}
+    if chat:
+        choice['message'] = {'role': 'assistant', 'content': ''.join(tokens)}
+    else:
+        choice['text'] = ''.join(tokens)
+    if logprobs:
+        choice['logprobs'] = logprobs
+    prompt_tokens, completion_tokens = len(prompt) // 4 + 1, len(tokens)
+    return {
+        'id': request_id,
+        'object': 'chat.completion' if chat else 'text_completion',
+        'model': payload.get('model', 'stub'),
+        'choices': [choice],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'total_tokens': prompt_tokens + completion_tokens},
+    }
+
+
+def run_batch(requests_jsonl: bytes) -> bytes:
+    """:return: the output file of a batch, one result per request line."""
+    results = []
+    for i, line in enumerate(requests_jsonl.decode('utf-8').splitlines()):
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        chat = request.get('url', '').endswith('/chat/completions')
+        results.append({'id': f'batch_req_{i}', 'custom_id': request.get('custom_id'), 'error': None,
+                        'response': {'status_code': 200, 'request_id': f'stub-batch-{i}',
+                                     'body': completion_body(request.get('body') or {}, chat, f'stub-batch-{i}')}})
+    return ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in results).encode('utf-8')
+
+
+def search_results(query: str) -> list:
+    """:return: the fake result urls for `query`."""
+    slug = _slug(query)
+    return [
+        f"https://github.com/stub/{slug}",
+        f"https://huggingface.co/datasets/stub/{slug}",
+        f"https://paperswithcode.com/dataset/{slug}",
+    ]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    # keep the console quiet, use --verbose to see requests.
+    verbose = False
+    # answer every n-th LLM request with 429, 0 never.
+    fail_429_every = 0
+    # seconds each LLM request takes.
+    llm_latency = 0.0
+    # seconds each generated token takes.
+    llm_token_latency = 0.0
+    # every n-th LLM request takes llm_slow_latency seconds, 0 never.
+    llm_slow_every = 0
+    llm_slow_latency = 0.0
+    llm_requests = 0
+    _counter_lock = threading.Lock()
+    # seconds a batch stays in progress after it is submitted.
+    batch_delay = 0.0
+    files = {}
+    batches = {}
+
+    def log_message(self, fmt, *args):
+        if self.verbose:
+            super().log_message(fmt, *args)
+
+    def _send(self, code: int, body, content_type: str = 'application/json'):
+        if not isinstance(body, (bytes, str)):
+            body = json.dumps(body, ensure_ascii=False)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        try:
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up, e.g. a hedged request whose copy answered first.
+            pass
+
+    def _redirect(self, location: str):
+        self.send_response(302)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_HEAD(self):
+        parsed = urlparse(self.path)
+        if parsed.path.startswith('/status/'):
+            code = int(parsed.path.rsplit('/', 1)[1])
+            self.send_response(code)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif parsed.path == '/redirect':
+            self._redirect(parse_qs(parsed.query).get('to', ['/'])[0])
+        elif parsed.path == '/nohead':
+            self.send_response(405)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+        if parsed.path == '/v1/files':
+            self._upload(raw)
+            return
+        try:
+            payload = json.loads(raw or b'{}')
+        except ValueError:
+            self._send(400, {'error': {'message': 'invalid json'}})
+            return
+        if parsed.path in ('/v1/completions', '/v1/chat/completions'):
+            self._completion(payload, chat=parsed.path.endswith('/chat/completions'))
+        elif parsed.path == '/v1/batches':
+            self._create_batch(payload)
+        else:
+            self._send(404, {'error': {'message': 'not found'}})
+
+    def _upload(self, raw: bytes):
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode() + raw)
+        fields = {part.get_param('name', header='content-disposition'): part
+                  for part in message.iter_parts()}
+        if 'file' not in fields:
+            self._send(400, {'error': {'message': 'no file'}})
+            return
+        cls = type(self)
+        with cls._counter_lock:
+            file_id = f'file-{len(cls.files) + 1}'
+            content = fields['file'].get_payload(decode=True)
+            cls.files[file_id] = content
+        purpose = fields['purpose'].get_content().strip() if 'purpose' in fields else 'batch'
+        self._send(200, {'id': file_id, 'object': 'file', 'bytes': len(content), 'purpose': purpose,
+                         'filename': fields['file'].get_filename(), 'created_at': int(time.time())})
+
+    def _create_batch(self, payload: dict):
+        cls = type(self)
+        if payload.get('input_file_id') not in cls.files:
+            self._send(400, {'error': {'message': 'unknown input_file_id'}})
+            return
+        total = sum(1 for line in cls.files[payload['input_file_id']].splitlines() if line.strip())
+        with cls._counter_lock:
+            batch_id = f'batch_{len(cls.batches) + 1}'
+            cls.batches[batch_id] = {
+                'id': batch_id, 'object': 'batch', 'endpoint': payload.get('endpoint'),
+                'input_file_id': payload['input_file_id'], 'completion_window': payload.get('completion_window'),
+                'status': 'in_progress', 'output_file_id': None, 'created_at': int(time.time()),
+                'request_counts': {'total': total, 'completed': 0, 'failed': 0},
+                '_due': time.time() + cls.batch_delay}
+        self._send(200, self._batch(batch_id))
+
+    def _batch(self, batch_id: str) -> dict:
+        """:return: the public fields of a batch, running it once it is due."""
+        cls = type(self)
+        with cls._counter_lock:
+            batch = cls.batches[batch_id]
+            if batch['status'] == 'in_progress' and time.time() >= batch['_due']:
+                output = run_batch(cls.files[batch['input_file_id']])
+                file_id = f'file-{len(cls.files) + 1}'
+                cls.files[file_id] = output
+                batch.update(status='completed', output_file_id=file_id, completed_at=int(time.time()))
+                batch['request_counts']['completed'] = batch['request_counts']['total']
+            return {k: v for k, v in batch.items() if not k.startswith('_')}
+
+    def _completion(self, payload: dict, chat: bool):
+        cls = type(self)
+        with cls._counter_lock:
+            cls.llm_requests += 1
+            n = cls.llm_requests
+        if cls.fail_429_every and n % cls.fail_429_every == 0:
+            body = json.dumps({'error': {'message': 'Rate limit reached', 'type': 'requests'}}).encode()
+            self.send_response(429)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Retry-After', '1')
+            self.send_header('retry-after-ms', '200')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if cls.llm_latency:
+            time.sleep(cls.llm_latency)
+        if cls.llm_slow_every and n % cls.llm_slow_every == 0:
+            time.sleep(cls.llm_slow_latency)
+
+        if payload.get('stream'):
+            _, tokens, logprobs, finish_reason = llm_completion(payload, chat)
+            self._stream(tokens, logprobs, chat, finish_reason)
+            return
+        body = completion_body(payload, chat, f'stub-{n}')
+        if cls.llm_token_latency:
+            time.sleep(cls.llm_token_latency * body['usage']['completion_tokens'])
+        self._send(200, body)
+
+    def _stream(self, tokens: list, logprobs: dict, chat: bool, finish_reason: str):
+        """Send the answer token by token as server-sent events, until the client hangs up."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for i, token in enumerate(tokens + [None]):
+                choice = {'index': 0, 'finish_reason': None if token is not None else finish_reason}
+                if chat:
+                    choice['delta'] = {'content': token} if token is not None else {}
+                else:
+                    choice['text'] = token or ''
+                if i == 0 and logprobs:
+                    choice['logprobs'] = logprobs
+                self.wfile.write(b'data: ' + json.dumps({'choices': [choice]}, ensure_ascii=False).encode() + b'\n\n')
+                self.wfile.flush()
+                if token is not None and self.llm_token_latency:
+                    time.sleep(self.llm_token_latency)
+            self.wfile.write(b'data: [DONE]\n\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # the client stopped reading once it had what it needed.
+            pass
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path.startswith('/status/'):
+            code = int(parsed.path.rsplit('/', 1)[1])
+            self._send(code, {'status': code})
+        elif parsed.path == '/redirect':
+            self._redirect(parse_qs(parsed.query).get('to', ['/'])[0])
+        elif parsed.path == '/nohead':
+            self._send(200, 'x' * 100000, 'text/plain')
+        elif parsed.path == '/':
+            self._send(200, SEARCH_PAGE, 'text/html; charset=utf-8')
+        elif parsed.path == '/search':
+            query = parse_qs(parsed.query).get('q', [''])[0]
+            self._send(200, render_results(query), 'text/html; charset=utf-8')
+        elif parsed.path.startswith('/v1/batches/') and parsed.path.rsplit('/', 1)[1] in self.batches:
+            self._send(200, self._batch(parsed.path.rsplit('/', 1)[1]))
+        elif re.fullmatch(r'/v1/files/[^/]+/content', parsed.path) and parsed.path.split('/')[3] in self.files:
+            self._send(200, self.files[parsed.path.split('/')[3]], 'application/jsonl')
+        else:
+            self._send(404, {'error': 'not found'})
+
+
+SEARCH_PAGE = """<html><body>
+<form action="/search" method="get"><input id="sb_form_q" name="q"></form>
+</body></html>"""
+
+
+def render_results(query: str) -> str:
+    items = ''.join(f'<li class="b_algo"><h2><a href="{html.escape(u)}">{html.escape(u)}</a></h2></li>'
+                    for u in search_results(query))
+    return (f"<html><body><a href=\"/\">home</a>"
+            f"<ol id=\"b_results\">{items}</ol></body></html>")
+
+
+def start_stub_server(host: str = '127.0.0.1', port: int = 0):
+    """
+    Serve in a background thread.
+    :return: (server, base_url); call server.shutdown() when done.
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-ins for external services')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--fail-429-every', type=int, default=0,
+                        help='answer every n-th LLM request with 429')
+    parser.add_argument('--llm-latency', type=float, default=0.0,
+                        help='seconds each LLM request takes')
+    parser.add_argument('--llm-token-latency', type=float, default=0.0,
+                        help='seconds each generated token takes')
+    parser.add_argument('--llm-slow-every', type=int, default=0,
+                        help='make every n-th LLM request slow')
+    parser.add_argument('--llm-slow-latency', type=float, default=5.0,
+                        help='seconds a slow LLM request takes')
+    parser.add_argument('--batch-delay', type=float, default=0.0,
+                        help='seconds a batch job stays in progress')
+    args = parser.parse_args()
+
+    StubHandler.verbose = args.verbose
+    StubHandler.fail_429_every = args.fail_429_every
+    StubHandler.llm_latency = args.llm_latency
+    StubHandler.llm_token_latency = args.llm_token_latency
+    StubHandler.llm_slow_every = args.llm_slow_every
+    StubHandler.llm_slow_latency = args.llm_slow_latency
+    StubHandler.batch_delay = args.batch_delay
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"serving on http://{args.host}:{args.port}/", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Map extracted urls to canonical keys, so that variants of one link
+(http vs https, `www.`, trailing slashes and punctuation, arXiv abs/pdf
+pairs, sub-paths of one GitHub / HuggingFace repository, ...) are
+classified and deduplicated once, while the original forms are kept.
+
+Example usage:
+>>> canonical_key('http://www.arxiv.org/pdf/2410.09114v2.pdf')
+'arxiv.org/abs/2410.09114'
+>>> canonical_key('https://github.com/THU-KEG/RM-Bench/tree/main/data')
+'github.com/thu-keg/rm-bench'
+>>> group_urls({'https://github.com/a/b/': ['ctx 1'], 'github.com/a/b.git': ['ctx 2']})
+{'github.com/a/b': {'url': 'https://github.com/a/b/', 'variants': [...], 'contexts': ['ctx 1', 'ctx 2']}}
+"""
+import re
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+# characters pdftotext leaves at the end of a url that are never part of it.
+_TRAILING_PUNCT = '.,;:!?\'")]}>'
+
+_TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid')
+
+_ARXIV_ID = re.compile(r'^/(?:abs|pdf|html)/([a-z\-]+/\d{7}|\d{4}\.\d{4,5})(?:v\d+)?(?:\.pdf)?/?$')
+
+
+def clean_url(url: str) -> str:
+    """
+    Strip what pdf extraction leaves around a url: whitespace,
+    trailing punctuation and trailing slashes.
+
+    >>> clean_url('https://github.com/EngineeringSoftware/jattack/).')
+    'https://github.com/EngineeringSoftware/jattack'
+    """
+    url = url.strip()
+    while url:
+        ch = url[-1]
+        if ch == '/' or (ch in _TRAILING_PUNCT and ch != ')'):
+            url = url[:-1]
+        elif ch == ')' and url.count('(') < url.count(')'):
+            # keep balanced parentheses, e.g. wikipedia links.
+            url = url[:-1]
+        else:
+            break
+    return url
+
+
+def canonical_key(url: str) -> str:
+    """
+    :return: a scheme-less key; urls with the same key point to the same resource.
+    """
+    url = clean_url(url)
+    parsed = urlparse(url if re.match(r'^[a-zA-Z][a-zA-Z0-9+.\-]*://', url) else 'https://' + url)
+
+    host = parsed.netloc.lower()
+    if '@' in host:
+        host = host.rsplit('@', 1)[1]
+    if host.endswith(':80') or host.endswith(':443'):
+        host = host.rsplit(':', 1)[0]
+    if host.startswith('www.'):
+        host = host[4:]
+
+    path = re.sub(r'/{2,}', '/', parsed.path).rstrip('/')
+    query = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+             if not k.lower().startswith(_TRACKING_PARAMS)]
+
+    if host in ('arxiv.org', 'export.arxiv.org'):
+        m = _ARXIV_ID.match(path + '/')
+        if m:
+            return 'arxiv.org/abs/' + m.group(1)
+        host = 'arxiv.org'
+    elif host in ('doi.org', 'dx.doi.org'):
+        # DOIs are case-insensitive.
+        return 'doi.org' + path.lower()
+    elif host == 'github.com':
+        parts = path.split('/')[1:]
+        if len(parts) >= 2 and parts[0]:
+            repo = re.sub(r'\.git$', '', parts[1])
+            # github.com/owner/repo/<anything> is still that repository.
+            return f"github.com/{parts[0]}/{repo}".lower()
+        path = path.lower()
+    elif host == 'huggingface.co':
+        parts = path.split('/')[1:]
+        if len(parts) >= 3 and parts[0] in ('datasets', 'spaces'):
+            return f"huggingface.co/{parts[0]}/{parts[1]}/{parts[2]}"
+        if len(parts) >= 2 and parts[0] not in ('datasets', 'spaces', 'docs', 'papers'):
+            return f"huggingface.co/{parts[0]}/{parts[1]}"
+
+    key = host + path
+    if query:
+        key += '?' + urlencode(sorted(query))
+    return key
+
+
+def _preference(url: str, n_contexts: int, redirects: dict):
+    # prefer redirect targets over short links, then complete urls, then https,
+    # then the most cited form, then the shortest.
+    has_scheme = '://' in url
+    return (url in redirects, not has_scheme, not url.startswith('https://'), -n_contexts, len(url))
+
+
+def group_urls(url_contexts: dict, redirects: dict = None) -> dict:
+    """
+    :param url_contexts: {url: [context, ...]}, e.g. the output of pdf_find_url().
+    :param redirects: {url: final url} from redirect_resolver.resolve_redirects();
+      such urls are grouped by their target, which becomes a variant too.
+    :return: {canonical key: {"url": preferred original form,
+                              "variants": all original forms,
+                              "contexts": deduplicated contexts of all forms}}
+    """
+    redirects = redirects or {}
+    groups = {}
+    for url, contexts in url_contexts.items():
+        target = redirects.get(url)
+        key = canonical_key(target or url)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {'url': url, 'variants': [], 'contexts': [], '_n': {}}
+        for form in [url, target] if target else [url]:
+            if form not in group['variants']:
+                group['variants'].append(form)
+            group['_n'][form] = group['_n'].get(form, 0) + len(contexts)
+        for ctx in contexts:
+            if ctx not in group['contexts']:
+                group['contexts'].append(ctx)
+
+    for group in groups.values():
+        n = group.pop('_n')
+        group['url'] = min(group['variants'], key=lambda u: _preference(u, n[u], redirects))
+    return groups
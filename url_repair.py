@@ -0,0 +1,234 @@
+"""
+Repair urls that process_text() broke while joining or splitting lines.
+
+pdftotext sometimes puts a url across two lines, and process_text() then
+emits both the truncated and the joined form of the same mention, e.g.
+
+    https://doi.org/10.1145/3551349.3556958      (correct)
+    https://doi.org/10.1145/3551349.3556958ACM   (joined with "ACM Reference Format")
+
+    https://github.com/EngineeringSoftware/      (truncated)
+    https://github.com/EngineeringSoftware/jattack  (correct)
+
+For every suspicious url this module generates the plausible join/split
+candidates and scores them with cheap, offline signals only:
+- presence among the `pdftohtml` anchors (always correct, see process_pdf()),
+- whether the path looks complete for well-known hosts,
+- whether the url is already in the known-url store (dataset_kb.py),
+- where the line break happened (after a `/` or `-`, the url continues).
+Two extracted urls are only taken for the same mention when the shorter
+one ends exactly at a line break of their context and the longer one goes
+on with the next line, or when the longer one is the shorter one with a
+word glued to it. Only the best candidate of each mention goes forward,
+but a url among the anchors or with a complete path for its host (and
+not just a complete url joined with the next line) is never dropped.
+
+Example usage:
+>>> repair_urls({'https://doi.org/10.1145/3551349.3556958': ['ctx'],
+...              'https://doi.org/10.1145/3551349.3556958ACM': ['ctx']})
+{'https://doi.org/10.1145/3551349.3556958': ['ctx']}
+"""
+import re
+from urllib.parse import urlparse
+
+from url_canon import canonical_key
+
+# a capitalized word glued to the end of a url, e.g. `.../2409.07703.Yuhang`,
+# `.../3556958ACM`, `huggingface.co/Skywork.Jiawei`.
+_GLUED_SUFFIX = re.compile(r'(?:(?<=\d)\.?(?:[A-Z][a-z]+|[A-Z]{2,})|(?<=[a-z0-9])\.[A-Z][a-z]+)$')
+
+# a line break right after one of these means the url goes on.
+_CONTINUATION_CHARS = '/-_.=?&#:~'
+
+# complete paths (plus query) of well-known hosts.
+_HOST_PATTERNS = {
+    'arxiv.org': re.compile(r'^/(?:abs|pdf|html)/(?:\d{4}\.\d{4,5}|[a-z\-]+/\d{7})(?:v\d+)?(?:\.pdf)?/?$'),
+    'doi.org': re.compile(r'^/10\.\d{4,9}/\S+$'),
+    'dx.doi.org': re.compile(r'^/10\.\d{4,9}/\S+$'),
+    'github.com': re.compile(r'^/[A-Za-z0-9\-]+/[A-Za-z0-9_.\-]+(?:/.*)?$'),
+    'huggingface.co': re.compile(r'^/(?:(?:datasets|spaces)/[^/]+/[^/]+|(?!datasets/|spaces/)[^/]+/[^/]+)(?:/.*)?$'),
+    'api.semanticscholar.org': re.compile(r'^/CorpusID:\d+$'),
+    'aclanthology.org': re.compile(r'^/[A-Za-z0-9.\-]*\d(?:\.pdf)?/?$'),
+    'aclweb.org': re.compile(r'^/anthology/[A-Z]\d{2}-\d{4}(?:\.pdf)?/?$'),
+    'openreview.net': re.compile(r'^/(?:forum|pdf)\?id=[A-Za-z0-9_\-]+$'),
+}
+
+_known_keys = None
+
+
+def known_url_keys() -> set:
+    """:return: canonical keys of the urls in the known-url store."""
+    global _known_keys
+    if _known_keys is None:
+        from dataset_kb import DatasetKB
+        _known_keys = set()
+        for entry in DatasetKB.load().entries.values():
+            _known_keys.update(canonical_key(u) for u in entry['urls'])
+    return _known_keys
+
+
+def is_glued(url: str) -> bool:
+    return _GLUED_SUFFIX.search(url) is not None
+
+
+def strip_glued(url: str) -> str:
+    return _GLUED_SUFFIX.sub('', url)
+
+
+def split_schemes(url: str) -> list:
+    """
+    >>> split_schemes('https://cve.mitre.org/x?name=CVE-2022-213058https://www.oracle.com/a.html')
+    ['https://cve.mitre.org/x?name=CVE-2022-213058', 'https://www.oracle.com/a.html']
+    """
+    parts = re.split(r'(?=https?://)', url)
+    return [p for p in parts if p]
+
+
+def host_score(url: str) -> int:
+    """+1 if the path looks complete for a well-known host, -1 if incomplete, else 0."""
+    parsed = urlparse(url if '://' in url else 'https://' + url)
+    host = parsed.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    pattern = _HOST_PATTERNS.get(host)
+    if pattern is None:
+        return 0
+    path = parsed.path + ('?' + parsed.query if parsed.query else '')
+    return 1 if pattern.match(path) else -1
+
+
+def score_candidate(url: str, anchors: set, known: set) -> float:
+    score = 0.0
+    if url in anchors or url.rstrip('/') in anchors:
+        score += 3
+    if canonical_key(url) in known:
+        score += 2
+    score += host_score(url)
+    if is_glued(url):
+        score -= 2
+    if url.endswith('-') or len(re.findall(r'https?://', url)) > 1:
+        score -= 2
+    return score
+
+
+def is_complete(url: str) -> bool:
+    """:return: True if `url` is well-formed on its own: a complete path for a well-known host, nothing glued."""
+    return host_score(url) == 1 and not is_glued(url) and url[-1:] not in _CONTINUATION_CHARS
+
+
+def _split_at_break(short: str, long: str, contexts: list) -> bool:
+    """:return: True if `long` is `short` continued over a line break in one of `contexts`."""
+    for k in range(len(short), min(len(long), len(short) + 3)):
+        # process_text() strips trailing dots, so the break may follow a few of them.
+        if long[len(short):k].strip('.') == '' and any(long[:k] + '\n' + long[k:] in ctx for ctx in contexts):
+            return True
+    return False
+
+
+def _same_mention(short: str, long: str, contexts: list) -> bool:
+    if not long.startswith(short) or long == short:
+        return False
+    return _split_at_break(short, long, contexts) or (is_glued(long) and strip_glued(long).startswith(short))
+
+
+def _candidates(url: str, others: list, contexts: list) -> list:
+    """
+    :param others: urls extracted from the same context as `url`.
+    :param contexts: the contexts of `url`.
+    :return: urls that may be the intended form of `url`, including itself.
+
+    >>> _candidates('https://github.com/foo/bar', ['https://github.com/foo/bar-data'],
+    ...             ['https://github.com/foo/bar and https://github.com/foo/bar-data'])
+    ['https://github.com/foo/bar']
+    >>> _candidates('https://github.com/foo/', ['https://github.com/foo/bar'], ['at https://github.com/foo/\\nbar.'])
+    ['https://github.com/foo/', 'https://github.com/foo/bar']
+    """
+    ret = [url]
+    if is_glued(url):
+        ret.append(strip_glued(url))
+    for other in others:
+        # the same mention, cut at the line break or joined with the next line.
+        if other not in ret and (_same_mention(url, other, contexts) or _same_mention(other, url, contexts)):
+            ret.append(other)
+    return ret
+
+
+def _break_bonus(short: str, long: str) -> float:
+    # after a separator the url goes on; after a letter or digit the
+    # next line is more likely plain text glued to the url.
+    return 0.5 if short[-1:] in _CONTINUATION_CHARS else -0.5
+
+
+def repair_urls(url_contexts: dict, anchors=(), known: set = None) -> dict:
+    """
+    :param url_contexts: {url: [context, ...]}, e.g. the output of process_text().
+    :param anchors: urls found by process_pdf(), which are always correct.
+    :param known: canonical keys of known urls, defaults to known_url_keys().
+    :return: {url: [context, ...]} where each mention keeps only its best candidate.
+    """
+    anchors = set(anchors)
+    if known is None:
+        try:
+            known = known_url_keys()
+        except Exception:
+            known = set()
+
+    # split urls that contain two schemes; both parts are real urls.
+    expanded = {}
+    for url, contexts in url_contexts.items():
+        for part in split_schemes(url) if url.count('://') > 1 else [url]:
+            expanded.setdefault(part, []).extend(contexts)
+
+    # urls extracted from one context window come from the same lines.
+    by_context = {}
+    for url, contexts in expanded.items():
+        for ctx in contexts:
+            by_context.setdefault(ctx, []).append(url)
+
+    parent = {}
+
+    def find(u):
+        while parent.setdefault(u, u) != u:
+            parent[u] = parent[parent[u]]
+            u = parent[u]
+        return u
+
+    cands_of = {}
+    for url, contexts in expanded.items():
+        others = [o for ctx in contexts for o in by_context[ctx]]
+        cands_of[url] = _candidates(url, others, contexts)
+        for cand in cands_of[url]:
+            parent[find(cand)] = find(url)
+
+    clusters = {}
+    for url in cands_of:
+        for cand in cands_of[url]:
+            clusters.setdefault(find(url), set()).add(cand)
+
+    ret = {}
+    for root, cands in clusters.items():
+        members = [u for u in cands if u in expanded]
+        if len(cands) == 1:
+            best = root
+        else:
+            scores = {c: score_candidate(c, anchors, known) for c in cands}
+            for a in cands:
+                for b in cands:
+                    if a != b and b.startswith(a):
+                        bonus = _break_bonus(a, b)
+                        scores[b] += bonus
+                        scores[a] -= bonus
+            # on a tie keep an extracted form, then the longer one.
+            best = max(sorted(cands), key=lambda c: (scores[c], c in expanded, len(c)))
+        # a complete url joined with the next line (a footnote mark, a word) is not complete itself.
+        joined = {u for u in members for s in members if is_complete(s) and _same_mention(s, u, expanded[u])}
+        for url in members:
+            # anchors and complete urls are real urls, not broken forms of `best`.
+            real = url in anchors or url.rstrip('/') in anchors or (is_complete(url) and url not in joined)
+            keep = url if url != best and real else best
+            contexts = ret.setdefault(keep, [])
+            for ctx in expanded[url]:
+                if ctx not in contexts:
+                    contexts.append(ctx)
+        ret.setdefault(best, [])
+    return ret
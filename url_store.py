@@ -0,0 +1,347 @@
+"""
+A persistent store of the urls seen across runs, backed by sqlite3.
+
+The same repositories and dataset hosts come back in every conference.
+For each cleaned url (url_canon.clean_url) the store keeps its verdict
+and where it came from, its liveness (status code and final url from
+link_validator), when it was first and last seen and the papers citing
+it.
+
+Classification looks the urls of a paper up here before any rule or
+LLM work and reuses what an earlier run decided:
+- manual: set with `python url_store.py set`, never overwritten by the
+  pipeline;
+- rule: decided by a url rule (rule_engine.classify_url) from the url
+  alone, kept per url;
+- preclassifier, llm: decided from the merged context of the url, so
+  kept per (url, context fingerprint), the key of
+  verdict_cache.context_key(); a repository that is a benchmark in one
+  paper and a baseline in the next is decided again when its context
+  differs.
+
+Several processes may write at the same time: the database is in WAL
+mode, every write is one short `BEGIN IMMEDIATE` transaction of upserts,
+and a busy database is waited for instead of failing.
+
+Example usage:
+>>> store = URLStore(cache_path('urls.sqlite'))
+>>> store.record_verdicts([('https://github.com/a/data', True, 'manual', 'benchmark repo')])
+>>> store.lookup('https://github.com/a/data/')
+{'url': 'https://github.com/a/data', 'verdict': True, 'source': 'manual', 'reason': 'benchmark repo', ...}
+>>> store.record_contexts([('https://github.com/a/data', 'We release our data at', True, 'llm', 'LLM method')],
+...                       paper='odjMSBSWRt')
+>>> store.lookup_contexts([('https://github.com/a/data', 'We  release our data at')])
+{('https://github.com/a/data', 'We  release our data at'): {'verdict': True, 'source': 'llm', ...}}
+>>> store.papers('https://github.com/a/data')
+['odjMSBSWRt']
+
+Command line:
+python url_store.py show https://github.com/a/data
+python url_store.py set https://github.com/a/data yes --reason "benchmark repo"
+python url_store.py clear --source rule     # e.g. after the rules have changed
+python url_store.py clear --source llm      # e.g. after the prompt has changed
+python url_store.py stats
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from disk_cache import cache_path
+from url_canon import clean_url
+from verdict_cache import context_fingerprint
+
+DEFAULT_STORE_FILE = cache_path('urls.sqlite')
+URL_SOURCES = ('manual', 'rule')
+CONTEXT_SOURCES = ('preclassifier', 'llm')
+SOURCES = URL_SOURCES + CONTEXT_SOURCES
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    verdict INTEGER,
+    source TEXT,
+    reason TEXT,
+    status INTEGER,
+    final_url TEXT,
+    checked REAL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS urls_verdict ON urls (verdict, source);
+CREATE INDEX IF NOT EXISTS urls_last_seen ON urls (last_seen);
+CREATE TABLE IF NOT EXISTS citations (
+    key TEXT NOT NULL,
+    paper TEXT NOT NULL,
+    seen REAL NOT NULL,
+    PRIMARY KEY (key, paper)
+);
+CREATE INDEX IF NOT EXISTS citations_paper ON citations (paper);
+CREATE TABLE IF NOT EXISTS contexts (
+    key TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    verdict INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    reason TEXT,
+    paper TEXT,
+    decided REAL NOT NULL,
+    PRIMARY KEY (key, fingerprint)
+);
+CREATE INDEX IF NOT EXISTS contexts_source ON contexts (source);
+"""
+
+_COLUMNS = ('url', 'verdict', 'source', 'reason', 'status', 'final_url', 'checked', 'first_seen', 'last_seen')
+_CONTEXT_COLUMNS = ('verdict', 'source', 'reason', 'paper', 'decided')
+
+
+def _key(url: str) -> str:
+    return clean_url(url)
+
+
+def _row(row, columns=_COLUMNS) -> dict:
+    ret = dict(zip(columns, row))
+    if ret['verdict'] is not None:
+        ret['verdict'] = bool(ret['verdict'])
+    return ret
+
+
+class URLStore:
+
+    def __init__(self, path: str = DEFAULT_STORE_FILE):
+        """:param path: sqlite file, created if missing."""
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'written': 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite connections must not be shared across threads.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # autocommit; writes open their own transaction, see _write().
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, statements: list) -> None:
+        """Run [(sql, [params, ...]), ...] in one transaction."""
+        conn = self._conn()
+        # take the write lock up front, so that concurrent writers wait
+        # for it (busy timeout) instead of failing on lock upgrade.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params in statements:
+                conn.executemany(sql, params)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def count(self, hits: int, misses: int, written: int = 0) -> None:
+        """:param hits: stored verdicts used to decide a url; misses: urls looked up and decided otherwise."""
+        with self._lock:
+            self.stats['hits'] += hits
+            self.stats['misses'] += misses
+            self.stats['written'] += written
+
+    def lookup(self, url: str):
+        """:return: what the store knows about `url`, or None."""
+        return self.lookup_many([url]).get(url)
+
+    def lookup_many(self, urls: list) -> dict:
+        """:return: {url: row} for the urls in the store; rows without a verdict only record liveness and citations."""
+        keys = {}
+        for url in urls:
+            keys.setdefault(_key(url), []).append(url)
+        ret = {}
+        conn = self._conn()
+        key_list = list(keys)
+        # stay below sqlite's limit on the number of host parameters.
+        for i in range(0, len(key_list), 500):
+            chunk = key_list[i:i + 500]
+            marks = ','.join('?' * len(chunk))
+            rows = conn.execute(f"SELECT key, {', '.join(_COLUMNS)} FROM urls WHERE key IN ({marks})", chunk)
+            for row in rows:
+                for url in keys[row[0]]:
+                    ret[url] = _row(row[1:])
+        return ret
+
+    def lookup_contexts(self, pairs: list) -> dict:
+        """:return: {(url, context): row} for the pairs decided before from the same merged context."""
+        keys = {}
+        for url, context in pairs:
+            keys.setdefault((_key(url), context_fingerprint(context)), []).append((url, context))
+        ret = {}
+        conn = self._conn()
+        for key, fingerprint in keys:
+            row = conn.execute(f"SELECT {', '.join(_CONTEXT_COLUMNS)} FROM contexts WHERE key = ? AND fingerprint = ?",
+                               (key, fingerprint)).fetchone()
+            if row is not None:
+                for pair in keys[(key, fingerprint)]:
+                    ret[pair] = _row(row, _CONTEXT_COLUMNS)
+        return ret
+
+    def record_verdicts(self, verdicts: list, paper: str = None) -> None:
+        """
+        :param verdicts: [(url, verdict, source, reason), ...] of the
+          URL_SOURCES; a manual verdict is only replaced by another
+          manual one.
+        :param paper: the paper the urls were found in.
+        """
+        for _, _, source, _ in verdicts:
+            if source not in URL_SOURCES:
+                raise ValueError(f"{source} verdicts depend on the context, use record_contexts()")
+        now = time.time()
+        rows = [(_key(url), url, None if verdict is None else int(verdict), source, reason, now, now)
+                for url, verdict, source, reason in verdicts]
+        statements = [(
+            "INSERT INTO urls (key, url, verdict, source, reason, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET last_seen = excluded.last_seen, "
+            "verdict = CASE WHEN urls.source = 'manual' AND excluded.source != 'manual' THEN urls.verdict "
+            "  ELSE excluded.verdict END, "
+            "reason = CASE WHEN urls.source = 'manual' AND excluded.source != 'manual' THEN urls.reason "
+            "  ELSE excluded.reason END, "
+            "source = CASE WHEN urls.source = 'manual' AND excluded.source != 'manual' THEN urls.source "
+            "  ELSE excluded.source END",
+            rows)]
+        if paper is not None:
+            statements.append(("INSERT OR IGNORE INTO citations (key, paper, seen) VALUES (?, ?, ?)",
+                               [(row[0], paper, now) for row in rows]))
+        self._write(statements)
+        self.count(0, 0, len(rows))
+
+    def record_contexts(self, verdicts: list, paper: str = None) -> None:
+        """
+        :param verdicts: [(url, merged context, verdict, source, reason), ...]
+          of the CONTEXT_SOURCES; a later decision on the same url and
+          context replaces an earlier one.
+        :param paper: the paper the context comes from.
+        """
+        now = time.time()
+        rows = [(_key(url), context_fingerprint(context), int(verdict), source, reason, paper, now)
+                for url, context, verdict, source, reason in verdicts]
+        statements = [(
+            "INSERT INTO contexts (key, fingerprint, verdict, source, reason, paper, decided) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (key, fingerprint) DO UPDATE SET verdict = excluded.verdict, source = excluded.source, "
+            "reason = excluded.reason, paper = excluded.paper, decided = excluded.decided",
+            rows)]
+        if paper is not None:
+            statements.append(("INSERT OR IGNORE INTO citations (key, paper, seen) VALUES (?, ?, ?)",
+                               [(row[0], paper, now) for row in rows]))
+        self._write(statements)
+        self.count(0, 0, len(rows))
+
+    def record_seen(self, urls: list, paper: str = None) -> None:
+        """Note that `urls` were found in `paper`, without a verdict."""
+        now = time.time()
+        rows = [(_key(url), url, now, now) for url in urls]
+        statements = [("INSERT INTO urls (key, url, first_seen, last_seen) VALUES (?, ?, ?, ?) "
+                       "ON CONFLICT (key) DO UPDATE SET last_seen = excluded.last_seen", rows)]
+        if paper is not None:
+            statements.append(("INSERT OR IGNORE INTO citations (key, paper, seen) VALUES (?, ?, ?)",
+                               [(row[0], paper, now) for row in rows]))
+        self._write(statements)
+
+    def record_status(self, results: dict) -> None:
+        """:param results: {url: {'status', 'final_url', ...}} from link_validator.validate_urls()."""
+        now = time.time()
+        rows = [(_key(url), url, r.get('status'), r.get('final_url'), now, now, now)
+                for url, r in results.items() if r]
+        self._write([(
+            "INSERT INTO urls (key, url, status, final_url, checked, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET status = excluded.status, final_url = excluded.final_url, "
+            "checked = excluded.checked",
+            rows)])
+
+    def papers(self, url: str) -> list:
+        """:return: the papers citing `url`, oldest first."""
+        rows = self._conn().execute("SELECT paper FROM citations WHERE key = ? ORDER BY seen, paper",
+                                    (_key(url),))
+        return [row[0] for row in rows]
+
+    def context_verdicts(self, url: str) -> list:
+        """:return: the verdicts on `url` in its different contexts, oldest first."""
+        rows = self._conn().execute(f"SELECT {', '.join(_CONTEXT_COLUMNS)} FROM contexts WHERE key = ? "
+                                    "ORDER BY decided", (_key(url),))
+        return [_row(row, _CONTEXT_COLUMNS) for row in rows]
+
+    def clear(self, source: str) -> int:
+        """Forget the verdicts from `source`. :return: number of verdicts."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        if source in URL_SOURCES:
+            cur = conn.execute("UPDATE urls SET verdict = NULL, source = NULL, reason = NULL WHERE source = ?", (source,))
+        else:
+            cur = conn.execute("DELETE FROM contexts WHERE source = ?", (source,))
+        conn.execute("COMMIT")
+        return cur.rowcount
+
+    def counts(self) -> dict:
+        """:return: {'urls', 'datasets', 'papers', source: number of verdicts}; datasets counts url verdicts."""
+        conn = self._conn()
+        ret = {'urls': conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0],
+               'datasets': conn.execute("SELECT COUNT(*) FROM urls WHERE verdict = 1").fetchone()[0],
+               'papers': conn.execute("SELECT COUNT(DISTINCT paper) FROM citations").fetchone()[0]}
+        for source, n in conn.execute("SELECT source, COUNT(*) FROM urls WHERE source IS NOT NULL GROUP BY source"):
+            ret[source] = n
+        for source, n in conn.execute("SELECT source, COUNT(*) FROM contexts GROUP BY source"):
+            ret[source] = n
+        return ret
+
+    def summary(self) -> str:
+        c = self.counts()
+        with self._lock:
+            s = dict(self.stats)
+        total = s['hits'] + s['misses']
+        rate = s['hits'] / total if total else 0.0
+        return (f"{c['urls']} urls ({c['datasets']} datasets) from {c['papers']} papers; "
+                f"this run {s['hits']}/{total} urls decided from the store ({rate:.1%}), {s['written']} verdicts written")
+
+    def close(self) -> None:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cross-run store of classified urls')
+    parser.add_argument('--store', default=DEFAULT_STORE_FILE, help='sqlite file of the store')
+    sub = parser.add_subparsers(dest='command', required=True)
+    show = sub.add_parser('show', help='print what the store knows about urls')
+    show.add_argument('urls', nargs='+')
+    manual = sub.add_parser('set', help='set a manual verdict, kept over rule and LLM verdicts')
+    manual.add_argument('url')
+    manual.add_argument('verdict', choices=('yes', 'no'))
+    manual.add_argument('--reason', default=None)
+    clear = sub.add_parser('clear', help='forget the verdicts of one source')
+    clear.add_argument('--source', required=True, choices=SOURCES)
+    sub.add_parser('stats', help='print the size of the store')
+    args = parser.parse_args()
+
+    store = URLStore(args.store)
+    if args.command == 'show':
+        for url in args.urls:
+            row = store.lookup(url)
+            print(url, row, store.papers(url) if row else [])
+            for entry in store.context_verdicts(url):
+                print('   ', entry)
+    elif args.command == 'set':
+        store.record_verdicts([(args.url, args.verdict == 'yes', 'manual', args.reason or 'manual')])
+        print(store.lookup(args.url))
+    elif args.command == 'clear':
+        print(f"cleared {store.clear(args.source)} {args.source} verdicts", file=sys.stderr)
+    else:
+        print(store.counts())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+A bounded, thread-safe LRU cache for link verdicts, shared by everything
+that classifies links during one run.
+
+The same links (github.com/huggingface/transformers, pytorch.org, arXiv
+ids) recur in hundreds of papers of a conference. Verdicts of the url
+rules are keyed by the (host, path) the rules read (rule_engine.split_url),
+so github.com/a/b and github.com/a/b/tree/main/data are kept apart even
+though they share a canonical key; verdicts that also depend on the
+context are keyed by the cleaned url (url_canon.clean_url), which is what
+the prompt shows, plus a fingerprint of the context. The first element of each key names
+its kind, and hits and misses are counted per kind for the run summary.
+
+Example usage:
+>>> cache = get_verdict_cache()
+>>> cache.get_or_set(url_key('https://GitHub.com/a/b'), lambda: (None, '/a/b'))
+(None, '/a/b')
+>>> cache.get(url_key('http://github.com/a/b'))
+(None, '/a/b')
+>>> cache.get(url_key('https://github.com/a/b/tree/main/data')) is None
+True
+>>> cache.summary()
+'url: 1/3 hits (33.3%); 1 entries, 0 evicted'
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from rule_engine import split_url
+from url_canon import clean_url
+
+DEFAULT_MAXSIZE = 100000
+
+_MISSING = object()
+
+
+def context_fingerprint(context: str) -> str:
+    """:return: a short digest of `context`, insensitive to whitespace changes."""
+    text = ' '.join(context.split())
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def url_key(url: str) -> tuple:
+    """:return: the key of what RuleEngine.classify_url() reads of `url`."""
+    return ('url',) + split_url(url)
+
+
+def context_key(url: str, context: str) -> tuple:
+    return ('context', clean_url(url), context_fingerprint(context))
+
+
+class VerdictCache:
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+
+    def get(self, key: tuple, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses[key[0]] = self.misses.get(key[0], 0) + 1
+                return default
+            self._data.move_to_end(key)
+            self.hits[key[0]] = self.hits.get(key[0], 0) + 1
+            return value
+
+    def set(self, key: tuple, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key: tuple, compute):
+        """
+        :param compute: called without the lock held on a miss, so two
+          workers may both compute the same verdict; the last one is kept.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits.clear()
+            self.misses.clear()
+            self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """:return: {kind: {'hits', 'misses', 'hit_rate'}}"""
+        with self._lock:
+            ret = {}
+            for kind in sorted(set(self.hits) | set(self.misses)):
+                hits, misses = self.hits.get(kind, 0), self.misses.get(kind, 0)
+                ret[kind] = {'hits': hits, 'misses': misses,
+                             'hit_rate': hits / (hits + misses) if hits + misses else 0.0}
+            return ret
+
+    def summary(self) -> str:
+        parts = [f"{kind}: {s['hits']}/{s['hits'] + s['misses']} hits ({s['hit_rate']:.1%})"
+                 for kind, s in self.stats().items()]
+        parts.append(f"{len(self)} entries, {self.evictions} evicted")
+        return '; '.join(parts)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_verdict_cache(maxsize: int = None) -> VerdictCache:
+    """
+    :param maxsize: resizes the shared cache when given.
+    :return: the cache shared by the whole process.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = VerdictCache(maxsize or DEFAULT_MAXSIZE)
+        elif maxsize:
+            _cache.maxsize = maxsize
+    return _cache